@@ -0,0 +1,65 @@
+"""Task submission rate with run() versus run_many()
+
+Submits tasks to a MesosExecutor (with no Mesos master behind it) through
+increasingly deep executor stacks, one at a time and in bulk::
+
+    python -m benchmarks.bulk_submission -n 100000
+"""
+import argparse
+import time
+
+from benchmarks.fakes import framework_executor
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
+from task_processing.plugins.mesos.timeout_executor import TimeoutExecutor
+
+
+STACKS = [
+    ('mesos', lambda e: e),
+    ('retrying(mesos)', lambda e: RetryingExecutor(e)),
+    ('timeout(retrying(mesos))',
+     lambda e: TimeoutExecutor(RetryingExecutor(e))),
+]
+
+
+def submit_one_by_one(executor, task_configs):
+    for task_config in task_configs:
+        executor.run(task_config)
+
+
+def submit_in_bulk(executor, task_configs):
+    executor.run_many(task_configs)
+
+
+def measure(make_stack, submit, tasks):
+    mesos_executor = framework_executor(max_task_queue_size=tasks)
+    # Start out suppressed so that submitting has to revive offers
+    mesos_executor.execution_framework.revive_controller.suppressed = True
+    executor = make_stack(mesos_executor)
+    task_configs = [
+        MesosTaskConfig(image='busybox', cmd='/bin/true', timeout=60)
+        for _ in range(tasks)
+    ]
+
+    start = time.time()
+    submit(executor, task_configs)
+    return tasks / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--tasks', type=int, default=20000)
+    args = parser.parse_args()
+
+    print('{:<28}{:>20}{:>20}'.format('stack', 'run() tasks/s',
+                                      'run_many() tasks/s'))
+    for name, make_stack in STACKS:
+        print('{:<28}{:>20.0f}{:>20.0f}'.format(
+            name,
+            measure(make_stack, submit_one_by_one, args.tasks),
+            measure(make_stack, submit_in_bulk, args.tasks),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Task throughput of executor stacks on a simulated Mesos cluster
+
+Pushes a batch of tasks through MesosExecutor, optionally wrapped in the
+decorators, on top of an in-process Mesos master and agents, and reports
+how fast terminal events come out along with where the offer cycles
+spent their time. With ``--group-size`` the tasks are submitted as task
+groups with run_group, and launched with LAUNCH_GROUP::
+
+    python -m benchmarks.cluster_throughput -n 100000 --agents 200
+    python -m benchmarks.cluster_throughput --stack mesos --group-size 4
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.simulator import SimulatedAgent
+from benchmarks.simulator import simulated_executor
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
+from task_processing.plugins.mesos.timeout_executor import TimeoutExecutor
+
+
+STACKS = {
+    'mesos': lambda e: e,
+    'retrying': lambda e: RetryingExecutor(e),
+    'timeout': lambda e: TimeoutExecutor(RetryingExecutor(e)),
+}
+
+
+def measure(args):
+    agents = [
+        SimulatedAgent('agent-{}'.format(i), cpus=args.cpus_per_agent)
+        for i in range(args.agents)
+    ]
+    mesos_executor, simulator = simulated_executor(
+        agents,
+        simulator_kwargs=dict(
+            offer_interval_s=args.offer_interval,
+            launch_latency_s=args.launch_latency,
+            task_runtime_s=args.runtime,
+            failure_rate=args.failure_rate,
+            rescind_rate=args.rescind_rate,
+            seed=0,
+        ),
+        max_task_queue_size=args.queue_size,
+        initial_decline_delay=0,
+    )
+    executor = STACKS[args.stack](mesos_executor)
+    if args.group_size:
+        # The default executor of task groups only runs Mesos containers
+        task_configs = [
+            MesosTaskConfig(cmd='/bin/true', containerizer='MESOS')
+            for _ in range(args.tasks)
+        ]
+        groups = [
+            task_configs[i:i + args.group_size]
+            for i in range(0, len(task_configs), args.group_size)
+        ]
+
+        def submit():
+            for group in groups:
+                executor.run_group(group)
+    else:
+        task_configs = [
+            MesosTaskConfig(image='busybox', cmd='/bin/true', timeout=3600)
+            for _ in range(args.tasks)
+        ]
+        groups = []
+
+        def submit():
+            executor.run_many(task_configs)
+
+    start = time.time()
+    # Submitting blocks while the framework's task queue is full
+    submitter = threading.Thread(target=submit)
+    submitter.daemon = True
+    submitter.start()
+
+    finished = 0
+    # Every group has a terminal event of its own
+    while finished < args.tasks + len(groups):
+        finished += sum(
+            1 for e in executor.get_events()
+            if e.kind == 'task' and e.terminal
+        )
+    elapsed = time.time() - start
+
+    cycles = list(mesos_executor.execution_framework.offer_profiler.cycles)
+    executor.stop()
+    return elapsed, simulator.stats, cycles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--tasks', type=int, default=10000)
+    parser.add_argument('--stack', choices=sorted(STACKS), default='timeout')
+    parser.add_argument('--agents', type=int, default=100)
+    parser.add_argument('--cpus-per-agent', type=float, default=32.0)
+    parser.add_argument('--queue-size', type=int, default=10000)
+    parser.add_argument('--offer-interval', type=float, default=0.01)
+    parser.add_argument('--launch-latency', type=float, default=0.0)
+    parser.add_argument('--runtime', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--rescind-rate', type=float, default=0.0)
+    parser.add_argument(
+        '--group-size', type=int, default=0,
+        help='submit the tasks as task groups of this size')
+    args = parser.parse_args()
+    if args.group_size and args.stack != 'mesos':
+        parser.error('only --stack mesos runs task groups')
+
+    elapsed, stats, cycles = measure(args)
+
+    print('{} tasks through {} in {:.2f}s: {:.0f} tasks/s'.format(
+        args.tasks, args.stack, elapsed, args.tasks / elapsed))
+    print('simulator: {}'.format(', '.join(
+        '{}={}'.format(k, v) for k, v in sorted(stats.items()))))
+    if cycles:
+        stages = {}
+        for cycle in cycles:
+            for stage, seconds in cycle['stages'].items():
+                stages[stage] = stages.get(stage, 0.0) + seconds
+        print('last {} offer cycles, ms per cycle: {}'.format(
+            len(cycles), ', '.join(
+                '{}={:.2f}'.format(stage, seconds * 1000 / len(cycles))
+                for stage, seconds in sorted(stages.items()))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Event throughput between and through executors
+
+Measures how fast events are handed over, one at a time (``put``/``get``)
+and in batches (``put_many``/``get_many``):
+
+- between a producer and a consumer thread over a single event stream,
+  which is what every executor in a stack does with its source
+- through executor stacks, from terminal events of tasks that were
+  already submitted until they all came out of the top of the stack
+
+Submitting the tasks is not timed::
+
+    python -m benchmarks.event_throughput -n 50000
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.fakes import HoldingExecutor
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import EventStream
+from task_processing.event_stream import EventStreamClosed
+from task_processing.interfaces.event import task_event
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
+from task_processing.plugins.mesos.timeout_executor import TimeoutExecutor
+
+
+STACKS = [
+    ('retrying', lambda e: RetryingExecutor(e)),
+    ('timeout(retrying)', lambda e: TimeoutExecutor(RetryingExecutor(e))),
+]
+
+
+def _events(n):
+    return [
+        task_event(
+            task_id=str(i), timestamp=1.0, terminal=True, success=True,
+            platform_type='finished',
+        )
+        for i in range(n)
+    ]
+
+
+def produce_one_by_one(stream, events):
+    for e in events:
+        stream.put(e)
+
+
+def produce_in_batches(stream, events):
+    for i in range(0, len(events), EVENT_BATCH_SIZE):
+        stream.put_many(events[i:i + EVENT_BATCH_SIZE])
+
+
+def consume_one_by_one(stream, n):
+    for _ in range(n):
+        stream.get()
+
+
+def consume_in_batches(stream, n):
+    received = 0
+    while received < n:
+        received += len(stream.get_many(EVENT_BATCH_SIZE))
+
+
+def measure_handoff(produce, consume, n, maxsize):
+    """Events per second from a producer to a consumer thread"""
+    stream = EventStream(maxsize)
+    events = _events(n)
+    producer = threading.Thread(target=produce, args=(stream, events))
+
+    start = time.time()
+    producer.start()
+    consume(stream, n)
+    elapsed = time.time() - start
+
+    producer.join()
+    return n / elapsed
+
+
+def measure_stack(make_stack, consume, n):
+    """Events per second out of the top of a stack"""
+    downstream = HoldingExecutor()
+    executor = make_stack(downstream)
+    executor.run_many([
+        MesosTaskConfig(image='busybox', cmd='/bin/true', timeout=60)
+        for _ in range(n)
+    ])
+    queue = executor.get_event_queue()
+
+    start = time.time()
+    downstream.finish(downstream.launched)
+    consume(queue, n)
+    elapsed = time.time() - start
+
+    executor.stop()
+    try:
+        executor.get_events(timeout=0)
+    except EventStreamClosed:
+        pass
+    return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--events', type=int, default=20000)
+    args = parser.parse_args()
+
+    print('{:<28}{:>20}{:>20}'.format(
+        'hand-off', 'one by one events/s', 'batches events/s'))
+    # Executors bound their event streams to the size of their task queue
+    for maxsize in [0, 1000]:
+        print('{:<28}{:>20.0f}{:>20.0f}'.format(
+            'stream maxsize={}'.format(maxsize),
+            measure_handoff(
+                produce_one_by_one, consume_one_by_one, args.events,
+                maxsize),
+            measure_handoff(
+                produce_in_batches, consume_in_batches, args.events,
+                maxsize),
+        ))
+
+    print('{:<28}{:>20}{:>20}'.format(
+        'stack', 'get() events/s', 'get_many() events/s'))
+    for name, make_stack in STACKS:
+        print('{:<28}{:>20.0f}{:>20.0f}'.format(
+            name,
+            measure_stack(make_stack, consume_one_by_one, args.events),
+            measure_stack(make_stack, consume_in_batches, args.events),
+        ))
+
+
+if __name__ == '__main__':
+    main()
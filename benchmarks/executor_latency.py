@@ -0,0 +1,66 @@
+"""End-to-end event latency through stacked executors
+
+Runs tasks one at a time through increasingly deep executor stacks and
+reports how long it takes from ``run()`` until the terminal event comes
+out of the top of the stack::
+
+    python -m benchmarks.executor_latency
+"""
+import argparse
+import time
+
+from benchmarks.fakes import InstantExecutor
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
+from task_processing.plugins.mesos.timeout_executor import TimeoutExecutor
+
+
+STACKS = [
+    ('instant', lambda e: e),
+    ('retrying(instant)', lambda e: RetryingExecutor(e)),
+    ('timeout(retrying(instant))',
+     lambda e: TimeoutExecutor(RetryingExecutor(e))),
+]
+
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def measure(make_stack, tasks):
+    executor = make_stack(InstantExecutor())
+    queue = executor.get_event_queue()
+    samples = []
+    for _ in range(tasks):
+        config = MesosTaskConfig(image='busybox', cmd='/bin/true', timeout=60)
+        start = time.time()
+        executor.run(config)
+        while not queue.get().terminal:
+            pass
+        samples.append(time.time() - start)
+
+    stop_start = time.time()
+    executor.stop()
+    return sorted(samples), time.time() - stop_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--tasks', type=int, default=200)
+    args = parser.parse_args()
+
+    print('{:<28}{:>10}{:>10}{:>10}{:>10}'.format(
+        'stack', 'p50 ms', 'p99 ms', 'max ms', 'stop ms'))
+    for name, make_stack in STACKS:
+        samples, stop_time = measure(make_stack, args.tasks)
+        print('{:<28}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.3f}'.format(
+            name,
+            _percentile(samples, 0.5) * 1000,
+            _percentile(samples, 0.99) * 1000,
+            samples[-1] * 1000,
+            stop_time * 1000,
+        ))
+
+
+if __name__ == '__main__':
+    main()
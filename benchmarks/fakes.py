@@ -0,0 +1,98 @@
+import time
+
+from task_processing.event_stream import EventStream
+from task_processing.interfaces.event import task_event
+from task_processing.interfaces.task_executor import TaskExecutor
+from task_processing.plugins.mesos.execution_framework import (
+    ExecutionFramework
+)
+from task_processing.plugins.mesos.mesos_executor import MesosExecutor
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+
+
+class InstantExecutor(TaskExecutor):
+    """Executor that finishes every task as soon as it is run
+
+    Used as the bottom of an executor stack so that benchmarks measure
+    the overhead of the decorators and runners alone.
+    """
+
+    TASK_CONFIG_INTERFACE = MesosTaskConfig
+
+    def __init__(self, success=True):
+        self.success = success
+        self.event_queue = EventStream()
+
+    def run(self, task_config):
+        self.event_queue.put(task_event(
+            task_id=task_config.task_id,
+            task_config=task_config,
+            timestamp=time.time(),
+            terminal=True,
+            success=self.success,
+            platform_type='finished',
+        ))
+
+    def kill(self, task_id):
+        pass
+
+    def kill_matching(self, predicate):
+        return []
+
+    def stop(self):
+        self.event_queue.close()
+
+    def get_event_queue(self):
+        return self.event_queue
+
+
+class HoldingExecutor(InstantExecutor):
+    """Executor whose tasks run until finish() is called
+
+    Keeps the configs it was given in ``launched``, which is what has to be
+    finished when a decorator above it rewrites task ids.
+    """
+
+    def __init__(self, success=True):
+        super(HoldingExecutor, self).__init__(success)
+        self.launched = []
+
+    def run(self, task_config):
+        self.launched.append(task_config)
+
+    def run_many(self, task_configs):
+        self.launched.extend(task_configs)
+        return [task_config.task_id for task_config in task_configs]
+
+    def finish(self, task_configs):
+        self.event_queue.put_many([
+            task_event(
+                task_id=task_config.task_id,
+                task_config=task_config,
+                timestamp=time.time(),
+                terminal=True,
+                success=self.success,
+                platform_type='finished',
+            )
+            for task_config in task_configs
+        ])
+
+
+class NullDriver(object):
+    """Stands in for a MesosSchedulerDriver that is never offered anything"""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def framework_executor(**framework_kwargs):
+    """A MesosExecutor around an ExecutionFramework with no Mesos master"""
+    framework_kwargs.setdefault('name', 'benchmark')
+    framework_kwargs.setdefault('role', 'benchmark')
+    execution_framework = ExecutionFramework(**framework_kwargs)
+    execution_framework.driver = NullDriver()
+
+    executor = MesosExecutor.__new__(MesosExecutor)
+    executor.execution_framework = execution_framework
+    executor.driver = execution_framework.driver
+    return executor
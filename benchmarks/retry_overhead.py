@@ -0,0 +1,72 @@
+"""Per-event overhead of RetryingExecutor
+
+Translates status events of launched attempts back to their original
+tasks without going through queues or threads, for running and for
+finished tasks::
+
+    python -m benchmarks.retry_overhead -n 100000
+"""
+import argparse
+import time
+
+from benchmarks.fakes import HoldingExecutor
+from task_processing.interfaces.event import task_event
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
+
+
+class RecordingExecutor(HoldingExecutor):
+    def __init__(self):
+        super(RecordingExecutor, self).__init__()
+        self.launched = []
+
+    def run(self, task_config):
+        self.launched.append(task_config)
+
+
+def attempt_events(tasks, terminal):
+    downstream = RecordingExecutor()
+    executor = RetryingExecutor(downstream)
+    for _ in range(tasks):
+        # Dashes in the name used to confuse attempt parsing
+        executor.run(MesosTaskConfig(
+            name='bench-mark-task', image='busybox', cmd='/bin/true'))
+
+    events = [
+        task_event(
+            task_id=task_config.task_id,
+            task_config=task_config,
+            timestamp=time.time(),
+            terminal=terminal,
+            success=True if terminal else None,
+            platform_type='finished' if terminal else 'running',
+        )
+        for task_config in downstream.launched
+    ]
+    return executor, events
+
+
+def measure(tasks, terminal):
+    executor, events = attempt_events(tasks, terminal)
+
+    start = time.time()
+    for e in events:
+        executor._process_event(e)
+    elapsed = time.time() - start
+
+    executor.stop()
+    return elapsed / tasks * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--tasks', type=int, default=50000)
+    args = parser.parse_args()
+
+    print('{:<12}{:>16}'.format('event', 'us/event'))
+    for name, terminal in [('running', False), ('finished', True)]:
+        print('{:<12}{:>16.2f}'.format(name, measure(args.tasks, terminal)))
+
+
+if __name__ == '__main__':
+    main()
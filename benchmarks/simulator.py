@@ -0,0 +1,522 @@
+"""In-process Mesos master and agents
+
+:class:`SimulatedMesos` implements the driver calls ExecutionFramework makes
+(launchTasks, acceptOffers with LAUNCH and LAUNCH_GROUP, declineOffer,
+killTask, suppress/revive, reconcile and acknowledgements) and calls the
+scheduler back from a single thread, like pymesos does: offers are made
+every ``offer_interval_s`` from the free resources of every agent, and
+launched tasks go through TASK_STARTING and TASK_RUNNING to a terminal
+state after configurable latencies. Failures, rescinded offers,
+maintenance windows and lost agents can be injected, so whole executor
+stacks can be exercised without a cluster.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from addict import Dict
+
+from task_processing.plugins.mesos.execution_framework import (
+    ExecutionFramework
+)
+from task_processing.plugins.mesos.mesos_executor import MesosExecutor
+
+TERMINAL_STATES = set([
+    'TASK_FINISHED', 'TASK_FAILED', 'TASK_KILLED', 'TASK_LOST', 'TASK_ERROR',
+])
+
+
+class SimulatedAgent(object):
+    def __init__(
+        self,
+        agent_id,
+        hostname=None,
+        cpus=32.0,
+        mem=65536.0,
+        disk=1048576.0,
+        gpus=0,
+        ports=(31000, 32000),
+        attributes=None,
+        maintenance=None,
+    ):
+        """
+        :param tuple ports: first and last port of the agent, inclusive
+        :param dict attributes: text attributes, e.g. {'pool': 'default'}
+        :param tuple maintenance: (start, duration) of a maintenance window
+            in seconds since the epoch and seconds
+        """
+        self.agent_id = agent_id
+        self.hostname = hostname or agent_id
+        self.free = dict(cpus=float(cpus), mem=float(mem), disk=float(disk),
+                         gpus=float(gpus))
+        self.free_ports = set(range(ports[0], ports[1] + 1))
+        self.attributes = attributes or {}
+        self.maintenance = maintenance
+        self.tasks = set()
+        self.lost = False
+
+
+class SimulatedTask(object):
+    __slots__ = ('task_id', 'agent', 'resources', 'ports', 'state',
+                 'executor_id')
+
+    def __init__(self, task_id, agent, resources, ports, executor_id=None):
+        self.task_id = task_id
+        self.agent = agent
+        self.resources = resources
+        self.ports = ports
+        self.state = 'TASK_STAGING'
+        # The executor of its task group, if it was launched in one
+        self.executor_id = executor_id
+
+
+def _port_ranges(ports):
+    """Collapse a set of ports into inclusive Mesos ranges"""
+    ranges = []
+    for port in sorted(ports):
+        if ranges and ranges[-1].end == port - 1:
+            ranges[-1].end = port
+        else:
+            ranges.append(Dict(begin=port, end=port))
+    return ranges
+
+
+def _as_list(offer_ids):
+    return offer_ids if isinstance(offer_ids, list) else [offer_ids]
+
+
+def _scalars(resources):
+    return {
+        resource.name: resource.scalar.value
+        for resource in resources if resource.type == 'SCALAR'
+    }
+
+
+def _operation_tasks(operation):
+    if operation.type == 'LAUNCH_GROUP':
+        return operation.launch_group.task_group.tasks
+    return operation.launch.task_infos
+
+
+class SimulatedMesos(object):
+    def __init__(
+        self,
+        scheduler,
+        agents,
+        role='*',
+        offer_interval_s=0.01,
+        launch_latency_s=0.0,
+        start_latency_s=0.0,
+        task_runtime_s=0.0,
+        kill_latency_s=0.0,
+        failure_rate=0.0,
+        rescind_rate=0.0,
+        offer_timeout_s=None,
+        seed=None,
+    ):
+        """
+        :param scheduler: the pymesos Scheduler, e.g. an ExecutionFramework
+        :param float task_runtime_s: seconds tasks run for, or a callable
+            taking the TaskInfo and returning them
+        :param float failure_rate: fraction of tasks that end in TASK_FAILED
+        :param float rescind_rate: fraction of offers rescinded right after
+            they are made; launching on those gets TASK_LOST
+        :param float offer_timeout_s: rescind offers that haven't been
+            launched on or declined after this long, like the master's
+            --offer_timeout
+        """
+        self.scheduler = scheduler
+        self.agents = {agent.agent_id: agent for agent in agents}
+        self.role = role
+        self.offer_interval_s = offer_interval_s
+        self.launch_latency_s = launch_latency_s
+        self.start_latency_s = start_latency_s
+        self.task_runtime_s = task_runtime_s
+        self.kill_latency_s = kill_latency_s
+        self.failure_rate = failure_rate
+        self.rescind_rate = rescind_rate
+        self.offer_timeout_s = offer_timeout_s
+        self.random = random.Random(seed)
+
+        self.tasks = {}
+        # executor_id -> (agent, resources, task_ids still running) of
+        # task groups
+        self.executors = {}
+        # offer_id -> (agent, held resources, held ports, rescinded)
+        self.offers = {}
+        self.refused_until = {}
+        self.suppressed = False
+        self.stats = dict(
+            offers=0, declined=0, rescinded=0, launched=0,
+            launched_groups=0, acknowledged=0,
+            reconciled=0, TASK_FINISHED=0, TASK_FAILED=0, TASK_KILLED=0,
+            TASK_LOST=0, TASK_ERROR=0,
+        )
+
+        self._ids = itertools.count()
+        self._timers = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self.stopping = False
+
+    ####################################################################
+    #                        Driver interface                          #
+    ####################################################################
+    def run(self):
+        """Deliver callbacks until stop() is called, like driver.run()"""
+        self.scheduler.registered(
+            self, Dict(value='simulated-framework'), Dict(hostname='sim'))
+        self._call_later(0, self._offer_cycle)
+
+        while True:
+            with self._condition:
+                while not self.stopping:
+                    now = time.time()
+                    if self._timers and self._timers[0][0] <= now:
+                        break
+                    self._condition.wait(
+                        self._timers[0][0] - now if self._timers else None)
+                if self.stopping:
+                    return
+                _, _, callback, args = heapq.heappop(self._timers)
+            callback(*args)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, failover=False):
+        with self._condition:
+            self.stopping = True
+            self._condition.notify()
+
+    def join(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def suppressOffers(self):
+        self.suppressed = True
+
+    def reviveOffers(self):
+        with self._condition:
+            self.suppressed = False
+            self.refused_until.clear()
+
+    def declineOffer(self, offer_ids, filters=None):
+        refuse_seconds = (filters or Dict()).refuse_seconds
+        if not isinstance(refuse_seconds, (int, float)):
+            refuse_seconds = 5.0
+        with self._condition:
+            for offer_id in _as_list(offer_ids):
+                agent = self._release_offer(offer_id.value)
+                if agent is not None:
+                    self.refused_until[agent.agent_id] = \
+                        time.time() + refuse_seconds
+                    self.stats['declined'] += 1
+
+    def launchTasks(self, offer_ids, tasks, filters=None):
+        self.acceptOffers(
+            offer_ids, [Dict(type='LAUNCH', launch=Dict(task_infos=tasks))],
+            filters)
+
+    def acceptOffers(self, offer_ids, operations, filters=None):
+        """Only LAUNCH and LAUNCH_GROUP operations are supported"""
+        offer_ids = [offer_id.value for offer_id in _as_list(offer_ids)]
+        with self._condition:
+            offers = [self.offers.pop(offer_id, None)
+                      for offer_id in offer_ids]
+            if any(offer is None or offer[3] for offer in offers):
+                for offer in offers:
+                    if offer is not None:
+                        self._return_resources(offer[0], offer[1], offer[2])
+                for operation in operations:
+                    for task in _operation_tasks(operation):
+                        self._update_later(
+                            self.launch_latency_s, task.task_id.value,
+                            'TASK_LOST', reason='REASON_INVALID_OFFERS',
+                            agent=offers[0] and offers[0][0])
+                return
+
+            agent = offers[0][0]
+            held = dict(cpus=0.0, mem=0.0, disk=0.0, gpus=0.0)
+            held_ports = set()
+            for _, resources, ports, _ in offers:
+                for name, value in resources.items():
+                    held[name] += value
+                held_ports |= ports
+
+            for operation in operations:
+                if operation.type == 'LAUNCH_GROUP':
+                    self._launch(
+                        agent, held, held_ports, _operation_tasks(operation),
+                        operation.launch_group.executor)
+                    continue
+                for task in _operation_tasks(operation):
+                    self._launch(agent, held, held_ports, [task])
+            self._return_resources(agent, held, held_ports)
+
+    def killTask(self, task_id):
+        with self._condition:
+            task = self.tasks.get(task_id.value)
+            if task is not None and task.state != 'TASK_KILLING':
+                task.state = 'TASK_KILLING'
+                self._update_later(
+                    self.kill_latency_s, task.task_id, 'TASK_KILLED',
+                    reason='REASON_TASK_KILLED')
+
+    def acknowledgeStatusUpdate(self, update):
+        self.stats['acknowledged'] += 1
+
+    def reconcileTasks(self, tasks):
+        with self._condition:
+            self.stats['reconciled'] += 1
+            for task in tasks:
+                known = self.tasks.get(task.task_id.value)
+                if known is not None and known.state != 'TASK_KILLING':
+                    self._update_later(0, known.task_id, known.state,
+                                       reason='REASON_RECONCILIATION')
+
+    ####################################################################
+    #                         Fault injection                          #
+    ####################################################################
+    def fail_agent(self, agent_id):
+        """Lose an agent along with every task running on it"""
+        with self._condition:
+            agent = self.agents[agent_id]
+            agent.lost = True
+            for task_id in list(agent.tasks):
+                self._update_later(0, task_id, 'TASK_LOST',
+                                   reason='REASON_AGENT_REMOVED')
+        self._call_later(0, self.scheduler.slaveLost, self,
+                         Dict(value=agent_id))
+
+    ####################################################################
+    #                           Simulation                             #
+    ####################################################################
+    def _call_later(self, delay, callback, *args):
+        with self._condition:
+            deadline = time.time() + delay
+            notify = not self._timers or deadline < self._timers[0][0]
+            heapq.heappush(
+                self._timers, (deadline, next(self._ids), callback, args))
+            if notify:
+                self._condition.notify()
+
+    def _update_later(self, delay, task_id, state, reason='', agent=None):
+        self._call_later(delay, self._status_update, task_id, state, reason,
+                         agent)
+
+    def _status_update(self, task_id, state, reason, agent):
+        with self._condition:
+            task = self.tasks.get(task_id)
+            if task is not None:
+                agent = task.agent
+                if task.state == 'TASK_KILLING' and state != 'TASK_KILLED':
+                    # Killed tasks don't report anything else
+                    return
+                if state in TERMINAL_STATES:
+                    self._finish(task)
+                else:
+                    task.state = state
+            elif state not in ('TASK_LOST', 'TASK_ERROR'):
+                # Updates of tasks that already finished
+                return
+            if state in TERMINAL_STATES:
+                self.stats[state] += 1
+
+        self.scheduler.statusUpdate(self, Dict(
+            task_id=Dict(value=task_id),
+            agent_id=Dict(value=agent.agent_id if agent else ''),
+            state=state,
+            reason=reason,
+            timestamp=time.time(),
+            source='SOURCE_MASTER' if reason else 'SOURCE_EXECUTOR',
+        ))
+
+    def _launch(self, agent, held, held_ports, task_infos, executor=None):
+        """Launch task_infos out of the held resources, all or none of them
+
+        :param executor: the ExecutorInfo of a task group, whose resources
+            are held until all of its tasks are done
+        """
+        needed = [_scalars(task_info.resources) for task_info in task_infos]
+        needed_ports = []
+        for task_info in task_infos:
+            ports = set()
+            for resource in task_info.resources:
+                if resource.name == 'ports':
+                    for port_range in resource.ranges.range:
+                        ports |= set(
+                            range(port_range.begin, port_range.end + 1))
+            needed_ports.append(ports)
+        total = _scalars(executor.resources) if executor else {}
+        for resources in needed:
+            for name, value in resources.items():
+                total[name] = total.get(name, 0.0) + value
+
+        if any(held.get(name, 0.0) < value
+               for name, value in total.items()) or \
+                not set().union(*needed_ports) <= held_ports:
+            for task_info in task_infos:
+                self._update_later(
+                    self.launch_latency_s, task_info.task_id.value,
+                    'TASK_ERROR', reason='REASON_TASK_INVALID', agent=agent)
+            return
+
+        executor_id = None
+        if executor:
+            executor_id = executor.executor_id.value
+            resources = _scalars(executor.resources)
+            for name, value in resources.items():
+                held[name] -= value
+            self.executors[executor_id] = (agent, resources, set(
+                task_info.task_id.value for task_info in task_infos))
+            self.stats['launched_groups'] += 1
+        for task_info, resources, ports in zip(
+                task_infos, needed, needed_ports):
+            self._start(agent, held, held_ports, task_info, resources, ports,
+                        executor_id)
+
+    def _start(self, agent, held, held_ports, task_info, resources, ports,
+               executor_id):
+        task_id = task_info.task_id.value
+        for name, value in resources.items():
+            held[name] -= value
+        held_ports -= ports
+        self.tasks[task_id] = SimulatedTask(
+            task_id, agent, resources, ports, executor_id)
+        agent.tasks.add(task_id)
+        self.stats['launched'] += 1
+
+        runtime = self.task_runtime_s
+        if callable(runtime):
+            runtime = runtime(task_info)
+        starting = self.launch_latency_s
+        running = starting + self.start_latency_s
+        self._update_later(starting, task_id, 'TASK_STARTING')
+        self._update_later(running, task_id, 'TASK_RUNNING')
+        if self.random.random() < self.failure_rate:
+            self._update_later(running + runtime, task_id, 'TASK_FAILED',
+                               reason='REASON_COMMAND_EXECUTOR_FAILED')
+        else:
+            self._update_later(running + runtime, task_id, 'TASK_FINISHED')
+
+    def _finish(self, task):
+        del self.tasks[task.task_id]
+        task.agent.tasks.discard(task.task_id)
+        if not task.agent.lost:
+            self._return_resources(task.agent, task.resources, task.ports)
+        if task.executor_id is None:
+            return
+        agent, resources, running = self.executors[task.executor_id]
+        running.discard(task.task_id)
+        if not running:
+            # The executor exits with the last task of its group
+            del self.executors[task.executor_id]
+            if not agent.lost:
+                self._return_resources(agent, resources, set())
+
+    def _return_resources(self, agent, resources, ports):
+        for name, value in resources.items():
+            agent.free[name] += value
+        agent.free_ports |= ports
+
+    def _release_offer(self, offer_id):
+        offer = self.offers.pop(offer_id, None)
+        if offer is None:
+            return None
+        agent, resources, ports, _ = offer
+        self._return_resources(agent, resources, ports)
+        return agent
+
+    def _make_offer(self, agent, now):
+        offer_id = 'offer-{}'.format(next(self._ids))
+        resources, agent.free = agent.free, dict.fromkeys(agent.free, 0.0)
+        ports, agent.free_ports = agent.free_ports, set()
+        rescinded = self.random.random() < self.rescind_rate
+        self.offers[offer_id] = (agent, resources, ports, rescinded)
+        self.stats['offers'] += 1
+
+        offer = Dict(
+            id=Dict(value=offer_id),
+            agent_id=Dict(value=agent.agent_id),
+            hostname=agent.hostname,
+            resources=[
+                Dict(name=name, type='SCALAR', role=self.role,
+                     scalar=Dict(value=value))
+                for name, value in resources.items()
+            ] + [
+                Dict(name='ports', type='RANGES', role=self.role,
+                     ranges=Dict(range=_port_ranges(ports)))
+            ],
+            attributes=[
+                Dict(name=name, type='TEXT', text=Dict(value=value))
+                for name, value in agent.attributes.items()
+            ],
+        )
+        if agent.maintenance is not None:
+            start, duration = agent.maintenance
+            if start + duration > now:
+                offer.unavailability = Dict(
+                    start=dict(nanoseconds=int(start * 1e9)),
+                    duration=dict(nanoseconds=int(duration * 1e9)),
+                )
+        return offer
+
+    def _offer_cycle(self):
+        offers = []
+        with self._condition:
+            now = time.time()
+            if not self.suppressed:
+                for agent in self.agents.values():
+                    if agent.lost or agent.free['cpus'] <= 0 or \
+                            self.refused_until.get(agent.agent_id, 0) > now:
+                        continue
+                    offers.append(self._make_offer(agent, now))
+
+        if offers:
+            self.scheduler.resourceOffers(self, offers)
+
+        # Offers are held until they are launched on, declined or
+        # rescinded, even after the callback returned.
+        with self._condition:
+            rescinded = set(
+                offer_id for offer_id, held in self.offers.items() if held[3])
+        for offer in offers:
+            if offer.id.value in rescinded:
+                self._call_later(0, self._rescind, offer.id)
+            elif self.offer_timeout_s is not None:
+                self._call_later(self.offer_timeout_s, self._rescind, offer.id)
+        self._call_later(self.offer_interval_s, self._offer_cycle)
+
+    def _rescind(self, offer_id):
+        with self._condition:
+            if self._release_offer(offer_id.value) is None:
+                return
+            self.stats['rescinded'] += 1
+        self.scheduler.offerRescinded(self, offer_id)
+
+
+def simulated_executor(agents, simulator_kwargs={}, **framework_kwargs):
+    """A MesosExecutor whose driver is a :class:`SimulatedMesos`
+
+    :returns: (executor, simulator)
+    """
+    framework_kwargs.setdefault('name', 'simulation')
+    framework_kwargs.setdefault('role', 'simulation')
+    execution_framework = ExecutionFramework(**framework_kwargs)
+    simulator = SimulatedMesos(
+        execution_framework,
+        agents,
+        role=framework_kwargs['role'],
+        **simulator_kwargs
+    )
+
+    executor = MesosExecutor.__new__(MesosExecutor)
+    executor.execution_framework = execution_framework
+    executor.driver = simulator
+    simulator.start()
+    return executor, simulator
@@ -0,0 +1,553 @@
+"""Micro-benchmarks of the task_processing hot paths
+
+Every benchmark times an operation on synthetic offers, status updates
+and events and reports the cost of one operation. Results are compared
+with the baselines stored in benchmarks/baselines.json, and ``--check``
+exits non-zero when one got slower than the tolerance allows. Timings
+only compare on the machine they were measured on: baselines from another
+machine are reported against but never fail the check, ``--save`` replaces
+them with local ones::
+
+    make bench
+    python -m benchmarks.suite -k status_update
+    python -m benchmarks.suite --save
+"""
+import argparse
+import collections
+import importlib
+import inspect
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from addict import Dict
+from pyrsistent import m
+
+from benchmarks.fakes import framework_executor
+from benchmarks.fakes import HoldingExecutor
+from benchmarks.fakes import InstantExecutor
+from task_processing.interfaces.event import task_event
+from task_processing.interfaces.persistence import Persister
+from task_processing.plugins.mesos.execution_framework import TaskMetadata
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
+from task_processing.plugins.mesos.timeout_executor import TimeoutExecutor
+from task_processing.plugins.mesos.translator import mesos_status_to_event
+from task_processing.plugins.persistence.dynamodb_persistence import (
+    DynamoDBPersister
+)
+from task_processing.plugins.persistence.file_persistence import (
+    FilePersistence
+)
+from task_processing.plugins.stateful.stateful_executor import (
+    StatefulTaskExecutor
+)
+from task_processing.runners.sync import Sync
+
+# async is a keyword from python 3.7 on, so the module can't be imported
+# with an import statement.
+async_runner = importlib.import_module('task_processing.runners.async')
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+ROLE = 'benchmark'
+TASKS = 1000
+
+Benchmark = collections.namedtuple('Benchmark', ['name', 'setup', 'ops'])
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(ops):
+    """Register a benchmark of ops operations
+
+    The decorated function sets up the state for one timed run and either
+    returns the function to time or, like a pytest fixture, yields it and
+    cleans up afterwards.
+    """
+    def register(setup):
+        BENCHMARKS[setup.__name__] = Benchmark(setup.__name__, setup, ops)
+        return setup
+    return register
+
+
+def time_benchmark(bench, repeat):
+    """Seconds per operation of every one of repeat runs"""
+    samples = []
+    for _ in range(repeat):
+        setup = bench.setup()
+        if inspect.isgenerator(setup):
+            run = next(setup)
+        else:
+            run = setup
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) / bench.ops)
+        if inspect.isgenerator(setup):
+            for _ in setup:
+                pass
+    return sorted(samples)
+
+
+####################################################################
+#                         Synthetic inputs                         #
+####################################################################
+
+def _task_configs(n=TASKS, **kwargs):
+    kwargs.setdefault('cpus', 0.1)
+    kwargs.setdefault('mem', 32.0)
+    kwargs.setdefault('disk', 10.0)
+    kwargs.setdefault('environment', {'KEY': 'value'})
+    return [
+        MesosTaskConfig(
+            name='benchmark', image='busybox', cmd='/bin/true', **kwargs
+        )
+        for _ in range(n)
+    ]
+
+
+def _offer(cpus, mem, disk, ports=(31000, 32000)):
+    return Dict(
+        id=Dict(value='offer-1'),
+        agent_id=Dict(value='agent-1'),
+        hostname='agent-1.benchmark',
+        resources=[
+            Dict(name=name, type='SCALAR', role=ROLE,
+                 scalar=Dict(value=value))
+            for name, value in [
+                ('cpus', cpus), ('mem', mem), ('disk', disk), ('gpus', 0),
+            ]
+        ] + [
+            Dict(name='ports', type='RANGES', role=ROLE,
+                 ranges=Dict(range=[Dict(begin=ports[0], end=ports[1])])),
+        ],
+        attributes=[],
+    )
+
+
+def _status(task_id, state):
+    return Dict(
+        task_id=Dict(value=task_id),
+        agent_id=Dict(value='agent-1'),
+        state=state,
+        reason='',
+        timestamp=time.time(),
+    )
+
+
+def _event(task_config, terminal=True):
+    return task_event(
+        task_id=task_config.task_id,
+        task_config=task_config,
+        timestamp=time.time(),
+        terminal=terminal,
+        success=True if terminal else None,
+        platform_type='finished' if terminal else 'running',
+        raw=Dict(state='TASK_FINISHED' if terminal else 'TASK_RUNNING'),
+    )
+
+
+def _framework(task_configs, task_state='TASK_INITED'):
+    """An ExecutionFramework that knows about task_configs"""
+    ef = framework_executor(
+        role=ROLE, max_task_queue_size=len(task_configs) + 1,
+    ).execution_framework
+    now = time.time()
+    ef.task_metadata = m(**{
+        task_config.task_id: TaskMetadata(
+            task_config=task_config,
+            task_state=task_state,
+            task_state_history=m(TASK_INITED=now),
+        )
+        for task_config in task_configs
+    })
+    return ef
+
+
+class MemoryPersister(Persister):
+    def __init__(self):
+        self.events = []
+
+    def read(self, task_id):
+        return [e for e in self.events if e.task_id == task_id]
+
+    def write(self, event):
+        self.events.append(event)
+
+
+def _drain(queue, n):
+    for _ in range(n):
+        queue.get()
+
+
+def _event_path(executor, downstream, task_configs):
+    """Time terminal events of running tasks coming out of executor"""
+    executor.run_many(task_configs)
+    queue = executor.get_event_queue()
+
+    def run():
+        downstream.finish(downstream.launched)
+        _drain(queue, len(task_configs))
+
+    yield run
+    executor.stop()
+
+
+####################################################################
+#                           Benchmarks                             #
+####################################################################
+
+@benchmark(ops=TASKS)
+def get_tasks_to_launch():
+    task_configs = _task_configs()
+    ef = _framework(task_configs)
+    for task_config in task_configs:
+        ef.task_queue.put(task_config)
+    offer = _offer(cpus=TASKS, mem=TASKS * 64, disk=TASKS * 64)
+
+    yield lambda: ef.get_tasks_to_launch(offer)
+    ef.stop()
+
+
+@benchmark(ops=TASKS)
+def get_tasks_to_launch_insufficient():
+    task_configs = _task_configs()
+    ef = _framework(task_configs)
+    for task_config in task_configs:
+        ef.task_queue.put(task_config)
+    offer = _offer(cpus=0.01, mem=1, disk=1)
+
+    yield lambda: ef.get_tasks_to_launch(offer)
+    ef.stop()
+
+
+@benchmark(ops=TASKS)
+def create_new_docker_task():
+    task_configs = _task_configs()
+    ef = _framework(task_configs)
+    offer = _offer(cpus=TASKS, mem=TASKS * 64, disk=TASKS * 64)
+    ports = list(range(31000, 31000 + TASKS))
+
+    def run():
+        for task_config in task_configs:
+            ef.create_new_docker_task(offer, task_config, ports)
+
+    yield run
+    ef.stop()
+
+
+@benchmark(ops=10000)
+def create_new_docker_task_shared_template():
+    # Tasks of a typical service: only their ids differ
+    task_configs = _task_configs(
+        10000,
+        volumes=[
+            {'mode': 'RO', 'container_path': '/etc/' + name,
+             'host_path': '/etc/' + name}
+            for name in ('services', 'hosts', 'resolv.conf')
+        ],
+        docker_parameters=[
+            {'key': 'memory-swap', 'value': '64m'},
+            {'key': 'cpu-period', 'value': '100000'},
+        ],
+        uris=['file:///root/.dockercfg'],
+        environment={'KEY{}'.format(i): 'value' for i in range(20)},
+    )
+    ef = _framework(task_configs)
+    offer = _offer(cpus=10000, mem=10000 * 64, disk=10000 * 64)
+    # One port per task, as if each came from an offer of its own
+    ports = [[31000 + i % 1000] for i in range(len(task_configs))]
+
+    def run():
+        for task_config, available_ports in zip(task_configs, ports):
+            ef.create_new_docker_task(offer, task_config, available_ports)
+
+    yield run
+    ef.stop()
+
+
+@benchmark(ops=TASKS)
+def status_update_running():
+    task_configs = _task_configs()
+    ef = _framework(task_configs, task_state='TASK_STAGING')
+    updates = [
+        _status(task_config.task_id, 'TASK_RUNNING')
+        for task_config in task_configs
+    ]
+
+    def run():
+        for update in updates:
+            ef.statusUpdate(ef.driver, update)
+
+    yield run
+    ef.stop()
+
+
+@benchmark(ops=TASKS)
+def status_update_finished():
+    task_configs = _task_configs()
+    ef = _framework(task_configs, task_state='TASK_RUNNING')
+    updates = [
+        _status(task_config.task_id, 'TASK_FINISHED')
+        for task_config in task_configs
+    ]
+
+    def run():
+        for update in updates:
+            ef.statusUpdate(ef.driver, update)
+
+    yield run
+    ef.stop()
+
+
+@benchmark(ops=TASKS)
+def mesos_status_to_event_running():
+    updates = [
+        _status(task_config.task_id, 'TASK_RUNNING')
+        for task_config in _task_configs()
+    ]
+
+    def run():
+        for update in updates:
+            mesos_status_to_event(update, update.task_id.value)
+
+    return run
+
+
+@benchmark(ops=TASKS)
+def event_create():
+    task_configs = _task_configs()
+
+    def run():
+        for task_config in task_configs:
+            _event(task_config)
+
+    return run
+
+
+@benchmark(ops=TASKS)
+def event_set():
+    task_configs = _task_configs()
+    events = [
+        mesos_status_to_event(
+            _status(task_config.task_id, 'TASK_RUNNING'),
+            task_config.task_id,
+        )
+        for task_config in task_configs
+    ]
+
+    def run():
+        for e, task_config in zip(events, task_configs):
+            e.set(task_config=task_config)
+
+    return run
+
+
+@benchmark(ops=TASKS)
+def file_persistence_write():
+    tmpdir = tempfile.mkdtemp()
+    persister = FilePersistence(os.path.join(tmpdir, 'events'))
+    events = [_event(task_config) for task_config in _task_configs()]
+
+    def run():
+        for e in events:
+            persister.write(e)
+
+    yield run
+    shutil.rmtree(tmpdir)
+
+
+@benchmark(ops=10)
+def file_persistence_read():
+    tmpdir = tempfile.mkdtemp()
+    persister = FilePersistence(os.path.join(tmpdir, 'events'))
+    events = [_event(task_config) for task_config in _task_configs()]
+    for e in events:
+        persister.write(e)
+
+    def run():
+        for e in events[:10]:
+            persister.read(e.task_id)
+
+    yield run
+    shutil.rmtree(tmpdir)
+
+
+@benchmark(ops=TASKS)
+def dynamodb_event_to_item():
+    # _event_to_item doesn't talk to DynamoDB, so skip creating clients
+    persister = DynamoDBPersister.__new__(DynamoDBPersister)
+    events = [_event(task_config) for task_config in _task_configs()]
+
+    def run():
+        for e in events:
+            persister._event_to_item(e)
+
+    return run
+
+
+@benchmark(ops=TASKS)
+def retrying_event_path():
+    downstream = HoldingExecutor()
+    return _event_path(
+        RetryingExecutor(downstream), downstream, _task_configs())
+
+
+@benchmark(ops=TASKS)
+def timeout_event_path():
+    downstream = HoldingExecutor()
+    return _event_path(
+        TimeoutExecutor(downstream), downstream,
+        _task_configs(timeout=3600),
+    )
+
+
+@benchmark(ops=TASKS)
+def stateful_event_path():
+    downstream = HoldingExecutor()
+    return _event_path(
+        StatefulTaskExecutor(downstream, MemoryPersister()), downstream,
+        _task_configs(),
+    )
+
+
+@benchmark(ops=100)
+def sync_run():
+    runner = Sync(InstantExecutor())
+    task_configs = _task_configs(100)
+
+    def run():
+        for task_config in task_configs:
+            runner.run(task_config)
+
+    yield run
+    runner.stop()
+
+
+@benchmark(ops=TASKS)
+def async_event_path():
+    task_configs = _task_configs()
+    done = threading.Event()
+    seen = []
+
+    def callback(event):
+        seen.append(event)
+        if len(seen) == len(task_configs):
+            done.set()
+
+    runner = async_runner.Async(InstantExecutor(), [
+        async_runner.EventHandler(
+            predicate=lambda e: e.terminal, cb=callback),
+    ])
+
+    def run():
+        for task_config in task_configs:
+            runner.run(task_config)
+        done.wait()
+
+    yield run
+    runner.stop()
+
+
+####################################################################
+#                            Baselines                             #
+####################################################################
+
+def machine_info():
+    return dict(
+        python=platform.python_version(),
+        implementation=platform.python_implementation(),
+        machine=platform.machine(),
+        processor=platform.processor(),
+        cpus=os.cpu_count(),
+    )
+
+
+def load_baselines(path):
+    """:returns: the machine_info() the baselines were measured on, and
+        the baselines by benchmark name
+    """
+    if not os.path.exists(path):
+        return None, {}
+    with open(path) as f:
+        stored = json.load(f)
+    return stored.get('machine'), stored.get('benchmarks', {})
+
+
+def save_baselines(path, results):
+    machine, baselines = load_baselines(path)
+    if machine != machine_info():
+        # Not comparable with the results, keep them out of the file
+        baselines = {}
+    baselines.update(results)
+    with open(path, 'w') as f:
+        json.dump(
+            dict(machine=machine_info(), benchmarks=baselines),
+            f, indent=2, sort_keys=True,
+        )
+        f.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '-k', '--filter', default='',
+        help='only run benchmarks whose name contains this')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    parser.add_argument(
+        '--save', action='store_true',
+        help='store the results as the new baselines')
+    parser.add_argument(
+        '--check', action='store_true',
+        help='exit with status 1 if a benchmark regressed')
+    parser.add_argument(
+        '--tolerance', type=float, default=0.5,
+        help='slowdown over the baseline counted as a regression')
+    args = parser.parse_args()
+
+    machine, baselines = load_baselines(args.baselines)
+    comparable = machine == machine_info()
+    if baselines and not comparable:
+        print(
+            'Baselines were measured on another machine ({}), regressions '
+            'are only reported. Run with --save for local baselines.'.format(
+                machine)
+        )
+    results = {}
+    regressions = []
+
+    print('{:<36}{:>12}{:>12}{:>12}{:>10}'.format(
+        'benchmark', 'min us', 'median us', 'base us', 'ratio'))
+    for name, bench in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        samples = time_benchmark(bench, args.repeat)
+        best = samples[0] * 1e6
+        results[name] = round(best, 3)
+
+        baseline = baselines.get(name)
+        ratio = best / baseline if baseline else None
+        if ratio is not None and ratio > 1 + args.tolerance:
+            regressions.append(name)
+        print('{:<36}{:>12.3f}{:>12.3f}{:>12}{:>10}{}'.format(
+            name, best, samples[len(samples) // 2] * 1e6,
+            '-' if baseline is None else '{:.3f}'.format(baseline),
+            '-' if ratio is None else '{:.2f}'.format(ratio),
+            '  REGRESSED' if name in regressions else '',
+        ))
+
+    if args.save:
+        save_baselines(args.baselines, results)
+        print('Saved baselines to {}'.format(args.baselines))
+    if regressions:
+        print('Regressed: {}'.format(', '.join(regressions)))
+        if args.check and comparable:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
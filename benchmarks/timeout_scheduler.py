@@ -0,0 +1,71 @@
+"""TimeoutExecutor bookkeeping with many concurrently timed tasks
+
+Times submitting tasks one at a time, processing their terminal events,
+and killing them, with all of them holding a deadline at once::
+
+    python -m benchmarks.timeout_scheduler -n 100000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.fakes import HoldingExecutor
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.timeout_executor import TimeoutExecutor
+
+
+def _task_configs(tasks):
+    return [
+        MesosTaskConfig(
+            image='busybox',
+            cmd='/bin/true',
+            timeout=random.uniform(3600, 7200),
+        )
+        for _ in range(tasks)
+    ]
+
+
+def _timed(fn):
+    start = time.time()
+    fn()
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--tasks', type=int, default=100000)
+    args = parser.parse_args()
+
+    holding = HoldingExecutor()
+    executor = TimeoutExecutor(holding)
+    task_configs = _task_configs(args.tasks)
+    half = args.tasks // 2
+
+    def submit():
+        for task_config in task_configs:
+            executor.run(task_config)
+
+    def finish_half():
+        holding.finish(task_configs[:half])
+        queue = executor.get_event_queue()
+        for _ in range(half):
+            queue.get()
+
+    def kill_rest():
+        for task_config in task_configs[half:]:
+            executor.kill(task_config.task_id)
+
+    for name, fn, count in [
+        ('run() each task', submit, args.tasks),
+        ('terminal event for half', finish_half, half),
+        ('kill() the other half', kill_rest, args.tasks - half),
+    ]:
+        elapsed = _timed(fn)
+        print('{:<28}{:>10.3f} s{:>12.1f} us/task'.format(
+            name, elapsed, elapsed / count * 1e6))
+
+    executor.stop()
+
+
+if __name__ == '__main__':
+    main()
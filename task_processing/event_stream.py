@@ -0,0 +1,145 @@
+from time import time as _time
+
+from six.moves.queue import Empty
+from six.moves.queue import Full
+from six.moves.queue import Queue
+
+
+# Largest number of events passed between executors in one batch
+EVENT_BATCH_SIZE = 100
+
+
+class EventStreamClosed(Exception):
+    """Raised by :meth:`EventStream.get` once a closed stream is drained"""
+    pass
+
+
+class EventStream(Queue):
+    """A Queue of events that can be closed
+
+    Executors and runners hand events to each other through event streams.
+    Consumers block in ``get()`` until an event arrives instead of polling,
+    and closing the stream acts as a shutdown sentinel placed after the
+    last buffered event: consumers drain whatever is left and then get
+    :class:`EventStreamClosed` instead of blocking forever. This is what
+    lets ``stop()`` propagate through a stack of executors right away.
+    """
+
+    def __init__(self, maxsize=0):
+        Queue.__init__(self, maxsize)
+        self.closed = False
+
+    def close(self):
+        with self.mutex:
+            self.closed = True
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+
+    def put(self, item, block=True, timeout=None):
+        with self.not_full:
+            if self.maxsize > 0:
+                if not block:
+                    pass
+                elif timeout is None:
+                    while self._qsize() >= self.maxsize and not self.closed:
+                        self.not_full.wait()
+                else:
+                    endtime = _time() + timeout
+                    while self._qsize() >= self.maxsize and not self.closed:
+                        remaining = endtime - _time()
+                        if remaining <= 0.0:
+                            raise Full
+                        self.not_full.wait(remaining)
+                # A closed stream never blocks producers
+                if self._qsize() >= self.maxsize:
+                    raise Full
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def put_many(self, items):
+        """Put several items with a single lock acquisition and wake-up"""
+        with self.not_full:
+            for item in items:
+                if self.maxsize > 0:
+                    while self._qsize() >= self.maxsize and not self.closed:
+                        # Let consumers drain what is already in
+                        self.not_empty.notify_all()
+                        self.not_full.wait()
+                    if self._qsize() >= self.maxsize:
+                        raise Full
+                self._put(item)
+                self.unfinished_tasks += 1
+            self.not_empty.notify_all()
+
+    def _wait_for_items(self, block, timeout):
+        # Must be called with self.mutex held
+        if not block:
+            pass
+        elif timeout is None:
+            while not self._qsize() and not self.closed:
+                self.not_empty.wait()
+        else:
+            endtime = _time() + timeout
+            while not self._qsize() and not self.closed:
+                remaining = endtime - _time()
+                if remaining <= 0.0:
+                    break
+                self.not_empty.wait(remaining)
+
+        if not self._qsize() and self.closed:
+            raise EventStreamClosed
+        return self._qsize() > 0
+
+    def get(self, block=True, timeout=None):
+        with self.not_empty:
+            if not self._wait_for_items(block, timeout):
+                raise Empty
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+    def get_many(self, max_n, timeout=None):
+        """Wait for at least one item, then take up to max_n at once
+
+        :returns list: the items, or an empty list if timeout expired first
+        """
+        with self.not_empty:
+            if not self._wait_for_items(True, timeout):
+                return []
+            items = [
+                self._get() for _ in range(min(max_n, self._qsize()))
+            ]
+            self.not_full.notify(len(items))
+            return items
+
+    def __iter__(self):
+        """Yield events until the stream is closed and drained"""
+        while True:
+            try:
+                yield self.get()
+            except EventStreamClosed:
+                return
+
+
+def get_many(queue, max_n, timeout=None):
+    """Batched get that works for any queue
+
+    EventStreams take the whole batch under one lock; other queues are
+    drained one event at a time without blocking after the first one.
+
+    :returns list: up to max_n items, empty if timeout expired first
+    """
+    if isinstance(queue, EventStream):
+        return queue.get_many(max_n, timeout)
+
+    try:
+        items = [queue.get(timeout=timeout)]
+    except Empty:
+        return []
+    while len(items) < max_n:
+        try:
+            items.append(queue.get_nowait())
+        except Empty:
+            break
+    return items
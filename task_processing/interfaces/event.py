@@ -57,7 +57,10 @@ def control_event(**kwargs):
 def json_serializer(o):
     if isinstance(o, uuid.UUID):
         return o.hex
-    return json.JSONEncoder.default(o)
+    # Thawed PSets, e.g. MesosTaskConfig.excluded_agent_ids
+    if isinstance(o, (set, frozenset)):
+        return sorted(o)
+    return json.JSONEncoder().default(o)
 
 
 def json_deserializer(dct):
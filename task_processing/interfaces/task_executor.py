@@ -5,6 +5,9 @@ import six
 from pyrsistent import field
 from pyrsistent import PRecord
 
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import get_many
+
 
 class DefaultTaskConfigInterface(PRecord):
     task_id = field(type=uuid.UUID, initial=uuid.uuid4)
@@ -36,6 +39,21 @@ class TaskExecutor(object):
         """
         pass
 
+    def run_many(self, task_configs):
+        """Run all of the supplied tasks
+
+        :param task_configs: An iterable of objects satisfying the
+        TASK_CONFIG_INTERFACE
+        Executors that can submit tasks in bulk more cheaply than one at a
+        time should override this; the default just calls run() for each.
+
+        :returns list task_ids: The ids of the tasks that were run
+        """
+        task_configs = list(task_configs)
+        for task_config in task_configs:
+            self.run(task_config)
+        return [task_config.task_id for task_config in task_configs]
+
     @abc.abstractmethod
     def kill(self, task_id):
         """Kill the specified task
@@ -44,6 +62,24 @@ class TaskExecutor(object):
         """
         pass
 
+    def kill_many(self, task_ids):
+        """Kill all of the specified tasks
+
+        :param task_ids: An iterable of the tasks that you want to kill
+        """
+        for task_id in task_ids:
+            self.kill(task_id)
+
+    @abc.abstractmethod
+    def kill_matching(self, predicate):
+        """Kill every task whose task_config satisfies the predicate
+
+        :param predicate: Called with the task_config of each task the
+            executor knows about, returns whether to kill it
+        :returns list task_ids: The tasks that were killed
+        """
+        pass
+
     @abc.abstractmethod
     def stop(self):
         """Stop the executor stack
@@ -54,6 +90,22 @@ class TaskExecutor(object):
     def get_event_queue(self):
         """Get queue of events
 
-        :returns: TBD
+        :returns: an :class:`task_processing.event_stream.EventStream` that
+            is closed once the executor has stopped
         """
         pass
+
+    def get_events(self, max_n=EVENT_BATCH_SIZE, timeout=None):
+        """Get a batch of events
+
+        Cheaper than taking events off the event queue one at a time when
+        there are many of them.
+
+        :param int max_n: The most events to return
+        :param timeout: Seconds to wait for the first event, or None to wait
+            until there is one
+        :returns list: Up to max_n events, empty if timeout expired
+        :raises EventStreamClosed: once the executor has stopped and all
+            of its events have been consumed
+        """
+        return get_many(self.get_event_queue(), max_n, timeout)
@@ -1,3 +1,11 @@
+import math
+import os
+import re
+import threading
+import time
+
+from six.moves import BaseHTTPServer
+
 try:
     import yelp_meteorite
     METRICS_ENABLED = True
@@ -18,12 +26,121 @@ class _DummyMetricType(object):
     stop = count
 
 
+class Counter(object):
+    """In-process counter, used when yelp_meteorite is not installed"""
+
+    def __init__(self, name, dimensions):
+        self.name = name
+        self.dimensions = dimensions
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def count(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Gauge(object):
+    """In-process gauge, used when yelp_meteorite is not installed"""
+
+    def __init__(self, name, dimensions):
+        self.name = name
+        self.dimensions = dimensions
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram(object):
+    """In-process histogram with HDR-style log-linear buckets
+
+    Every power of two is split into ``2 ** SUB_BUCKET_BITS`` linear
+    buckets, so quantiles are exact to within ~1.5% of the value at any
+    magnitude while recording stays a dict increment. Also serves as the
+    timer type: ``start()``/``stop()`` record the elapsed seconds.
+    """
+
+    SUB_BUCKET_BITS = 6
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+    # Sorts before every other bucket
+    ZERO_BUCKET = (float('-inf'), 0)
+
+    def __init__(self, name, dimensions):
+        self.name = name
+        self.dimensions = dimensions
+        self.buckets = {}
+        self.total = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._started = None
+        self._lock = threading.Lock()
+
+    def _bucket(self, value):
+        if value <= 0:
+            return self.ZERO_BUCKET
+        mantissa, exponent = math.frexp(value)
+        # mantissa is in [0.5, 1)
+        sub_buckets = 1 << self.SUB_BUCKET_BITS
+        return (exponent, int((mantissa - 0.5) * 2 * sub_buckets))
+
+    def _bucket_value(self, bucket):
+        if bucket == self.ZERO_BUCKET:
+            return 0.0
+        exponent, sub_bucket = bucket
+        sub_buckets = 1 << self.SUB_BUCKET_BITS
+        mantissa = 0.5 + (sub_bucket + 0.5) / (2.0 * sub_buckets)
+        return math.ldexp(mantissa, exponent)
+
+    def record(self, value):
+        bucket = self._bucket(value)
+        with self._lock:
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+            self.total += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def start(self):
+        self._started = time.time()
+
+    def stop(self):
+        if self._started is not None:
+            self.record(time.time() - self._started)
+            self._started = None
+
+    def quantile(self, q):
+        """Approximate value below which a fraction q of records fall"""
+        with self._lock:
+            if not self.total:
+                return None
+            rank = q * self.total
+            seen = 0
+            for bucket in sorted(self.buckets):
+                seen += self.buckets[bucket]
+                if seen >= rank:
+                    value = self._bucket_value(bucket)
+                    return min(max(value, self.min), self.max)
+            return self.max
+
+
 _dummy_metric = _DummyMetricType()
 _registered_metrics = {}
+_registry_lock = threading.Lock()
+
+
+def _register(name, metric_type, dimensions):
+    with _registry_lock:
+        if name not in _registered_metrics:
+            _registered_metrics[name] = metric_type(name, dict(dimensions))
 
 
 def create_counter(name, dimensions={}):
     if not METRICS_ENABLED:
+        _register(name, Counter, dimensions)
         return
 
     if name not in _registered_metrics:
@@ -32,8 +149,20 @@ def create_counter(name, dimensions={}):
         _registered_metrics[name] = counter
 
 
+def create_gauge(name, dimensions={}):
+    if not METRICS_ENABLED:
+        _register(name, Gauge, dimensions)
+        return
+
+    if name not in _registered_metrics:
+        gauge = yelp_meteorite.create_gauge(
+            name, default_dimensions=dimensions)
+        _registered_metrics[name] = gauge
+
+
 def create_timer(name, dimensions={}):
     if not METRICS_ENABLED:
+        _register(name, Histogram, dimensions)
         return
 
     if name not in _registered_metrics:
@@ -42,8 +171,109 @@ def create_timer(name, dimensions={}):
         _registered_metrics[name] = timer
 
 
+# yelp_meteorite timers are histograms as well
+create_histogram = create_timer
+
+
 def get_metric(name):
     if METRICS_ENABLED:
         return _registered_metrics.get(name)
     else:
-        return _dummy_metric
+        return _registered_metrics.get(name, _dummy_metric)
+
+
+def _prometheus_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _prometheus_labels(dimensions, **extra):
+    labels = dict(dimensions, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            _prometheus_name(key),
+            str(value).replace('\\', '\\\\').replace('"', '\\"'),
+        )
+        for key, value in sorted(labels.items())
+    ) + '}'
+
+
+def render_prometheus():
+    """Render the in-process metrics in the Prometheus text format"""
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registered_metrics.items())
+    for name, metric in metrics:
+        name = _prometheus_name(name)
+        if isinstance(metric, Counter):
+            lines.append('# TYPE {} counter'.format(name))
+            lines.append('{}{} {}'.format(
+                name, _prometheus_labels(metric.dimensions), metric.value))
+        elif isinstance(metric, Gauge):
+            lines.append('# TYPE {} gauge'.format(name))
+            lines.append('{}{} {}'.format(
+                name, _prometheus_labels(metric.dimensions), metric.value))
+        elif isinstance(metric, Histogram):
+            lines.append('# TYPE {} summary'.format(name))
+            for q in Histogram.QUANTILES:
+                value = metric.quantile(q)
+                lines.append('{}{} {}'.format(
+                    name,
+                    _prometheus_labels(metric.dimensions, quantile=q),
+                    'NaN' if value is None else repr(value),
+                ))
+            labels = _prometheus_labels(metric.dimensions)
+            lines.append('{}_sum{} {!r}'.format(name, labels, metric.sum))
+            lines.append('{}_count{} {}'.format(name, labels, metric.total))
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_exporter(port=9090, host='127.0.0.1'):
+    """Serve the in-process metrics for Prometheus from a daemon thread
+
+    :returns: the HTTPServer; call ``shutdown()`` on it to stop serving
+    """
+    server = BaseHTTPServer.HTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def write_metrics_file(path):
+    """Atomically replace path with the rendered in-process metrics"""
+    tmp_path = '{}.tmp'.format(path)
+    with open(tmp_path, 'w') as f:
+        f.write(render_prometheus())
+    os.rename(tmp_path, path)
+
+
+def start_file_exporter(path, interval_s=10.0):
+    """Rewrite path with the in-process metrics every interval_s seconds
+
+    :returns: a threading.Event; set it to stop exporting
+    """
+    stopped = threading.Event()
+
+    def export():
+        while not stopped.wait(interval_s):
+            write_metrics_file(path)
+
+    thread = threading.Thread(target=export)
+    thread.daemon = True
+    thread.start()
+    return stopped
@@ -1,3 +1,5 @@
+from .federated_executor import FederatedExecutor
+from .hedging_executor import HedgingExecutor
 from .mesos_executor import MesosExecutor
 from .retrying_executor import RetryingExecutor
 from .timeout_executor import TimeoutExecutor
@@ -8,6 +10,8 @@ TASK_PROCESSING_PLUGIN = 'mesos_plugin'
 
 def register_plugin(registry):
     return registry \
+        .register_task_executor('federated', FederatedExecutor) \
+        .register_task_executor('hedging', HedgingExecutor) \
         .register_task_executor('mesos', MesosExecutor) \
         .register_task_executor('retrying', RetryingExecutor) \
         .register_task_executor('timeout', TimeoutExecutor)
@@ -0,0 +1,175 @@
+import collections
+import threading
+
+from task_processing.plugins.mesos.constraints import compile_constraints
+from task_processing.plugins.mesos.constraints import parse_attributes
+
+SCALAR_RESOURCES = ('cpus', 'mem', 'disk', 'gpus')
+
+
+def parse_resources(offer, role):
+    """The resources of an offer reserved for role
+
+    :returns: a dict of the scalar resources, and the ports resource under
+        ``ports`` if there is one
+    """
+    resources = dict.fromkeys(SCALAR_RESOURCES, 0.0)
+    for resource in offer.resources:
+        if resource.role != role:
+            continue
+        if resource.name in resources:
+            resources[resource.name] += resource.scalar.value
+        elif resource.name == 'ports':
+            resources['ports'] = resource
+    return resources
+
+
+class Agent(object):
+    __slots__ = (
+        'agent_id', 'hostname', 'attributes', 'capacity', 'task_ids',
+        'last_offer_at', 'lost',
+    )
+
+    def __init__(self, agent_id, hostname, attributes):
+        self.agent_id = agent_id
+        self.hostname = hostname
+        self.attributes = attributes
+        # Largest amount of every resource seen offered at once
+        self.capacity = dict.fromkeys(SCALAR_RESOURCES, 0.0)
+        self.task_ids = set()
+        self.last_offer_at = None
+        self.lost = False
+
+
+class AgentRegistry(object):
+    """What the framework knows about every agent it got offers from
+
+    Attributes are parsed from an agent's first offer: Mesos gives an agent
+    a new id when its attributes change. Capacity is the most of every
+    resource seen offered at once, and the tasks of every agent are tracked
+    from when they are matched to its offer until a terminal status update.
+    Placement constraints are checked against what is known here.
+    """
+
+    def __init__(self, role):
+        self.role = role
+        self.agents = {}
+        # attribute -> values seen on any agent
+        self.values = collections.defaultdict(set)
+        # task_id -> (group, agent_id)
+        self.placements = {}
+        # group -> agent_id -> number of tasks
+        self.groups = collections.defaultdict(collections.Counter)
+        self._lock = threading.RLock()
+
+    def __contains__(self, agent_id):
+        return agent_id in self.agents
+
+    def get(self, agent_id):
+        return self.agents.get(agent_id)
+
+    def update_from_offer(self, offer, now=None):
+        """Record an offer
+
+        :returns: (the offer's Agent, its parsed resources)
+        """
+        resources = parse_resources(offer, self.role)
+        with self._lock:
+            agent = self._agent(offer)
+            self.update_capacity(agent, resources)
+            agent.last_offer_at = now
+            agent.lost = False
+        return agent, resources
+
+    def update_capacity(self, agent, resources):
+        """Record resources offered at once by agent, e.g. by several of its
+        offers together
+        """
+        with self._lock:
+            for name in SCALAR_RESOURCES:
+                if resources[name] > agent.capacity[name]:
+                    agent.capacity[name] = resources[name]
+
+    def agent_for_offer(self, offer):
+        with self._lock:
+            return self._agent(offer)
+
+    def _agent(self, offer):
+        agent_id = offer.agent_id.value
+        agent = self.agents.get(agent_id)
+        if agent is None:
+            attributes = parse_attributes(offer)
+            agent = Agent(agent_id, offer.hostname, attributes)
+            self.agents[agent_id] = agent
+            for name, value in attributes.items():
+                self.values[name].add(value)
+        return agent
+
+    def agent_lost(self, agent_id):
+        with self._lock:
+            agent = self.agents.get(agent_id)
+            if agent is not None:
+                agent.lost = True
+
+    def known_values(self, attribute):
+        return self.values.get(attribute, set())
+
+    def task_placed(self, task_id, group, agent_id):
+        with self._lock:
+            self._task_removed(task_id)
+            self.placements[task_id] = (group, agent_id)
+            self.groups[group][agent_id] += 1
+            agent = self.agents.get(agent_id)
+            if agent is not None:
+                agent.task_ids.add(task_id)
+
+    def task_removed(self, task_id):
+        """The task reached a terminal state or is waiting for an offer"""
+        with self._lock:
+            self._task_removed(task_id)
+
+    def _task_removed(self, task_id):
+        placement = self.placements.pop(task_id, None)
+        if placement is None:
+            return
+        group, agent_id = placement
+        agents = self.groups[group]
+        agents[agent_id] -= 1
+        if agents[agent_id] <= 0:
+            del agents[agent_id]
+        if not agents:
+            del self.groups[group]
+        agent = self.agents.get(agent_id)
+        if agent is not None:
+            agent.task_ids.discard(task_id)
+
+    def value_counts(self, group, attribute):
+        """Tasks of group per value of attribute on their agents"""
+        counts = collections.Counter()
+        with self._lock:
+            for agent_id, n in self.groups.get(group, {}).items():
+                agent = self.agents.get(agent_id)
+                value = agent and agent.attributes.get(attribute)
+                if value is not None:
+                    counts[value] += n
+        return counts
+
+    def allows(self, task_config, agent):
+        """Whether the constraints of task_config allow placing it on agent"""
+        value_counts = _memoize(
+            lambda attribute: self.value_counts(task_config.name, attribute))
+        for predicate in compile_constraints(task_config.constraints):
+            if not predicate(agent.attributes, value_counts,
+                             self.known_values):
+                return False
+        return True
+
+
+def _memoize(fn):
+    results = {}
+
+    def memoized(arg):
+        if arg not in results:
+            results[arg] = fn(arg)
+        return results[arg]
+    return memoized
@@ -0,0 +1,74 @@
+import collections
+import threading
+
+# How a cluster is keeping up with its tasks, see ExecutionFramework.load
+ClusterLoad = collections.namedtuple('ClusterLoad', [
+    # Tasks and groups waiting for offers
+    'queue_depth',
+    # Offers and matched tasks per second, over the recent past
+    'offer_rate',
+    'match_rate',
+    # Moving average of how long matched tasks waited for an offer
+    'queued_time',
+    # How long queued tasks have gone without any of them being matched
+    'waiting_s',
+])
+
+
+class RateWindow(object):
+    """Rate of events over the last ``window_s`` seconds
+
+    Events are counted in ``buckets`` slices of the window, so that
+    recording one is cheap and old ones fall out a slice at a time.
+    """
+
+    def __init__(self, window_s=60.0, buckets=12):
+        self.window_s = float(window_s)
+        self.bucket_s = self.window_s / buckets
+        # [bucket number, events], oldest first
+        self._counts = collections.deque(maxlen=buckets)
+        self._lock = threading.Lock()
+
+    def record(self, now, count=1):
+        bucket = int(now / self.bucket_s)
+        with self._lock:
+            if self._counts and self._counts[-1][0] == bucket:
+                self._counts[-1][1] += count
+            else:
+                self._counts.append([bucket, count])
+
+    def rate(self, now):
+        """Events per second"""
+        first = int(now / self.bucket_s) - self._counts.maxlen + 1
+        with self._lock:
+            total = sum(
+                count for bucket, count in self._counts if bucket >= first)
+        return total / self.window_s
+
+
+def estimated_wait(load, queued=0):
+    """Seconds a task queued now would wait for an offer
+
+    The queue ahead of it drains at the rate tasks were matched lately, or
+    at one task per offer when nothing was matched. The estimate is never
+    below how long the queue has already been waiting, nor below how long
+    tasks recently waited if some are still queued.
+
+    :param int queued: tasks about to be queued ahead of it
+    :returns float: the estimate, infinite for a cluster that is neither
+        matching tasks nor getting offers
+    """
+    ahead = load.queue_depth + queued
+    rate = load.match_rate or load.offer_rate
+    if rate > 0:
+        drain_s = (ahead + 1) / rate
+    elif ahead or load.waiting_s:
+        return float('inf')
+    else:
+        # Nothing to go by yet
+        drain_s = 0.0
+    return max(
+        drain_s,
+        load.waiting_s,
+        load.queued_time if ahead else 0.0,
+    )
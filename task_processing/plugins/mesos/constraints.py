@@ -0,0 +1,156 @@
+"""Placement constraints for Mesos tasks
+
+Constraints are lists of ``[attribute, operator, value]``, checked against
+the attributes of the agent an offer comes from. Besides the agent's Mesos
+attributes, ``hostname`` and ``agent_id`` can be constrained on. Operators:
+
+- ``EQUALS``: the attribute has the given value
+- ``IN``: the attribute has one of the given values
+- ``LIKE``: the attribute matches the given regular expression
+- ``UNIQUE``: no other task of the group runs where the attribute has the
+  same value, e.g. ``['hostname', 'UNIQUE']``
+- ``MAX_PER``: at most value tasks of the group run where the attribute
+  has the same value, e.g. ``['agent_id', 'MAX_PER', 2]``
+- ``GROUP_BY``: spread the tasks of the group evenly over the values of
+  the attribute, e.g. ``['zone', 'GROUP_BY']``. An optional value is the
+  number of distinct values to expect, for when not all of them have
+  been seen in offers yet.
+
+The group of a task is its name: tasks with the same name constrain each
+other. Constraints are compiled once per distinct list into predicates.
+"""
+import re
+import threading
+
+OPERATORS = ['EQUALS', 'IN', 'LIKE', 'UNIQUE', 'MAX_PER', 'GROUP_BY']
+
+# Bound on compiled constraint lists kept around
+_MAX_COMPILED = 1000
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def parse_attributes(offer):
+    """The attributes of the agent an offer comes from, as a dict"""
+    attributes = {
+        'hostname': offer.hostname,
+        'agent_id': offer.agent_id.value,
+    }
+    for attribute in offer.attributes:
+        if attribute.type == 'SCALAR':
+            attributes[attribute.name] = str(attribute.scalar.value)
+        else:
+            attributes[attribute.name] = attribute.text.value
+    return attributes
+
+
+def _equals(attribute, value):
+    def predicate(attributes, value_counts, known_values):
+        return attributes.get(attribute) == value
+    return predicate
+
+
+def _in(attribute, values):
+    values = frozenset(values)
+
+    def predicate(attributes, value_counts, known_values):
+        return attributes.get(attribute) in values
+    return predicate
+
+
+def _like(attribute, pattern):
+    regex = re.compile(r'(?:{})\Z'.format(pattern))
+
+    def predicate(attributes, value_counts, known_values):
+        value = attributes.get(attribute)
+        return value is not None and regex.match(value) is not None
+    return predicate
+
+
+def _max_per(attribute, limit):
+    limit = int(limit)
+
+    def predicate(attributes, value_counts, known_values):
+        value = attributes.get(attribute)
+        return value is not None and \
+            value_counts(attribute)[value] < limit
+    return predicate
+
+
+def _unique(attribute, _=None):
+    return _max_per(attribute, 1)
+
+
+def _group_by(attribute, expected_values=0):
+    expected_values = int(expected_values)
+
+    def predicate(attributes, value_counts, known_values):
+        value = attributes.get(attribute)
+        if value is None:
+            return False
+        counts = value_counts(attribute)
+        values = known_values(attribute) | set(counts)
+        if len(values) < expected_values:
+            # Some values haven't been seen yet, and have no tasks
+            least = 0
+        else:
+            least = min(counts[v] for v in values)
+        return counts[value] <= least
+    return predicate
+
+
+_COMPILERS = {
+    'EQUALS': _equals,
+    'IN': _in,
+    'LIKE': _like,
+    'UNIQUE': _unique,
+    'MAX_PER': _max_per,
+    'GROUP_BY': _group_by,
+}
+
+
+def compile_constraint(constraint):
+    """Compile one ``[attribute, operator, value]`` constraint
+
+    :raises ValueError: if the constraint is malformed
+    """
+    if not 2 <= len(constraint) <= 3:
+        raise ValueError(
+            'Constraint must be [attribute, operator(, value)]: {}'.format(
+                list(constraint)))
+    attribute, operator = constraint[0], constraint[1]
+    if operator not in _COMPILERS:
+        raise ValueError('Unknown constraint operator {}, must be one of '
+                         '{}'.format(operator, OPERATORS))
+    if len(constraint) == 2 and operator not in ('UNIQUE', 'GROUP_BY'):
+        raise ValueError('Constraint operator {} needs a value'.format(
+            operator))
+    try:
+        return _COMPILERS[operator](attribute, *constraint[2:])
+    except (TypeError, re.error) as e:
+        raise ValueError('Invalid constraint {}: {}'.format(
+            list(constraint), e))
+
+
+def compile_constraints(constraints):
+    """Predicates for a list of constraints, compiled once per list"""
+    with _compiled_lock:
+        predicates = _compiled.get(constraints)
+    if predicates is not None:
+        return predicates
+
+    predicates = [compile_constraint(c) for c in constraints]
+    with _compiled_lock:
+        if len(_compiled) >= _MAX_COMPILED:
+            _compiled.clear()
+        _compiled[constraints] = predicates
+    return predicates
+
+
+def valid_constraints(constraints):
+    for constraint in constraints:
+        try:
+            compile_constraint(constraint)
+        except ValueError as e:
+            return (False, str(e))
+    return (True, None)
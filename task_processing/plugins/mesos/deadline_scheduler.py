@@ -0,0 +1,112 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import traceback
+
+log = logging.getLogger(__name__)
+
+
+class DeadlineScheduler(object):
+    """Calls ``callback(key)`` from a background thread once the deadline
+    scheduled for ``key`` has passed.
+
+    Deadlines live in a heap indexed by key: scheduling is O(log n) and
+    cancelling is O(1), leaving a stale heap entry behind that is skipped
+    when it reaches the top (the heap is compacted once stale entries
+    outnumber live ones). The thread sleeps until the earliest deadline
+    and is woken up only when a new deadline becomes the earliest.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self._heap = []
+        # key -> sequence number of its live heap entry
+        self._entries = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self.stopping = False
+
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, deadline):
+        """Schedule key for deadline, replacing any earlier schedule"""
+        self.schedule_many([(key, deadline)])
+
+    def schedule_many(self, keys_and_deadlines):
+        with self._condition:
+            earliest = self._heap[0][0] if self._heap else None
+            for key, deadline in keys_and_deadlines:
+                sequence = next(self._sequence)
+                self._entries[key] = sequence
+                heapq.heappush(self._heap, (deadline, sequence, key))
+            if earliest is None or self._heap[0][0] < earliest:
+                self._condition.notify()
+
+    def cancel(self, key):
+        """Cancel the deadline for key
+
+        :returns bool: whether a deadline was scheduled for key
+        """
+        with self._condition:
+            if self._entries.pop(key, None) is None:
+                return False
+            if len(self._heap) > 2 * len(self._entries) + 1000:
+                self._compact()
+            return True
+
+    def stop(self):
+        with self._condition:
+            self.stopping = True
+            self._condition.notify()
+
+    def _compact(self):
+        self._heap = [
+            entry for entry in self._heap
+            if self._entries.get(entry[2]) == entry[1]
+        ]
+        heapq.heapify(self._heap)
+
+    def _pop_due(self):
+        """Pop every live key that is due
+
+        :returns: (due keys, seconds until the next deadline or None)
+        """
+        due = []
+        now = time.time()
+        while self._heap:
+            deadline, sequence, key = self._heap[0]
+            if self._entries.get(key) != sequence:
+                heapq.heappop(self._heap)
+                continue
+            if deadline > now:
+                return due, deadline - now
+            heapq.heappop(self._heap)
+            del self._entries[key]
+            due.append(key)
+        return due, None
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                if self.stopping:
+                    return
+                due, wait = self._pop_due()
+                if not due:
+                    self._condition.wait(wait)
+                    continue
+
+            for key in due:
+                try:
+                    self.callback(key)
+                except Exception:
+                    log.error(traceback.format_exc())
@@ -0,0 +1,87 @@
+import threading
+
+from addict import Dict
+
+
+class DeclineFilters(object):
+    """Chooses how long Mesos should hold back an agent's offers after one
+    of them was declined, depending on why it was declined
+
+    - Offers for another pool won't become useful, so they are refused
+      for ``bad_pool_s``.
+    - Offers of blacklisted agents are refused until the blacklist
+      expires.
+    - Offers too small for every queued task may fit once tasks on the
+      agent finish. The deeper the queue, the sooner they are worth
+      another look, and every consecutive decline of the same agent
+      doubles its refusal until a task is launched there, between
+      ``min_insufficient_s`` and ``max_insufficient_s``.
+    - Offers declined because there is nothing to run start at
+      ``default_s``, and every consecutive offer pass that finds the queue
+      empty doubles the refusal, up to ``max_no_tasks_s``. Reviving offers
+      clears the filter when tasks show up.
+    """
+
+    def __init__(
+        self,
+        default_s=10,
+        bad_pool_s=300,
+        min_insufficient_s=1,
+        max_insufficient_s=60,
+        queue_depth_scale=100,
+        max_no_tasks_s=300,
+    ):
+        self.default_s = default_s
+        self.bad_pool_s = bad_pool_s
+        self.min_insufficient_s = min_insufficient_s
+        self.max_insufficient_s = max_insufficient_s
+        self.queue_depth_scale = queue_depth_scale
+        self.max_no_tasks_s = max_no_tasks_s
+
+        # agent_id -> consecutive declines for insufficient resources
+        self._insufficient_streaks = {}
+        # consecutive offer passes that found the task queue empty
+        self._no_tasks_streak = 0
+        self._lock = threading.Lock()
+
+    def no_tasks(self):
+        refuse_s = self.default_s * 2 ** min(self._no_tasks_streak, 16)
+        return max(self.default_s, min(self.max_no_tasks_s, refuse_s))
+
+    def queue_empty(self):
+        """An offer pass found nothing to run: back off the next one"""
+        with self._lock:
+            self._no_tasks_streak += 1
+
+    def tasks_queued(self):
+        """An offer pass found tasks to run: stop backing off"""
+        with self._lock:
+            self._no_tasks_streak = 0
+
+    def bad_pool(self):
+        return self.bad_pool_s
+
+    def blacklisted(self, expires_at, now):
+        """Refuse until expires_at, if the blacklist expiry is known"""
+        if expires_at is None:
+            return self.default_s
+        return max(self.min_insufficient_s, expires_at - now)
+
+    def insufficient(self, agent_id, queue_depth):
+        with self._lock:
+            streak = self._insufficient_streaks.get(agent_id, 0) + 1
+            self._insufficient_streaks[agent_id] = streak
+        refuse_s = self.max_insufficient_s * self.queue_depth_scale / \
+            float(self.queue_depth_scale + queue_depth)
+        refuse_s *= 2 ** min(streak - 1, 16)
+        return min(
+            self.max_insufficient_s, max(self.min_insufficient_s, refuse_s))
+
+    def launched(self, agent_id):
+        """A task was launched on agent_id: its offers fit again"""
+        with self._lock:
+            self._insufficient_streaks.pop(agent_id, None)
+
+    @staticmethod
+    def filters(refuse_seconds):
+        return Dict(refuse_seconds=refuse_seconds)
@@ -2,6 +2,9 @@ import logging
 import socket
 import threading
 import time
+import traceback
+import uuid
+from collections import deque
 
 from addict import Dict
 from pymesos.interface import Scheduler
@@ -10,15 +13,34 @@ from pyrsistent import m
 from pyrsistent import PMap
 from pyrsistent import pmap
 from pyrsistent import PRecord
-from pyrsistent import thaw
 from pyrsistent import v
+from six.moves.queue import Full
 from six.moves.queue import Queue
 
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import EventStream
+from task_processing.event_stream import EventStreamClosed
+from task_processing.event_stream import get_many
 from task_processing.interfaces.event import control_event
 from task_processing.metrics import create_counter
 from task_processing.metrics import create_timer
 from task_processing.metrics import get_metric
+from task_processing.plugins.mesos.agent_registry import AgentRegistry
+from task_processing.plugins.mesos.cluster_load import ClusterLoad
+from task_processing.plugins.mesos.cluster_load import RateWindow
+from task_processing.plugins.mesos.decline_filters import DeclineFilters
+from task_processing.plugins.mesos.placement import fitting_slots
+from task_processing.plugins.mesos.placement import get_strategy
+from task_processing.plugins.mesos.placement import OfferSlot
+from task_processing.plugins.mesos.rate_limiter import RateLimiter
+from task_processing.plugins.mesos.revive_controller import ReviveController
+from task_processing.plugins.mesos.task_group import GROUP_EXECUTOR_RESOURCES
+from task_processing.plugins.mesos.task_group import Resources
+from task_processing.plugins.mesos.task_group import TaskGroup
+from task_processing.plugins.mesos.task_info import TaskInfoTemplates
 from task_processing.plugins.mesos.translator import mesos_status_to_event
+from task_processing.profiling import CycleProfiler
+from task_processing.tracing import TaskTracer
 
 
 TASK_LAUNCHED_COUNT = 'taskproc.mesos.task_launched_count'
@@ -38,7 +60,28 @@ TASK_INSUFFICIENT_OFFER_COUNT = 'taskproc.mesos.task_insufficient_offer_count'
 TASK_STUCK_COUNT = 'taskproc.mesos.task_stuck_count'
 
 OFFER_DELAY_TIMER = 'taskproc.mesos.offer_delay'
+EVENT_LATENCY_TIMER = 'taskproc.mesos.event_latency'
+OFFER_LIFETIME_TIMER = 'taskproc.mesos.offer_lifetime'
+OFFER_RESCINDED_COUNT = 'taskproc.mesos.offer_rescinded_count'
 BLACKLISTED_AGENTS_COUNT = 'taskproc.mesos.blacklisted_agents_count'
+OFFERS_REVIVED_COUNT = 'taskproc.mesos.offers_revived_count'
+OFFERS_SUPPRESSED_COUNT = 'taskproc.mesos.offers_suppressed_count'
+
+# Weight of the latest task in the moving average of queued time
+QUEUED_TIME_WEIGHT = 0.1
+
+OFFER_CYCLE_PREFIX = 'taskproc.mesos.offer_cycle'
+# Stages of resourceOffers that are timed separately
+OFFER_CYCLE_STAGES = [
+    'maintenance',
+    'blacklist',
+    'pool',
+    'matching',
+    'task_info',
+    'driver',
+    'bookkeeping',
+    'logging',
+]
 
 
 FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s - %(message)s'
@@ -51,6 +94,7 @@ class TaskMetadata(PRecord):
     task_config = field(type=PRecord, mandatory=True)
     task_state = field(type=str, mandatory=True)
     task_state_history = field(type=PMap, factory=pmap, mandatory=True)
+    group_id = field(type=(str, type(None)), initial=None)
 
 
 class ExecutionFramework(Scheduler):
@@ -64,9 +108,16 @@ class ExecutionFramework(Scheduler):
         translator=mesos_status_to_event,
         slave_blacklist_timeout_s=900,
         offer_backoff=10,
+        bad_pool_offer_backoff=300,
+        max_insufficient_offer_backoff=60,
         suppress_delay=10,
+        max_suppress_delay=300,
+        min_revive_interval=1,
         initial_decline_delay=1,
         task_reconciliation_delay=300,
+        max_kills_per_second=100,
+        trace_sample_rate=0.0,
+        placement_strategy='first_fit',
     ):
         self.name = name
         # wait this long for a task to launch.
@@ -86,22 +137,56 @@ class ExecutionFramework(Scheduler):
         )
 
         self.task_queue = Queue(max_task_queue_size)
-        self.event_queue = Queue(max_task_queue_size)
+        self.event_queue = EventStream(max_task_queue_size)
         self.driver = None
-        self.are_offers_suppressed = False
-        self.suppress_after = int(time.time()) + suppress_delay
+        self.revive_controller = ReviveController(
+            revive=self._revive_offers,
+            suppress=self._suppress_offers,
+            min_revive_interval_s=min_revive_interval,
+            min_suppress_delay_s=suppress_delay,
+            max_suppress_delay_s=max_suppress_delay,
+        )
         self.decline_after = time.time() + initial_decline_delay
         self._task_reconciliation_delay = task_reconciliation_delay
         self._reconcile_tasks_at = time.time() + \
             self._task_reconciliation_delay
 
         self.offer_decline_filter = Dict(refuse_seconds=self.offer_backoff)
+        self.decline_filters = DeclineFilters(
+            default_s=self.offer_backoff,
+            bad_pool_s=bad_pool_offer_backoff,
+            max_insufficient_s=max_insufficient_offer_backoff,
+        )
         self._lock = threading.RLock()
         self.blacklisted_slaves = v()
+        # agent_id -> when the last of its blacklist entries expires
+        self.blacklist_expirations = {}
+        self.agent_registry = AgentRegistry(self.role)
+        # Name of a strategy in placement.STRATEGIES, or a
+        # PlacementStrategy. Tasks can pick their own.
+        self.placement_strategy = get_strategy(placement_strategy)
+        self.task_info_templates = TaskInfoTemplates(self.role)
         self.task_metadata = m()
+        # group_id -> TaskGroup, until all of its tasks are done
+        self.task_groups = {}
+        self.framework_id = None
 
         self._initialize_metrics()
+        self.tracer = TaskTracer(
+            sample_rate=trace_sample_rate,
+            dimensions=self._metric_dimensions(),
+        )
+        self.offer_profiler = CycleProfiler(
+            OFFER_CYCLE_PREFIX,
+            OFFER_CYCLE_STAGES,
+            dimensions=self._metric_dimensions(),
+        )
         self._last_offer_time = None
+        # For load()
+        self._offer_rate = RateWindow()
+        self._match_rate = RateWindow()
+        self._queued_time = 0.0
+        self._last_match_at = None
         self._terminal_task_counts = {
             'TASK_FINISHED': TASK_FINISHED_COUNT,
             'TASK_LOST': TASK_LOST_COUNT,
@@ -110,12 +195,37 @@ class ExecutionFramework(Scheduler):
             'TASK_ERROR': TASK_ERROR_COUNT,
         }
 
+        # Kills that have to go to Mesos are rate limited; the ones over
+        # the limit wait in _pending_kills for the kill thread.
+        self._kill_limiter = RateLimiter(max_kills_per_second)
+        self._pending_kills = deque()
+        # Tasks killed after an offer took them out of the task queue but
+        # before they were launched or put back.
+        self._killed_in_flight = set()
+        self._kill_condition = threading.Condition()
+
+        # Offers are matched on their own thread so that the driver thread
+        # is free to deliver status updates. offer_id -> when it arrived,
+        # for offers that haven't been launched on or declined yet.
+        self._offer_queue = EventStream()
+        self._pending_offers = {}
+        self._rescinded_offers = set()
+
         self.stopping = False
+        offer_thread = threading.Thread(target=self._offer_loop, args=())
+        offer_thread.daemon = True
+        offer_thread.start()
+
         task_kill_thread = threading.Thread(
             target=self._background_check, args=())
         task_kill_thread.daemon = True
         task_kill_thread.start()
 
+        mesos_kill_thread = threading.Thread(
+            target=self._kill_loop, args=())
+        mesos_kill_thread.daemon = True
+        mesos_kill_thread.start()
+
     def _background_check(self):
         while True:
             if self.stopping:
@@ -189,13 +299,124 @@ class ExecutionFramework(Scheduler):
         if self.pool is None:
             # If pool is not specified, then we can accept offer from any agent
             return True
-        for attribute in offer.attributes:
-            if attribute.name == "pool":
-                return attribute.text.value == self.pool
-        return False
+        agent = self.agent_registry.agent_for_offer(offer)
+        return agent.attributes.get('pool') == self.pool
 
     def kill_task(self, task_id):
-        self.driver.killTask(Dict(value=task_id))
+        self.kill_tasks([task_id])
+
+    def kill_tasks(self, task_ids):
+        """Kill several tasks at once
+
+        Tasks that are still waiting in the task queue are removed from it
+        right away and get a killed event without involving Mesos. Kills
+        for all other tasks are sent to Mesos, rate limited to
+        max_kills_per_second.
+        """
+        task_ids = set(task_ids)
+        queued_ids_found = set()
+        with self._lock:
+            queued = set(
+                task_id for task_id in task_ids
+                if task_id in self.task_metadata and
+                self.task_metadata[task_id].task_state == 'TASK_INITED'
+            )
+            # Groups are launched whole or not at all
+            for task_id in list(queued):
+                group = self.task_groups.get(
+                    self.task_metadata[task_id].group_id)
+                if group is not None:
+                    queued.update(
+                        member_id for member_id in group.task_ids
+                        if member_id in self.task_metadata and
+                        self.task_metadata[member_id].task_state ==
+                        'TASK_INITED'
+                    )
+            if queued:
+                with self.task_queue.mutex:
+                    remaining = deque()
+                    for task in self.task_queue.queue:
+                        task_ids_of = _queued_task_ids(task)
+                        if any(
+                            task_id in queued for task_id in task_ids_of
+                        ):
+                            queued_ids_found.update(task_ids_of)
+                        else:
+                            remaining.append(task)
+                    self.task_queue.queue = remaining
+                    self.task_queue.not_full.notify_all()
+                # The rest have been taken out of the queue by an offer
+                # that is being processed right now.
+                self._killed_in_flight.update(queued - queued_ids_found)
+
+            killed_before_launch = [
+                self.task_metadata[task_id] for task_id in queued
+            ]
+            evolver = self.task_metadata.evolver()
+            for task_id in queued:
+                del evolver[task_id]
+            self.task_metadata = evolver.persistent()
+
+            events = []
+            for md in killed_before_launch:
+                event = self._killed_before_launch_event(md.task_config)
+                events.append(event)
+                group_event = self._group_task_finished(md, event)
+                if group_event is not None:
+                    events.append(group_event)
+
+        self.event_queue.put_many(events)
+        if killed_before_launch:
+            get_metric(TASK_KILLED_COUNT).count(len(killed_before_launch))
+
+        for task_id in task_ids - queued:
+            self._kill_in_mesos(task_id)
+
+    def kill_matching(self, predicate):
+        """Kill every task whose task_config satisfies the predicate
+
+        :returns list task_ids: The tasks that were killed
+        """
+        task_ids = [
+            task_id for task_id, md in self.task_metadata.items()
+            if predicate(md.task_config)
+        ]
+        self.kill_tasks(task_ids)
+        return task_ids
+
+    def _killed_before_launch_event(self, task_config):
+        status = Dict(
+            task_id=Dict(value=task_config.task_id),
+            state='TASK_KILLED',
+            reason='REASON_TASK_KILLED_DURING_LAUNCH',
+            message='Task killed before it was launched',
+        )
+        return self.translator(status, task_config.task_id).set(
+            task_config=task_config)
+
+    def _kill_in_mesos(self, task_id):
+        with self._kill_condition:
+            if not self._pending_kills and self._kill_limiter.try_acquire():
+                self.driver.killTask(Dict(value=task_id))
+                return
+            self._pending_kills.append(task_id)
+            self._kill_condition.notify()
+
+    def _kill_loop(self):
+        while True:
+            with self._kill_condition:
+                while not self._pending_kills and not self.stopping:
+                    self._kill_condition.wait()
+                if self.stopping:
+                    return
+
+                if self._kill_limiter.try_acquire():
+                    task_id = self._pending_kills.popleft()
+                    self.driver.killTask(Dict(value=task_id))
+                    continue
+                delay = self._kill_limiter.time_until_available()
+
+            time.sleep(delay)
 
     def blacklist_slave(self, agent_id, timeout):
         with self._lock:
@@ -206,6 +427,10 @@ class ExecutionFramework(Scheduler):
                 secs=timeout
             ))
             self.blacklisted_slaves = self.blacklisted_slaves.append(agent_id)
+            self.blacklist_expirations[agent_id] = max(
+                self.blacklist_expirations.get(agent_id, 0),
+                time.time() + timeout,
+            )
             get_metric(BLACKLISTED_AGENTS_COUNT).count(1)
         unblacklist_thread = threading.Thread(
             target=self.unblacklist_slave,
@@ -222,29 +447,206 @@ class ExecutionFramework(Scheduler):
         with self._lock:
             self.blacklisted_slaves = \
                 self.blacklisted_slaves.remove(agent_id)
+            if agent_id not in self.blacklisted_slaves:
+                self.blacklist_expirations.pop(agent_id, None)
 
     def enqueue_task(self, task_config):
+        self.enqueue_tasks([task_config])
+
+    def enqueue_tasks(self, task_configs):
+        """Enqueue several tasks with a single lock acquisition, metadata
+        update and revive, as long as they fit in the task queue.
+        """
+        pending = deque(task_configs)
+        enqueued = len(pending)
+        now = time.time()
         with self._lock:
+            for task_config in pending:
+                self.agent_registry.task_removed(task_config.task_id)
             # task_state and task_state_history get reset every time
             # a task is enqueued.
-            self.task_metadata = self.task_metadata.set(
-                task_config.task_id,
-                TaskMetadata(
+            self.task_metadata = self.task_metadata.update({
+                task_config.task_id: TaskMetadata(
                     task_config=task_config,
                     task_state='TASK_INITED',
-                    task_state_history=m(TASK_INITED=time.time()),
+                    task_state_history=m(TASK_INITED=now),
                 )
-            )
+                for task_config in pending
+            })
+
+        while pending:
             # Need to lock on task_queue to prevent enqueues when getting
             # tasks to launch
-            self.task_queue.put(task_config)
-
-        if self.are_offers_suppressed:
-            self.driver.reviveOffers()
-            self.are_offers_suppressed = False
-            log.info('Reviving offers because we have tasks to run.')
+            with self._lock:
+                while pending:
+                    if self._killed_before_queued(pending[0].task_id):
+                        pending.popleft()
+                        enqueued -= 1
+                        continue
+                    try:
+                        self.task_queue.put_nowait(pending[0])
+                    except Full:
+                        break
+                    pending.popleft()
+
+            self.revive_controller.tasks_enqueued()
+
+            if pending:
+                # The queue is full: wait for offers to drain it without
+                # holding the lock they need.
+                self._wait_for_room_in_queue()
+
+        get_metric(TASK_ENQUEUED_COUNT).count(enqueued)
+
+    def _killed_before_queued(self, task_id):
+        """Whether a task was killed, and got its killed event, between
+        getting its metadata and getting into the task queue
+        """
+        if task_id in self._killed_in_flight:
+            self._killed_in_flight.discard(task_id)
+            return True
+        return task_id not in self.task_metadata
+
+    def _wait_for_room_in_queue(self):
+        queue = self.task_queue
+        with queue.not_full:
+            queue.not_full.wait_for(
+                lambda: len(queue.queue) < queue.maxsize)
+
+    def enqueue_group(self, task_configs, group_id=None):
+        """Enqueue tasks that have to be launched together
+
+        :returns str group_id: the id of the group's terminal event
+        """
+        group = TaskGroup(
+            group_id or 'group.{}'.format(uuid.uuid4()), list(task_configs))
+        now = time.time()
+        with self._lock:
+            self.task_groups[group.group_id] = group
+            for task_config in group.task_configs:
+                self.agent_registry.task_removed(task_config.task_id)
+            self.task_metadata = self.task_metadata.update({
+                task_config.task_id: TaskMetadata(
+                    task_config=task_config,
+                    task_state='TASK_INITED',
+                    task_state_history=m(TASK_INITED=now),
+                    group_id=group.group_id,
+                )
+                for task_config in group.task_configs
+            })
+        while True:
+            with self._lock:
+                # Killing a task of the group kills all of it
+                killed = [
+                    task_id for task_id in group.task_ids
+                    if self._killed_before_queued(task_id)
+                ]
+                if killed:
+                    return group.group_id
+                try:
+                    self.task_queue.put_nowait(group)
+                    break
+                except Full:
+                    pass
+            # The queue is full: wait for offers to drain it without
+            # holding the lock they need.
+            self.revive_controller.tasks_enqueued()
+            self._wait_for_room_in_queue()
+
+        self.revive_controller.tasks_enqueued()
+        get_metric(TASK_ENQUEUED_COUNT).count(len(group.task_configs))
+        return group.group_id
+
+    def withdraw_queued_tasks(self, max_n):
+        """Take up to max_n tasks that are still waiting for offers out of
+        the task queue, as if they had never been enqueued
+
+        The most recently queued tasks are taken first. Groups stay in the
+        queue.
+
+        :returns list: the task_configs of the withdrawn tasks
+        """
+        withdrawn = []
+        with self._lock:
+            with self.task_queue.mutex:
+                remaining = deque()
+                for task in reversed(self.task_queue.queue):
+                    if len(withdrawn) < max_n and \
+                            not isinstance(task, TaskGroup):
+                        withdrawn.append(task)
+                    else:
+                        remaining.appendleft(task)
+                self.task_queue.queue = remaining
+                self.task_queue.not_full.notify_all()
+            evolver = self.task_metadata.evolver()
+            for task in withdrawn:
+                del evolver[task.task_id]
+            self.task_metadata = evolver.persistent()
+        # In the order they were queued
+        withdrawn.reverse()
+        return withdrawn
+
+    def load(self):
+        """How this framework is keeping up with its tasks
+
+        :returns: a :class:`ClusterLoad`
+        """
+        now = time.time()
+        with self._lock:
+            queue_depth = self.task_queue.qsize()
+            waiting_s = 0.0
+            if queue_depth:
+                try:
+                    head = self.task_queue.queue[0]
+                    md = self.task_metadata[_queued_task_ids(head)[0]]
+                    waiting_since = md.task_state_history['TASK_INITED']
+                except (IndexError, KeyError):
+                    waiting_since = now
+                if self._last_match_at is not None:
+                    waiting_since = max(waiting_since, self._last_match_at)
+                waiting_s = max(0.0, now - waiting_since)
+        return ClusterLoad(
+            queue_depth=queue_depth,
+            offer_rate=self._offer_rate.rate(now),
+            match_rate=self._match_rate.rate(now),
+            queued_time=self._queued_time,
+            waiting_s=waiting_s,
+        )
 
-        get_metric(TASK_ENQUEUED_COUNT).count(1)
+    def _group_task_finished(self, md, event):
+        """Track a task of a group reaching a terminal state
+
+        :returns: the group's terminal event once all of its tasks are done
+        """
+        group = self.task_groups.get(md.group_id)
+        if group is None or not group.task_finished(event):
+            return None
+        del self.task_groups[md.group_id]
+        return group.event()
+
+    def _group_tasks_to_kill(self, group_id):
+        """The rest of a group goes down with the first of its tasks that
+        ends unsuccessfully
+        """
+        group = self.task_groups.get(group_id)
+        if group is None or group.killing:
+            return []
+        group.killing = True
+        return group.live_task_ids()
+
+    @property
+    def are_offers_suppressed(self):
+        return self.revive_controller.suppressed
+
+    def _revive_offers(self):
+        self.driver.reviveOffers()
+        get_metric(OFFERS_REVIVED_COUNT).count(1)
+        log.info('Reviving offers because we have tasks to run.')
+
+    def _suppress_offers(self):
+        self.driver.suppressOffers()
+        get_metric(OFFERS_SUPPRESSED_COUNT).count(1)
+        log.info("Suppressing offers, no more tasks to run.")
 
     def get_available_ports(self, resource):
         i = 0
@@ -260,39 +662,113 @@ class ExecutionFramework(Scheduler):
                 break
         return ports
 
+    def _launch(self, driver, offers, tasks_to_launch):
+        """Launch tasks on the pooled offers of an agent, with LAUNCH_GROUP
+        for the groups that were placed on it as a whole
+        """
+        offer_ids = [offer.id for offer in offers]
+        groups = {}
+        with self._lock:
+            for task in tasks_to_launch:
+                md = self.task_metadata.get(task.task_id.value)
+                group = md and self.task_groups.get(md.group_id)
+                if group is not None and group.launch_group:
+                    groups.setdefault(group.group_id, []).append(task)
+        if not groups:
+            driver.launchTasks(offer_ids, tasks_to_launch)
+            return
+
+        operations = []
+        grouped = set(
+            task.task_id.value for tasks in groups.values() for task in tasks
+        )
+        tasks = [
+            task for task in tasks_to_launch
+            if task.task_id.value not in grouped
+        ]
+        if tasks:
+            operations.append(
+                Dict(type='LAUNCH', launch=Dict(task_infos=tasks)))
+        for group_id, tasks in groups.items():
+            operations.append(Dict(
+                type='LAUNCH_GROUP',
+                launch_group=Dict(
+                    executor=self._group_executor_info(group_id),
+                    task_group=Dict(tasks=tasks),
+                ),
+            ))
+        driver.acceptOffers(offer_ids, operations)
+
+    def _group_executor_info(self, group_id):
+        return Dict(
+            type='DEFAULT',
+            executor_id=Dict(value='executor-{id}'.format(id=group_id)),
+            framework_id=Dict(value=self.framework_id),
+            resources=[
+                Dict(name=name,
+                     type='SCALAR',
+                     role=self.role,
+                     scalar=Dict(value=getattr(
+                         GROUP_EXECUTOR_RESOURCES, name)))
+                for name in ('cpus', 'mem', 'disk')
+            ],
+        )
+
     def get_tasks_to_launch(self, offer):
-        tasks_to_launch = []
-        remaining_cpus = 0
-        remaining_mem = 0
-        remaining_disk = 0
-        remaining_gpus = 0
-        available_ports = []
-        for resource in offer.resources:
-            if resource.name == "cpus" and resource.role == self.role:
-                remaining_cpus += resource.scalar.value
-            elif resource.name == "mem" and resource.role == self.role:
-                remaining_mem += resource.scalar.value
-            elif resource.name == "disk" and resource.role == self.role:
-                remaining_disk += resource.scalar.value
-            elif resource.name == "gpus" and resource.role == self.role:
-                remaining_gpus += resource.scalar.value
-            elif resource.name == "ports" and resource.role == self.role:
+        return self.get_tasks_to_launch_for_offers([offer])[0][1]
+
+    def get_tasks_to_launch_for_offers(self, offers):
+        """Match queued tasks to offers that arrived together
+
+        The offers of an agent are pooled, so that tasks which only fit in
+        their combined resources can be launched on them. Every task is
+        placed on one of the agents it fits on, picked by its placement
+        strategy.
+
+        :returns: a list of (offers, TaskInfos to launch on them), one per
+            agent, in the order their first offers arrived
+        """
+        if not offers:
+            return []
+        slots = []
+        slots_by_agent = {}
+        for offer in offers:
+            agent, resources = self.agent_registry.update_from_offer(
+                offer, time.time())
+            available_ports = []
+            if 'ports' in resources:
                 # TODO: Validate if the ports available > ports required
-                available_ports = self.get_available_ports(resource)
-
-        log.info(
-            "Received offer {id} with cpus: {cpu}, mem: {mem}, "
-            "disk: {disk} gpus: {gpu} role: {role}".format(
-                id=offer.id.value,
-                cpu=remaining_cpus,
-                mem=remaining_mem,
-                disk=remaining_disk,
-                gpu=remaining_gpus,
-                role=self.role
+                available_ports = self.get_available_ports(
+                    resources['ports'])
+            slot = slots_by_agent.get(agent.agent_id)
+            if slot is None:
+                slot = OfferSlot(offer, agent, resources, available_ports)
+                slots_by_agent[agent.agent_id] = slot
+                slots.append(slot)
+            else:
+                slot.add(offer, resources, available_ports)
+
+            self.offer_profiler.lap('matching')
+            log.info(
+                "Received offer {id} with cpus: {cpu}, mem: {mem}, "
+                "disk: {disk} gpus: {gpu} role: {role}".format(
+                    id=offer.id.value,
+                    cpu=resources['cpus'],
+                    mem=resources['mem'],
+                    disk=resources['disk'],
+                    gpu=resources['gpus'],
+                    role=self.role
+                )
             )
-        )
+            self.offer_profiler.lap('logging')
+
+        for slot in slots:
+            if len(slot.offers) > 1:
+                self.agent_registry.update_capacity(
+                    slot.agent, slot.resources())
 
         tasks_to_put_back_in_queue = []
+        open_slots = list(slots)
 
         # Need to lock here even though we are working on the task_queue, since
         # we are predicating on the queue's emptiness. If not locked, other
@@ -301,47 +777,185 @@ class ExecutionFramework(Scheduler):
             # Get all the tasks of the queue
             while not self.task_queue.empty():
                 task = self.task_queue.get()
+                if not any(
+                    task_id in self.task_metadata
+                    for task_id in _queued_task_ids(task)
+                ):
+                    # Killed, with its killed event sent, as it was being
+                    # enqueued
+                    self._killed_in_flight.difference_update(
+                        _queued_task_ids(task))
+                    continue
 
-                if ((remaining_cpus >= task.cpus and
-                     remaining_mem >= task.mem and
-                     remaining_disk >= task.disk and
-                     remaining_gpus >= task.gpus and
-                     len(available_ports) > 0)):
-                    # This offer is sufficient for us to launch task
-                    tasks_to_launch.append(
-                        self.create_new_docker_task(
-                            offer,
-                            task,
-                            available_ports
-                        )
-                    )
-
-                    # Deduct the resources taken by this task from the total
-                    # available resources.
-                    remaining_cpus -= task.cpus
-                    remaining_mem -= task.mem
-                    remaining_disk -= task.disk
-                    remaining_gpus -= task.gpus
+                if isinstance(task, TaskGroup):
+                    self._match_group(task, open_slots,
+                                      tasks_to_put_back_in_queue)
+                    continue
 
-                    md = self.task_metadata[task.task_id]
-                    get_metric(TASK_QUEUED_TIME_TIMER).record(
-                        time.time() - md.task_state_history['TASK_INITED']
-                    )
-                else:
-                    # This offer is insufficient for this task. We need to put
+                candidates = self._candidate_slots(task, open_slots)
+                if not candidates:
+                    # No offer is sufficient for this task. We need to put
                     # it back in the queue
                     tasks_to_put_back_in_queue.append(task)
+                    continue
+
+                slot = self._placement_strategy_for(task).choose(
+                    task, candidates)
+                self.offer_profiler.lap('matching')
+                slot.tasks.append(
+                    self.create_new_docker_task(slot.offer, task, slot.ports)
+                )
+                self.offer_profiler.lap('task_info')
+
+                # Deduct the resources taken by this task from the total
+                # available resources.
+                slot.take(task)
+                if slot.exhausted():
+                    open_slots.remove(slot)
+                self.agent_registry.task_placed(
+                    task.task_id, task.name, slot.agent.agent_id)
+                self._record_match(task)
+
+        self._put_back_in_queue(tasks_to_put_back_in_queue)
+
+        self.offer_profiler.lap('matching')
+        return [(slot.offers, slot.tasks) for slot in slots]
+
+    def _put_back_in_queue(self, tasks):
+        """Return unmatched tasks to the head of the queue, in order
 
-        for task in tasks_to_put_back_in_queue:
-            self.task_queue.put(task)
+        Enqueuers may have taken the room they left, so this goes over
+        maxsize rather than wait: the offer thread is the only consumer of
+        the queue and must never block on it.
+        """
+        with self._lock:
+            put_back = []
+            for task in tasks:
+                # Skip tasks that were killed while out of the queue
+                killed = [
+                    task_id for task_id in _queued_task_ids(task)
+                    if task_id in self._killed_in_flight
+                ]
+                if killed:
+                    self._killed_in_flight.difference_update(killed)
+                    continue
+                put_back.append(task)
+            with self.task_queue.mutex:
+                self.task_queue.queue.extendleft(reversed(put_back))
+                self.task_queue.unfinished_tasks += len(put_back)
+                self.task_queue.not_empty.notify(len(put_back))
+        for _ in put_back:
             get_metric(TASK_INSUFFICIENT_OFFER_COUNT).count(1)
 
-        return tasks_to_launch
+    def _record_match(self, task):
+        md = self.task_metadata[task.task_id]
+        matched_at = time.time()
+        queued_time = matched_at - md.task_state_history['TASK_INITED']
+        get_metric(TASK_QUEUED_TIME_TIMER).record(queued_time)
+        self._match_rate.record(matched_at)
+        self._queued_time += QUEUED_TIME_WEIGHT * (
+            queued_time - self._queued_time)
+        self._last_match_at = matched_at
+        self.task_metadata = self.task_metadata.set(
+            task.task_id,
+            md.set(task_state_history=md.task_state_history.set(
+                'OFFER_MATCHED', matched_at)),
+        )
+
+    def _match_group(self, group, open_slots, tasks_to_put_back_in_queue):
+        placements = self._place_group(group, open_slots)
+        if not placements:
+            tasks_to_put_back_in_queue.append(group)
+            return
+        self.offer_profiler.lap('matching')
+        for task, slot, port in placements:
+            slot.tasks.append(
+                self.create_new_docker_task(slot.offer, task, [port]))
+            self._record_match(task)
+        self.offer_profiler.lap('task_info')
+        for slot in set(slot for _, slot, _ in placements):
+            if slot.exhausted():
+                open_slots.remove(slot)
+
+    def _place_group(self, group, slots):
+        """Place all tasks of a group, or none of them
+
+        Placing them all on one agent is tried first, so that they can be
+        launched with LAUNCH_GROUP.
+
+        :returns: a list of (task_config, slot, port), empty if the group
+            doesn't fit
+        """
+        configs = group.task_configs
+        executor = GROUP_EXECUTOR_RESOURCES if group.use_launch_group \
+            else None
+        needed = _total_resources(configs, executor)
+        candidates = [
+            slot for slot in fitting_slots(needed, slots)
+            if len(slot.ports) >= len(configs)
+        ]
+        strategy = self._placement_strategy_for(configs[0])
+        while candidates:
+            slot = strategy.choose(configs[0], candidates)
+            if executor is not None:
+                slot.take(executor)
+            placements = self._place_tasks(configs, [slot])
+            if placements:
+                group.launch_group = executor is not None
+                return placements
+            if executor is not None:
+                slot.give(executor)
+            candidates.remove(slot)
+
+        group.launch_group = False
+        return self._place_tasks(configs, slots)
+
+    def _place_tasks(self, task_configs, slots):
+        """Place every task in one of slots, or none of them"""
+        placements = []
+        for task in task_configs:
+            candidates = self._candidate_slots(task, slots)
+            if not candidates:
+                for placed, slot, port in placements:
+                    slot.give(placed)
+                    slot.ports.insert(0, port)
+                    self.agent_registry.task_removed(placed.task_id)
+                return []
+            slot = self._placement_strategy_for(task).choose(
+                task, candidates)
+            slot.take(task)
+            placements.append((task, slot, slot.ports.pop(0)))
+            # Constraints of the next tasks take this one into account
+            self.agent_registry.task_placed(
+                task.task_id, task.name, slot.agent.agent_id)
+        return placements
+
+    def _candidate_slots(self, task, slots):
+        """The slots task can be placed in"""
+        candidates = fitting_slots(task, slots)
+        if candidates and task.excluded_agent_ids:
+            # Placement hint, e.g. an earlier attempt failed there. Only a
+            # hint: a task excluded from every agent it fits on would
+            # never run.
+            candidates = [
+                slot for slot in candidates
+                if slot.agent.agent_id not in task.excluded_agent_ids
+            ] or candidates
+        if candidates and task.constraints:
+            candidates = [
+                slot for slot in candidates
+                if self.agent_registry.allows(task, slot.agent)
+            ]
+        return candidates
+
+    def _placement_strategy_for(self, task):
+        if task.placement_strategy is None:
+            return self.placement_strategy
+        return get_strategy(task.placement_strategy)
 
     def create_new_docker_task(self, offer, task_config, available_ports):
         # Handle the case of multiple port allocations
-        port_to_use = available_ports[0]
-        available_ports[:] = available_ports[1:]
+        port_to_use = available_ports.pop(0)
 
         # TODO: this probably belongs in the caller
         with self._lock:
@@ -351,90 +965,27 @@ class ExecutionFramework(Scheduler):
                 md.set(agent_id=str(offer.agent_id.value))
             )
 
-        if task_config.containerizer == 'DOCKER':
-            container = Dict(
-                type='DOCKER',
-                volumes=thaw(task_config.volumes),
-                docker=Dict(
-                    image=task_config.image,
-                    network='BRIDGE',
-                    port_mappings=[Dict(host_port=port_to_use,
-                                        container_port=8888)],
-                    parameters=thaw(task_config.docker_parameters),
-                    force_pull_image=True,
-                ),
-            )
-        elif task_config.containerizer == 'MESOS':
-            container = Dict(
-                type='MESOS',
-                # for docker, volumes should include parameters
-                volumes=thaw(task_config.volumes),
-                network_infos=Dict(
-                    port_mappings=[Dict(host_port=port_to_use,
-                                        container_port=8888)],
-                ),
-            )
-            # For this to work, image_providers needs to be set to 'docker'
-            # on mesos agents
-            if 'image' in task_config:
-                container.mesos = Dict(
-                    image=Dict(
-                        type='DOCKER',
-                        docker=Dict(name=task_config.image),
-                    )
-                )
-
-        return Dict(
-            task_id=Dict(value=task_config.task_id),
-            agent_id=Dict(value=offer.agent_id.value),
-            name='executor-{id}'.format(id=task_config.task_id),
-            resources=[
-                Dict(name='cpus',
-                     type='SCALAR',
-                     role=self.role,
-                     scalar=Dict(value=task_config.cpus)),
-                Dict(name='mem',
-                     type='SCALAR',
-                     role=self.role,
-                     scalar=Dict(value=task_config.mem)),
-                Dict(name='disk',
-                     type='SCALAR',
-                     role=self.role,
-                     scalar=Dict(value=task_config.disk)),
-                Dict(name='gpus',
-                     type='SCALAR',
-                     role=self.role,
-                     scalar=Dict(value=task_config.gpus)),
-                Dict(name='ports',
-                     type='RANGES',
-                     role=self.role,
-                     ranges=Dict(
-                         range=[Dict(begin=port_to_use, end=port_to_use)]))
-            ],
-            command=Dict(
-                value=task_config.cmd,
-                uris=[
-                    Dict(value=uri, extract=False)
-                    for uri in task_config.uris
-                ],
-                environment=Dict(variables=[
-                    Dict(name=k, value=v) for k, v in
-                    task_config.environment.items()
-                ])
-            ),
-            container=container
-        )
+        return self.task_info_templates.task_info(
+            task_config, offer.agent_id.value, port_to_use)
 
     def stop(self):
         self.stopping = True
+        self.revive_controller.stop()
+        self._offer_queue.close()
+        with self._kill_condition:
+            self._kill_condition.notify_all()
+        self.event_queue.close()
 
     # TODO: add mesos cluster dimension when available
-    def _initialize_metrics(self):
-        default_dimensions = {
+    def _metric_dimensions(self):
+        return {
             'framework_name': '.'.join(self.name.split()[:2]),
             'framework_role': self.role
         }
 
+    def _initialize_metrics(self):
+        default_dimensions = self._metric_dimensions()
+
         counters = [
             TASK_LAUNCHED_COUNT,                 TASK_FINISHED_COUNT,
             TASK_FAILED_COUNT,                   TASK_KILLED_COUNT,
@@ -442,12 +993,17 @@ class ExecutionFramework(Scheduler):
             TASK_ENQUEUED_COUNT,                 TASK_INSUFFICIENT_OFFER_COUNT,
             TASK_STUCK_COUNT,                    BLACKLISTED_AGENTS_COUNT,
             TASK_LOST_DUE_TO_INVALID_OFFER_COUNT,
-            TASK_LAUNCH_FAILED_COUNT,            TASK_FAILED_TO_LAUNCH_COUNT
+            TASK_LAUNCH_FAILED_COUNT,            TASK_FAILED_TO_LAUNCH_COUNT,
+            OFFERS_REVIVED_COUNT,                OFFERS_SUPPRESSED_COUNT,
+            OFFER_RESCINDED_COUNT,
         ]
         for cnt in counters:
             create_counter(cnt, default_dimensions)
 
-        timers = [OFFER_DELAY_TIMER, TASK_QUEUED_TIME_TIMER]
+        timers = [
+            OFFER_DELAY_TIMER, TASK_QUEUED_TIME_TIMER, EVENT_LATENCY_TIMER,
+            OFFER_LIFETIME_TIMER,
+        ]
         for tmr in timers:
             create_timer(tmr, default_dimensions)
 
@@ -455,8 +1011,12 @@ class ExecutionFramework(Scheduler):
     #                   Mesos driver hooks go here                     #
     ####################################################################
     def offerRescinded(self, driver, offerId):
-        # TODO(sagarp): Executor should be able to deal with this.
         log.warning('Offer {offer} rescinded'.format(offer=offerId))
+        with self._lock:
+            # Skip it if it's still waiting to be matched
+            if self._pending_offers.pop(offerId.value, None) is not None:
+                self._rescinded_offers.add(offerId.value)
+        get_metric(OFFER_RESCINDED_COUNT).count(1)
 
     def error(self, driver, message):
         event = control_event(raw=message)
@@ -471,10 +1031,12 @@ class ExecutionFramework(Scheduler):
 
     def slaveLost(self, drive, slaveId):
         log.warning("Slave lost: {id}".format(id=str(slaveId)))
+        self.agent_registry.agent_lost(slaveId.value)
 
     def registered(self, driver, frameworkId, masterInfo):
         if self.driver is None:
             self.driver = driver
+        self.framework_id = frameworkId.value
         log.info("Registered with framework ID {id} and role {role}".format(
             id=frameworkId.value,
             role=self.role
@@ -490,6 +1052,64 @@ class ExecutionFramework(Scheduler):
         if self.driver is None:
             self.driver = driver
 
+        now = time.time()
+        with self._lock:
+            for offer in offers:
+                self._pending_offers[offer.id.value] = now
+        self._offer_rate.record(now, len(offers))
+        self._offer_queue.put((driver, offers))
+
+    def _offer_loop(self):
+        while True:
+            try:
+                batches = get_many(self._offer_queue, EVENT_BATCH_SIZE)
+            except EventStreamClosed:
+                return
+
+            # Match every offer that arrived meanwhile in a single pass
+            driver = batches[-1][0]
+            offers = [offer for _, batch in batches for offer in batch]
+            try:
+                self._match_offers(driver, offers)
+            except Exception:
+                log.error(traceback.format_exc())
+
+    def _match_offers(self, driver, offers):
+        with self._lock:
+            rescinded = [
+                offer for offer in offers
+                if offer.id.value in self._rescinded_offers
+            ]
+            for offer in rescinded:
+                self._rescinded_offers.discard(offer.id.value)
+        if rescinded:
+            offers = [offer for offer in offers if offer not in rescinded]
+            log.info('Skipping rescinded offers: {}'.format(', '.join(
+                offer.id.value for offer in rescinded)))
+
+        self.offer_profiler.start_cycle()
+        try:
+            self._process_offers(driver, offers)
+        finally:
+            self.offer_profiler.finish_cycle(offers=len(offers))
+
+        now = time.time()
+        with self._lock:
+            received = [
+                self._pending_offers.pop(offer.id.value, None)
+                for offer in offers
+            ]
+            # Rescinded while they were being matched, too late to skip
+            self._rescinded_offers.difference_update(
+                offer.id.value for offer in offers)
+        for received_at in received:
+            if received_at is not None:
+                get_metric(OFFER_LIFETIME_TIMER).record(now - received_at)
+
+    def _process_offers(self, driver, offers):
+        if self.driver is None:
+            self.driver = driver
+
         current_offer_time = time.time()
         if self._last_offer_time is not None:
             get_metric(OFFER_DELAY_TIMER).record(
@@ -500,30 +1120,42 @@ class ExecutionFramework(Scheduler):
         # Give user some time to enqueue tasks
         if self.task_queue.empty() and current_offer_time < self.decline_after:
             time.sleep(self.decline_after - current_offer_time)
+        # Kept with the cycle, but not a stage worth a histogram
+        self.offer_profiler.lap('initial_delay')
 
         declined = {'blacklisted': [],
                     'bad pool': [],
                     'bad resources': [],
                     'no tasks': []}
-        declined_offer_ids = []
+        # refuse_seconds -> offer ids declined with it
+        declined_offer_ids = {}
         accepted = []
 
+        def decline(offer, refuse_seconds):
+            declined_offer_ids.setdefault(refuse_seconds, []).append(offer.id)
+
         if self.task_queue.empty():
-            if not self.are_offers_suppressed:
-                driver.suppressOffers()
-                self.are_offers_suppressed = True
-                log.info("Suppressing offers, no more tasks to run.")
+            self.revive_controller.queue_empty()
 
             for offer in offers:
                 declined['no tasks'].append(offer.id.value)
-                declined_offer_ids.append(offer.id)
 
-            driver.declineOffer(declined_offer_ids, self.offer_decline_filter)
+            driver.declineOffer(
+                [offer.id for offer in offers],
+                self.decline_filters.filters(self.decline_filters.no_tasks()),
+            )
+            self.decline_filters.queue_empty()
+            self.revive_controller.offers_declined(current_offer_time)
+            self.offer_profiler.lap('driver')
             log.info("Offers declined because of no tasks: {}".format(
                 ','.join(declined['no tasks'])
             ))
+            self.offer_profiler.lap('logging')
             return
 
+        self.decline_filters.tasks_queued()
+        self.offer_profiler.lap('bookkeeping')
+
         with_maintenance_window = [
             offer for offer in offers if offer.unavailability
         ]
@@ -545,42 +1177,61 @@ class ExecutionFramework(Scheduler):
         without_maintenance_window = [
             offer for offer in offers if offer not in with_maintenance_window
         ]
+        self.offer_profiler.lap('maintenance')
+        usable = []
         for offer in without_maintenance_window:
             with self._lock:
                 if offer.agent_id.value in self.blacklisted_slaves:
                     declined['blacklisted'].append('offer {} agent {}'.format(
                         offer.id.value, offer.agent_id.value
                     ))
-                    declined_offer_ids.append(offer.id)
+                    decline(offer, self.decline_filters.blacklisted(
+                        self.blacklist_expirations.get(offer.agent_id.value),
+                        current_offer_time,
+                    ))
+                    self.offer_profiler.lap('blacklist')
                     continue
+            self.offer_profiler.lap('blacklist')
 
             if not self.offer_matches_pool(offer):
+                self.offer_profiler.lap('pool')
                 log.info("Declining offer {id} because it is not for pool "
                          "{pool}.".format(
                              id=offer.id.value,
                              pool=self.pool
                          ))
                 declined['bad pool'].append(offer.id.value)
-                declined_offer_ids.append(offer.id)
+                decline(offer, self.decline_filters.bad_pool())
+                self.offer_profiler.lap('logging')
                 continue
+            self.offer_profiler.lap('pool')
+            usable.append(offer)
 
-            tasks_to_launch = self.get_tasks_to_launch(offer)
-
+        launches = self.get_tasks_to_launch_for_offers(usable)
+        for agent_offers, tasks_to_launch in launches:
+            agent_id = agent_offers[0].agent_id.value
             if len(tasks_to_launch) == 0:
                 if self.task_queue.empty():
-                    if offer.id.value not in declined['no tasks']:
-                        declined['no tasks'].append(offer.id.value)
+                    refuse_seconds = self.decline_filters.no_tasks()
+                    reason = 'no tasks'
                 else:
-                    declined['bad resources'].append(offer.id.value)
-                declined_offer_ids.append(offer.id)
+                    refuse_seconds = self.decline_filters.insufficient(
+                        agent_id, self.task_queue.qsize())
+                    reason = 'bad resources'
+                for offer in agent_offers:
+                    if offer.id.value not in declined[reason]:
+                        declined[reason].append(offer.id.value)
+                    decline(offer, refuse_seconds)
                 continue
 
-            accepted.append('offer: {} agent: {} tasks: {}'.format(
-                offer.id.value, offer.agent_id.value, len(tasks_to_launch)))
+            accepted.append('offers: {} agent: {} tasks: {}'.format(
+                ','.join(offer.id.value for offer in agent_offers),
+                agent_id, len(tasks_to_launch)))
 
             task_launch_failed = False
+            self.offer_profiler.lap('bookkeeping')
             try:
-                driver.launchTasks(offer.id, tasks_to_launch)
+                self._launch(driver, agent_offers, tasks_to_launch)
             except (socket.timeout, Exception):
                 log.warning('Failed to launch following tasks {tasks}.'
                             'Thus, moving them to UNKNOWN state'.format(
@@ -592,16 +1243,39 @@ class ExecutionFramework(Scheduler):
                             )
                 task_launch_failed = True
                 get_metric(TASK_LAUNCH_FAILED_COUNT).count(1)
+            else:
+                self.decline_filters.launched(agent_id)
+            self.offer_profiler.lap('driver')
 
             # 'UNKNOWN' state is for internal tracking. It will not be
             # propogated to users.
             current_task_state = 'UNKNOWN' if task_launch_failed else \
                 'TASK_STAGING'
+            failed_in_groups = []
             with self._lock:
                 for task in tasks_to_launch:
-                    md = self.task_metadata[task.task_id.value]
+                    task_id = task.task_id.value
+                    if task_id in self._killed_in_flight:
+                        # Killed while we were launching it, its status
+                        # updates are ignored from now on
+                        self._killed_in_flight.discard(task_id)
+                        self.agent_registry.task_removed(task_id)
+                        if not task_launch_failed:
+                            self._kill_in_mesos(task_id)
+                        continue
+                    if not task_launch_failed:
+                        get_metric(TASK_LAUNCHED_COUNT).count(1)
+                    md = self.task_metadata.get(task_id)
+                    if md is None or md.task_state != 'TASK_INITED':
+                        # Its status updates got here before the launch
+                        # returned, they know better
+                        continue
+                    if task_launch_failed and md.group_id is not None:
+                        # The rest of the group may have been launched
+                        failed_in_groups.append((task_id, md))
+                        continue
                     self.task_metadata = self.task_metadata.set(
-                        task.task_id.value,
+                        task_id,
                         md.set(
                             task_state=current_task_state,
                             task_state_history=md.task_state_history.set(
@@ -609,17 +1283,35 @@ class ExecutionFramework(Scheduler):
 
                         )
                     )
-                    if not task_launch_failed:
-                        get_metric(TASK_LAUNCHED_COUNT).count(1)
-
-        if len(declined_offer_ids) > 0:
-            driver.declineOffer(declined_offer_ids, self.offer_decline_filter)
+            for task_id, md in failed_in_groups:
+                self._record_status(task_id, md, Dict(
+                    task_id=Dict(value=task_id),
+                    state='TASK_LOST',
+                    message='Failed to launch the task group',
+                ), kill_group=False)
+            group_ids = set(md.group_id for _, md in failed_in_groups)
+            with self._lock:
+                to_kill = [
+                    task_id for group_id in group_ids
+                    for task_id in self._group_tasks_to_kill(group_id)
+                ]
+            if to_kill:
+                self.kill_tasks(to_kill)
+            self.offer_profiler.lap('bookkeeping')
+
+        for refuse_seconds, offer_ids in declined_offer_ids.items():
+            driver.declineOffer(
+                offer_ids, self.decline_filters.filters(refuse_seconds))
+        if declined['no tasks']:
+            self.revive_controller.offers_declined(current_offer_time)
+        self.offer_profiler.lap('driver')
         for reason, items in declined.items():
             if items:
                 log.info("Offers declined because of {}: {}".format(
                     reason, ', '.join(items)))
         if accepted:
             log.info("Offers accepted: {}".format(', '.join(accepted)))
+        self.offer_profiler.lap('logging')
 
     def statusUpdate(self, driver, update):
         task_id = update.task_id.value
@@ -645,10 +1337,11 @@ class ExecutionFramework(Scheduler):
         # have exceeded offer_timeout, then we will get TASK_LOST status
         # update back from mesos master.
         if task_state == 'TASK_LOST' and str(update.reason) == \
-                'REASON_INVALID_OFFERS':
+                'REASON_INVALID_OFFERS' and md.group_id is None:
             # This task has not been launched. Therefore, we are going to
             # reenqueue it. We are not propogating any event up to the
-            # application.
+            # application. A task of a group fails the group instead, as
+            # the rest of it may have been launched.
             log.warning('Received TASK_LOST from mesos master because we '
                         'attempted to accept an invalid offer. Going to '
                         're-enqueue this task {id}'.format(id=task_id))
@@ -658,29 +1351,69 @@ class ExecutionFramework(Scheduler):
             driver.acknowledgeStatusUpdate(update)
             return
 
+        self._record_status(task_id, md, update)
+
+        # We have to do this because we are not using implicit
+        # acknowledgements.
+        driver.acknowledgeStatusUpdate(update)
+
+    def _record_status(self, task_id, md, update, kill_group=True):
+        task_state = str(update.state)
         # Record state changes, send a new event and emit metrics only if the
         # task state has actually changed.
         if md.task_state != task_state:
+            task_state_history = md.task_state_history.set(
+                task_state, time.time())
             with self._lock:
                 self.task_metadata = self.task_metadata.set(
                     task_id,
                     md.set(
                         task_state=task_state,
-                        task_state_history=md.task_state_history.set(
-                            task_state, time.time()),
+                        task_state_history=task_state_history,
                     )
                 )
-
-            self.event_queue.put(
-                self.translator(update, task_id).set(
-                    task_config=md.task_config)
-            )
+                # e.g. tasks recovered through reconciliation
+                agent_id = update.agent_id.value
+                if agent_id and \
+                        task_id not in self.agent_registry.placements and \
+                        task_state not in self._terminal_task_counts:
+                    self.agent_registry.task_placed(
+                        task_id, md.task_config.name, agent_id)
+
+            event = self.translator(update, task_id).set(
+                task_config=md.task_config)
+            self.event_queue.put(event)
+            # Time from the agent generating the update to it being queued
+            if isinstance(update.timestamp, float):
+                get_metric(EVENT_LATENCY_TIMER).record(
+                    time.time() - update.timestamp)
 
             if task_state in self._terminal_task_counts:
                 with self._lock:
                     self.task_metadata = self.task_metadata.discard(task_id)
+                    self.agent_registry.task_removed(task_id)
+                    group_event = self._group_task_finished(md, event)
+                    to_kill = [] if event.success or not kill_group else \
+                        self._group_tasks_to_kill(md.group_id)
+                if group_event is not None:
+                    self.event_queue.put(group_event)
                 get_metric(self._terminal_task_counts[task_state]).count(1)
+                self.tracer.finish(task_id, task_state_history, task_state)
+                if to_kill:
+                    self.kill_tasks(to_kill)
 
-        # We have to do this because we are not using implicit
-        # acknowledgements.
-        driver.acknowledgeStatusUpdate(update)
+
+def _queued_task_ids(task):
+    """The tasks an entry of the task queue stands for"""
+    if isinstance(task, TaskGroup):
+        return task.task_ids
+    return [task.task_id]
+
+
+def _total_resources(task_configs, executor=None):
+    resources = [executor] if executor is not None else []
+    resources.extend(task_configs)
+    return Resources(*[
+        sum(getattr(r, name) for r in resources)
+        for name in Resources._fields
+    ])
@@ -0,0 +1,256 @@
+import logging
+import threading
+import time
+import traceback
+
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import EventStream
+from task_processing.event_stream import EventStreamClosed
+from task_processing.event_stream import get_many
+from task_processing.interfaces.task_executor import TaskExecutor
+from task_processing.metrics import create_counter
+from task_processing.metrics import create_timer
+from task_processing.metrics import get_metric
+from task_processing.plugins.mesos.cluster_load import estimated_wait
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.tracing import record_event_queue_time
+
+log = logging.getLogger(__name__)
+
+TASK_REBALANCED_COUNT = 'taskproc.federated.task_rebalanced_count'
+EVENT_QUEUE_TIME_TIMER = 'taskproc.federated.event_queue_time'
+
+CLUSTER_EXTENSION = 'FederatedExecutor/cluster'
+
+
+class FederatedExecutor(TaskExecutor):
+    """Runs tasks on whichever of several Mesos clusters should start them
+    soonest
+
+    Every task goes to the cluster with the shortest estimated wait for an
+    offer, judged from its queue depth, the offers it got and tasks it
+    matched lately, and how long its tasks have been waiting (see
+    :func:`task_processing.plugins.mesos.cluster_load.estimated_wait`).
+    A cluster whose queued tasks have gone ``stall_timeout_s`` without any
+    of them being matched is stalled: it gets no new tasks while other
+    clusters aren't, and every ``rebalance_interval_s`` up to
+    ``max_rebalance_batch`` of its queued tasks are moved to them.
+
+    The events of all clusters come out of a single event queue, with the
+    name of their cluster in the ``FederatedExecutor/cluster`` extension.
+    """
+
+    TASK_CONFIG_INTERFACE = MesosTaskConfig
+
+    def __init__(self,
+                 executors,
+                 stall_timeout_s=120.0,
+                 rebalance_interval_s=10.0,
+                 max_rebalance_batch=100):
+        """
+        :param dict executors: cluster name -> MesosExecutor, or any other
+            executor with load() and withdraw_queued_tasks()
+        """
+        self.executors = dict(executors)
+        self.stall_timeout_s = stall_timeout_s
+        self.rebalance_interval_s = rebalance_interval_s
+        self.max_rebalance_batch = max_rebalance_batch
+
+        # Held while tasks move between clusters, so that kills find them
+        self.lock = threading.Lock()
+        # task_id or group_id -> name of the cluster it was sent to
+        self.task_clusters = {}
+
+        create_counter(TASK_REBALANCED_COUNT)
+        create_timer(EVENT_QUEUE_TIME_TIMER)
+
+        self.dest_queue = EventStream()
+        self.stopping = False
+        self._open_streams = len(self.executors)
+        self._streams_lock = threading.Lock()
+
+        self.merge_threads = []
+        for name, executor in sorted(self.executors.items()):
+            merge_thread = threading.Thread(
+                target=self.merge_loop,
+                args=(name, executor.get_event_queue()),
+            )
+            merge_thread.daemon = True
+            merge_thread.start()
+            self.merge_threads.append(merge_thread)
+
+        rebalance_thread = threading.Thread(target=self.rebalance_loop)
+        rebalance_thread.daemon = True
+        rebalance_thread.start()
+
+    def merge_loop(self, name, src_queue):
+        while True:
+            try:
+                events = get_many(src_queue, EVENT_BATCH_SIZE)
+            except EventStreamClosed:
+                break
+            record_event_queue_time(EVENT_QUEUE_TIME_TIMER, events)
+
+            # Without the lock: kills and moves holding it may be waiting for
+            # room in src_queue
+            for e in events:
+                if e.kind == 'task' and e.terminal:
+                    self.task_clusters.pop(e.task_id, None)
+            self.dest_queue.put_many([
+                e.set(extensions=e.extensions.set(CLUSTER_EXTENSION, name))
+                for e in events
+            ])
+
+        # The merged stream ends with the last of the clusters' streams
+        with self._streams_lock:
+            self._open_streams -= 1
+            last = self._open_streams == 0
+        if last:
+            self.dest_queue.close()
+
+    def rebalance_loop(self):
+        while not self.stopping:
+            time.sleep(self.rebalance_interval_s)
+            try:
+                self.rebalance()
+            except Exception:
+                log.error(traceback.format_exc())
+
+    def loads(self):
+        """The :class:`ClusterLoad` of every cluster, by name"""
+        return {
+            name: executor.load()
+            for name, executor in self.executors.items()
+        }
+
+    def stalled(self, load):
+        return load.queue_depth > 0 and load.waiting_s >= self.stall_timeout_s
+
+    def route(self, count, loads, exclude=()):
+        """Pick a cluster for each of count tasks
+
+        Every task goes where it should start soonest, counting the tasks
+        routed before it. Stalled clusters only get tasks when all of them
+        are stalled.
+
+        :returns list: the cluster name of every task
+        """
+        names = [name for name in sorted(loads) if name not in exclude]
+        names = [
+            name for name in names if not self.stalled(loads[name])
+        ] or names
+        routed = dict.fromkeys(names, 0)
+
+        def expected_start(name):
+            return (
+                estimated_wait(loads[name], routed[name]),
+                loads[name].queue_depth + routed[name],
+            )
+
+        clusters = []
+        for _ in range(count):
+            name = min(names, key=expected_start)
+            routed[name] += 1
+            clusters.append(name)
+        return clusters
+
+    def _by_cluster(self, task_configs, clusters):
+        by_cluster = {}
+        for task_config, name in zip(task_configs, clusters):
+            by_cluster.setdefault(name, []).append(task_config)
+            self.task_clusters[task_config.task_id] = name
+        return by_cluster
+
+    def rebalance(self):
+        """Move queued tasks off stalled clusters, to the others
+
+        :returns int: the number of tasks moved
+        """
+        loads = self.loads()
+        stalled = [name for name in sorted(loads) if self.stalled(loads[name])]
+        if not stalled or len(stalled) == len(loads):
+            return 0
+
+        with self.lock:
+            task_configs = []
+            for name in stalled:
+                withdrawn = self.executors[name].withdraw_queued_tasks(
+                    self.max_rebalance_batch)
+                if withdrawn:
+                    log.warning(
+                        'Moving {} queued tasks off cluster {}, stalled for '
+                        '{:.0f}s'.format(
+                            len(withdrawn), name, loads[name].waiting_s))
+                task_configs.extend(withdrawn)
+            by_cluster = self._by_cluster(task_configs, self.route(
+                len(task_configs), loads, exclude=stalled))
+            for name, configs in by_cluster.items():
+                self.executors[name].run_many(configs)
+
+        if task_configs:
+            get_metric(TASK_REBALANCED_COUNT).count(len(task_configs))
+        return len(task_configs)
+
+    def run(self, task_config):
+        self.run_many([task_config])
+
+    def run_many(self, task_configs):
+        task_configs = list(task_configs)
+        clusters = self.route(len(task_configs), self.loads())
+        with self.lock:
+            by_cluster = self._by_cluster(task_configs, clusters)
+        for name, configs in by_cluster.items():
+            self.executors[name].run_many(configs)
+        return [task_config.task_id for task_config in task_configs]
+
+    def run_group(self, task_configs):
+        """Run tasks that have to start together, or not at all, on a
+        single cluster, see :meth:`MesosExecutor.run_group`
+
+        :returns str group_id: The id of the group's terminal event
+        """
+        task_configs = list(task_configs)
+        name = self.route(1, self.loads())[0]
+        with self.lock:
+            self._by_cluster(task_configs, [name] * len(task_configs))
+        group_id = self.executors[name].run_group(task_configs)
+        with self.lock:
+            self.task_clusters[group_id] = name
+        return group_id
+
+    def kill(self, task_id):
+        self.kill_many([task_id])
+
+    def kill_many(self, task_ids):
+        by_cluster = {}
+        with self.lock:
+            for task_id in task_ids:
+                name = self.task_clusters.get(task_id)
+                # Unknown tasks have finished already
+                if name is not None:
+                    by_cluster.setdefault(name, []).append(task_id)
+            for name, cluster_task_ids in by_cluster.items():
+                self.executors[name].kill_many(cluster_task_ids)
+
+    def kill_matching(self, predicate):
+        """Kill every task whose task_config satisfies predicate, on all
+        clusters
+
+        :returns list task_ids: The tasks that were killed
+        """
+        with self.lock:
+            return [
+                task_id
+                for name, executor in sorted(self.executors.items())
+                for task_id in executor.kill_matching(predicate)
+            ]
+
+    def stop(self):
+        self.stopping = True
+        for executor in self.executors.values():
+            executor.stop()
+        for merge_thread in self.merge_threads:
+            merge_thread.join()
+
+    def get_event_queue(self):
+        return self.dest_queue
@@ -0,0 +1,297 @@
+import collections
+import logging
+import time
+from threading import Lock
+from threading import Thread
+
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import EventStream
+from task_processing.event_stream import EventStreamClosed
+from task_processing.event_stream import get_many
+from task_processing.interfaces.task_executor import TaskExecutor
+from task_processing.metrics import create_counter
+from task_processing.metrics import create_timer
+from task_processing.metrics import get_metric
+from task_processing.plugins.mesos.deadline_scheduler import (
+    DeadlineScheduler
+)
+from task_processing.tracing import record_event_queue_time
+
+log = logging.getLogger(__name__)
+
+HEDGE_LAUNCHED_COUNT = 'taskproc.hedging.hedge_launched_count'
+HEDGE_WON_COUNT = 'taskproc.hedging.hedge_won_count'
+HEDGE_CAPPED_COUNT = 'taskproc.hedging.hedge_capped_count'
+EVENT_QUEUE_TIME_TIMER = 'taskproc.hedging.event_queue_time'
+
+
+class RuntimeHistory(object):
+    """Runtimes of the most recent successful runs of every task name"""
+
+    def __init__(self, size=100):
+        self.size = size
+        self._runtimes = {}
+        # name -> sorted runtimes, invalidated by record()
+        self._sorted = {}
+
+    def record(self, name, runtime):
+        if name not in self._runtimes:
+            self._runtimes[name] = collections.deque(maxlen=self.size)
+        self._runtimes[name].append(runtime)
+        self._sorted.pop(name, None)
+
+    def samples(self, name):
+        return len(self._runtimes.get(name, ()))
+
+    def quantile(self, name, q):
+        """Runtime below which a fraction q of the recorded runs finished"""
+        if name not in self._sorted:
+            self._sorted[name] = sorted(self._runtimes[name])
+        runtimes = self._sorted[name]
+        return runtimes[min(len(runtimes) - 1, int(q * len(runtimes)))]
+
+
+class HedgedTask(object):
+    __slots__ = ('task_config', 'started', 'attempts', 'hedged', 'killed')
+
+    def __init__(self, task_config):
+        self.task_config = task_config
+        # When the original copy started running, None while it is queued
+        self.started = None
+        # Launched task_ids that have not finished yet
+        self.attempts = set([task_config.task_id])
+        self.hedged = False
+        self.killed = False
+
+
+class HedgingExecutor(TaskExecutor):
+    """Launches a speculative copy of tasks that run unusually long
+
+    Runtimes of successful runs are recorded per task name. Once a task
+    has been running for longer than ``quantile`` of the recent runs of
+    its name, a duplicate is launched; whichever copy finishes first is
+    reported as the outcome of the task and the other one is killed.
+    A failed copy is only reported if the other one fails too.
+    """
+
+    def __init__(self,
+                 downstream_executor,
+                 quantile=0.95,
+                 min_samples=20,
+                 max_hedges_in_flight=10,
+                 history_size=100):
+        """
+        :param float quantile: fraction of recent runs a task must outlast
+            before it is hedged
+        :param int min_samples: runs of a task name to observe before its
+            tasks are hedged
+        :param int max_hedges_in_flight: duplicates allowed to run at once;
+            stragglers over the cap are left alone
+        :param int history_size: recent runs remembered per task name
+        """
+        self.downstream_executor = downstream_executor
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_hedges_in_flight = max_hedges_in_flight
+
+        self.history = RuntimeHistory(history_size)
+        self.lock = Lock()
+        # Original task_id -> HedgedTask
+        self.tasks = {}
+        # Launched task_id -> original task_id
+        self.attempts = {}
+        self.hedges_in_flight = 0
+        self.hedge_deadlines = DeadlineScheduler(self._hedge)
+
+        for counter in [
+            HEDGE_LAUNCHED_COUNT, HEDGE_WON_COUNT, HEDGE_CAPPED_COUNT
+        ]:
+            create_counter(counter)
+        create_timer(EVENT_QUEUE_TIME_TIMER)
+
+        self.src_queue = downstream_executor.get_event_queue()
+        self.dest_queue = EventStream()
+        self.stopping = False
+
+        self.hedge_thread = Thread(target=self.hedge_loop)
+        self.hedge_thread.daemon = True
+        self.hedge_thread.start()
+
+    def hedge_loop(self):
+        while True:
+            # Drain whatever is left before honouring stop()
+            if self.stopping and self.src_queue.empty():
+                break
+
+            try:
+                events = get_many(self.src_queue, EVENT_BATCH_SIZE)
+            except EventStreamClosed:
+                break
+            record_event_queue_time(EVENT_QUEUE_TIME_TIMER, events)
+
+            processed = []
+            for e in events:
+                e = self._process_event(e)
+                if e is not None:
+                    processed.append(e)
+            self.dest_queue.put_many(processed)
+
+        self.dest_queue.close()
+
+    def _process_event(self, e):
+        """Report the first outcome of a task and kill its other copy
+
+        :returns: the event to pass on, or None if it is swallowed
+        """
+        if e.kind != 'task':
+            return e
+
+        with self.lock:
+            task_id = self.attempts.get(e.task_id)
+            task = self.tasks.get(task_id)
+            if task is None:
+                # Not ours, or a copy that lost the race
+                if task_id is not None and e.terminal:
+                    del self.attempts[e.task_id]
+                return e if task_id is None else None
+
+            is_hedge = e.task_id != task_id
+            if not e.terminal:
+                # Only the original copy reports progress
+                if is_hedge:
+                    return None
+                deadline = None
+                if e.platform_type == 'running' and task.started is None:
+                    deadline = self._start(task)
+            else:
+                del self.attempts[e.task_id]
+                task.attempts.discard(e.task_id)
+                if not e.success and task.attempts and not task.killed:
+                    # The other copy may still succeed
+                    return None
+
+                del self.tasks[task_id]
+                if task.hedged:
+                    self.hedges_in_flight -= 1
+                losers = list(task.attempts)
+                if e.success and task.started is not None:
+                    self.history.record(
+                        task.task_config.name, time.time() - task.started)
+
+        if not e.terminal:
+            if deadline is not None:
+                self.hedge_deadlines.schedule_many([(task_id, deadline)])
+            return e
+
+        self.hedge_deadlines.cancel(task_id)
+        if losers:
+            self.downstream_executor.kill_many(losers)
+        if not task.hedged:
+            return e
+
+        if is_hedge and e.success:
+            get_metric(HEDGE_WON_COUNT).count(1)
+        return e.set(
+            task_id=task_id,
+            task_config=task.task_config,
+            extensions=e.extensions.set(
+                'HedgingExecutor/winner', 'hedge' if is_hedge else 'original'
+            ),
+        )
+
+    def _hedge(self, task_id):
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if (
+                task is None or task.started is None or
+                task.hedged or task.killed
+            ):
+                return
+            if self.hedges_in_flight >= self.max_hedges_in_flight:
+                capped = True
+            else:
+                capped = False
+                self.hedges_in_flight += 1
+                task.hedged = True
+                hedge_config = task.task_config.set(
+                    uuid='{}-hedge'.format(task.task_config.uuid))
+                task.attempts.add(hedge_config.task_id)
+                self.attempts[hedge_config.task_id] = task_id
+
+        if capped:
+            get_metric(HEDGE_CAPPED_COUNT).count(1)
+            return
+
+        log.info('Hedging task {}: running for {:.1f}s'.format(
+            task_id, time.time() - task.started))
+        get_metric(HEDGE_LAUNCHED_COUNT).count(1)
+        self.downstream_executor.run(hedge_config)
+
+        # The original may have finished while the hedge was being launched
+        with self.lock:
+            finished = task_id not in self.tasks
+        if finished:
+            self.downstream_executor.kill(hedge_config.task_id)
+
+    def _start(self, task):
+        """Start the runtime clock of a task that started running
+
+        :returns: when to hedge it, or None if its name has too few runs
+        """
+        task.started = time.time()
+        name = task.task_config.name
+        if self.history.samples(name) < self.min_samples:
+            return None
+        return task.started + self.history.quantile(name, self.quantile)
+
+    def _track(self, task_configs):
+        # The clock starts once a task runs, not while it waits for offers
+        with self.lock:
+            for task_config in task_configs:
+                self.tasks[task_config.task_id] = HedgedTask(task_config)
+                self.attempts[task_config.task_id] = task_config.task_id
+
+    def run(self, task_config):
+        self._track([task_config])
+        self.downstream_executor.run(task_config)
+
+    def run_many(self, task_configs):
+        task_configs = list(task_configs)
+        self._track(task_configs)
+        self.downstream_executor.run_many(task_configs)
+        return [task_config.task_id for task_config in task_configs]
+
+    def kill(self, task_id):
+        self.kill_many([task_id])
+
+    def kill_many(self, task_ids):
+        launched = []
+        with self.lock:
+            for task_id in task_ids:
+                task = self.tasks.get(task_id)
+                if task is None:
+                    launched.append(task_id)
+                    continue
+                task.killed = True
+                launched.extend(task.attempts)
+        for task_id in task_ids:
+            self.hedge_deadlines.cancel(task_id)
+        self.downstream_executor.kill_many(launched)
+
+    def kill_matching(self, predicate):
+        with self.lock:
+            matching = [
+                task_id for task_id, task in self.tasks.items()
+                if predicate(task.task_config)
+            ]
+        self.kill_many(matching)
+        return matching
+
+    def stop(self):
+        self.downstream_executor.stop()
+        self.stopping = True
+        self.hedge_deadlines.stop()
+        self.hedge_thread.join()
+
+    def get_event_queue(self):
+        return self.dest_queue
@@ -4,18 +4,24 @@ import uuid
 
 from pymesos import MesosSchedulerDriver
 from pyrsistent import field
+from pyrsistent import freeze
 from pyrsistent import m
 from pyrsistent import PMap
 from pyrsistent import pmap
 from pyrsistent import PRecord
+from pyrsistent import PSet
+from pyrsistent import pset
 from pyrsistent import PVector
 from pyrsistent import pvector
+from pyrsistent import s
 from pyrsistent import v
 
 from task_processing.interfaces.task_executor import TaskExecutor
+from task_processing.plugins.mesos.constraints import valid_constraints
 from task_processing.plugins.mesos.execution_framework import (
     ExecutionFramework
 )
+from task_processing.plugins.mesos.placement import valid_strategy
 from task_processing.plugins.mesos.translator import mesos_status_to_event
 
 FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s - %(message)s'
@@ -36,6 +42,45 @@ def valid_volumes(volumes):
     return (True, None)
 
 
+# Frozen field values by their contents, bounded like TaskInfo templates
+_MAX_INTERNED = 1000
+_interned = {}
+
+
+def _interned_value(key, make_value):
+    """The value shared by every task config whose field has key as its
+    contents, so that they also share its hash and compare equal by
+    identity when they look up their TaskInfo template
+    """
+    try:
+        value = _interned.get(key)
+    except TypeError:
+        # Unhashable contents, e.g. nested dicts
+        return make_value()
+    if value is None:
+        value = make_value()
+        if len(_interned) >= _MAX_INTERNED:
+            _interned.clear()
+        _interned[key] = value
+    return value
+
+
+def frozen_dicts(dicts):
+    """Volumes and the like as a PVector of PMaps"""
+    return _interned_value(
+        ('dicts',) + tuple(frozenset(d.items()) for d in dicts),
+        lambda: pvector(freeze(dict(d)) for d in dicts),
+    )
+
+
+def frozen_map(mapping):
+    """The environment and the like as a PMap"""
+    return _interned_value(
+        ('map', frozenset(mapping.items())),
+        lambda: pmap(mapping),
+    )
+
+
 class MesosTaskConfig(PRecord):
     def __invariant__(conf):
         return ('image' in conf if conf.containerizer == 'DOCKER' else True,
@@ -70,20 +115,35 @@ class MesosTaskConfig(PRecord):
                     invariant=lambda t: (t > 0, 'timeout > 0'))
     volumes = field(type=PVector,
                     initial=v(),
-                    factory=pvector,
+                    factory=frozen_dicts,
                     invariant=valid_volumes)
     ports = field(type=PVector, initial=v(), factory=pvector)
     cap_add = field(type=PVector, initial=v(), factory=pvector)
     ulimit = field(type=PVector, initial=v(), factory=pvector)
     uris = field(type=PVector, initial=v(), factory=pvector)
     # TODO: containerization + containerization_args ?
-    docker_parameters = field(type=PVector, initial=v(), factory=pvector)
+    docker_parameters = field(type=PVector,
+                              initial=v(),
+                              factory=frozen_dicts)
     containerizer = field(type=str,
                           initial='DOCKER',
                           invariant=lambda c:
                           (c == 'DOCKER' or c == 'MESOS',
                            'containerizer is docker or mesos'))
-    environment = field(type=PMap, initial=m(), factory=pmap)
+    environment = field(type=PMap, initial=m(), factory=frozen_map)
+    # Placement hint: agents this task should not be launched on, e.g. the
+    # ones where earlier attempts failed, unless no other agent fits it
+    excluded_agent_ids = field(type=PSet, initial=s(), factory=pset)
+    # [attribute, operator, value] lists, see plugins/mesos/constraints.py
+    constraints = field(type=PVector,
+                        initial=v(),
+                        factory=freeze,
+                        invariant=valid_constraints)
+    # Overrides the framework's placement strategy, see
+    # plugins/mesos/placement.py
+    placement_strategy = field(type=(str, type(None)),
+                               initial=None,
+                               invariant=valid_strategy)
 
     @property
     def task_id(self):
@@ -104,12 +164,28 @@ class MesosExecutor(TaskExecutor):
         framework_translator=mesos_status_to_event,
         framework_name='taskproc-default',
         framework_staging_timeout=60,
+        placement_strategy='first_fit',
+        offer_backoff=10,
+        bad_pool_offer_backoff=300,
+        max_insufficient_offer_backoff=60,
+        max_kills_per_second=100,
+        trace_sample_rate=0.0,
     ):
         """
         Constructs the instance of a task execution, encapsulating all state
         required to run, monitor and stop the job.
 
         :param dict credentials: Mesos principal and secret.
+        :param int offer_backoff: seconds offers declined for lack of
+            tasks are refused for, see plugins/mesos/decline_filters.py
+        :param int bad_pool_offer_backoff: the same for offers of another
+            pool
+        :param int max_insufficient_offer_backoff: cap on the same for
+            offers too small for every queued task
+        :param int max_kills_per_second: rate at which kills are sent to
+            Mesos
+        :param float trace_sample_rate: fraction of tasks traced through
+            the framework, see task_processing/tracing.py
         """
 
         self.logger = logging.getLogger(__name__)
@@ -120,7 +196,13 @@ class MesosExecutor(TaskExecutor):
             name=framework_name,
             translator=framework_translator,
             task_staging_timeout_s=framework_staging_timeout,
-            initial_decline_delay=initial_decline_delay
+            initial_decline_delay=initial_decline_delay,
+            placement_strategy=placement_strategy,
+            offer_backoff=offer_backoff,
+            bad_pool_offer_backoff=bad_pool_offer_backoff,
+            max_insufficient_offer_backoff=max_insufficient_offer_backoff,
+            max_kills_per_second=max_kills_per_second,
+            trace_sample_rate=trace_sample_rate,
         )
 
         # TODO: Get mesos master ips from smartstack
@@ -143,9 +225,54 @@ class MesosExecutor(TaskExecutor):
     def run(self, task_config):
         self.execution_framework.enqueue_task(task_config)
 
+    def run_many(self, task_configs):
+        task_configs = list(task_configs)
+        self.execution_framework.enqueue_tasks(task_configs)
+        return [task_config.task_id for task_config in task_configs]
+
+    def run_group(self, task_configs):
+        """Run tasks that have to start together, or not at all
+
+        The tasks are only launched once offers fit all of them, with
+        LAUNCH_GROUP if they fit on a single agent and all use the Mesos
+        containerizer. Every task gets its own events as usual. When the
+        first of them ends unsuccessfully the rest are killed, and once all
+        of them are done the group gets a terminal event whose task_id is
+        the group id, successful only if all of its tasks were.
+
+        :returns str group_id: The id of the group's terminal event
+        """
+        return self.execution_framework.enqueue_group(task_configs)
+
     def kill(self, task_id):
         self.execution_framework.kill_task(task_id)
 
+    def kill_many(self, task_ids):
+        self.execution_framework.kill_tasks(task_ids)
+
+    def kill_matching(self, predicate):
+        """Kill every task whose task_config satisfies predicate
+
+        :returns list task_ids: The tasks that were killed
+        """
+        return self.execution_framework.kill_matching(predicate)
+
+    def load(self):
+        """How the cluster is keeping up with the tasks run on it
+
+        :returns: a :class:`task_processing.plugins.mesos.cluster_load.
+            ClusterLoad`
+        """
+        return self.execution_framework.load()
+
+    def withdraw_queued_tasks(self, max_n):
+        """Take up to max_n tasks that are still waiting for offers back,
+        without any events for them
+
+        :returns list: the task_configs of the withdrawn tasks
+        """
+        return self.execution_framework.withdraw_queued_tasks(max_n)
+
     def stop(self):
         self.execution_framework.stop()
         self.driver.stop()
@@ -0,0 +1,170 @@
+"""Placement strategies for Mesos tasks
+
+Offers that arrive together are matched together: the offers of an agent
+are pooled into one slot, every queued task is checked against all of the
+slots, and a placement strategy picks one of the slots the task fits in.
+
+- ``first_fit``: the first offer the task fits in, in the order offers
+  arrived. Packs offers one after another.
+- ``spread``: the agent running the fewest of our tasks, then the least
+  used one. Keeps noisy neighbours apart, for latency sensitive tasks.
+- ``bin_pack``: the most used agent, so that whole agents stay free for
+  big tasks. Suits batch tasks.
+- ``two_choices``: the less loaded of two offers picked at random, which
+  spreads nearly as well as ``spread`` without every task going to the
+  same agent when load information is stale.
+
+Strategies are chosen per framework, and tasks can override it with their
+``placement_strategy``. Custom strategies implement ``choose``.
+"""
+import abc
+import random
+
+import six
+
+
+class OfferSlot(object):
+    """The offers of an agent being matched, and what is left of them"""
+
+    __slots__ = (
+        'offer', 'offers', 'agent', 'cpus', 'mem', 'disk', 'gpus', 'ports',
+        'tasks',
+    )
+
+    def __init__(self, offer, agent, resources, ports):
+        self.offer = offer
+        self.offers = [offer]
+        self.agent = agent
+        self.cpus = resources['cpus']
+        self.mem = resources['mem']
+        self.disk = resources['disk']
+        self.gpus = resources['gpus']
+        self.ports = ports
+        # TaskInfos of the tasks placed in these offers
+        self.tasks = []
+
+    def add(self, offer, resources, ports):
+        """Pool another offer of the same agent into this slot"""
+        self.offers.append(offer)
+        self.cpus += resources['cpus']
+        self.mem += resources['mem']
+        self.disk += resources['disk']
+        self.gpus += resources['gpus']
+        self.ports.extend(ports)
+
+    def resources(self):
+        return dict(
+            cpus=self.cpus, mem=self.mem, disk=self.disk, gpus=self.gpus)
+
+    def take(self, task_config):
+        """Deduct the resources of task_config from what is left"""
+        self.cpus -= task_config.cpus
+        self.mem -= task_config.mem
+        self.disk -= task_config.disk
+        self.gpus -= task_config.gpus
+
+    def give(self, task_config):
+        """Undo take"""
+        self.cpus += task_config.cpus
+        self.mem += task_config.mem
+        self.disk += task_config.disk
+        self.gpus += task_config.gpus
+
+    def exhausted(self):
+        return self.cpus <= 0 or self.mem <= 0 or not self.ports
+
+    def utilization(self):
+        """Fraction of the agent's cpus and mem not left in this offer"""
+        capacity = self.agent.capacity
+        used = 0.0
+        for name in ('cpus', 'mem'):
+            if capacity[name] > 0:
+                used += 1.0 - getattr(self, name) / capacity[name]
+        return used / 2
+
+    def load(self):
+        return (len(self.agent.task_ids), self.utilization())
+
+
+def fitting_slots(task_config, slots):
+    """The slots with enough resources left for task_config"""
+    # Fields of a PRecord are slow to read, and this runs for every queued
+    # task against every offer.
+    cpus = task_config.cpus
+    mem = task_config.mem
+    disk = task_config.disk
+    gpus = task_config.gpus
+    return [
+        slot for slot in slots
+        if slot.cpus >= cpus and slot.mem >= mem and slot.disk >= disk and
+        slot.gpus >= gpus and slot.ports
+    ]
+
+
+@six.add_metaclass(abc.ABCMeta)
+class PlacementStrategy(object):
+    @abc.abstractmethod
+    def choose(self, task_config, slots):
+        """Pick the slot to place task_config in
+
+        :param slots: the OfferSlots task_config fits in, never empty, in
+            the order their offers arrived
+        """
+        pass
+
+
+class FirstFit(PlacementStrategy):
+    def choose(self, task_config, slots):
+        return slots[0]
+
+
+class Spread(PlacementStrategy):
+    def choose(self, task_config, slots):
+        return min(slots, key=OfferSlot.load)
+
+
+class BinPack(PlacementStrategy):
+    def choose(self, task_config, slots):
+        return max(
+            slots,
+            key=lambda slot: (slot.utilization(), len(slot.agent.task_ids)),
+        )
+
+
+class TwoChoices(PlacementStrategy):
+    def __init__(self, rng=random):
+        self.rng = rng
+
+    def choose(self, task_config, slots):
+        if len(slots) == 1:
+            return slots[0]
+        return min(self.rng.sample(slots, 2), key=OfferSlot.load)
+
+
+STRATEGIES = {
+    'first_fit': FirstFit(),
+    'spread': Spread(),
+    'bin_pack': BinPack(),
+    'two_choices': TwoChoices(),
+}
+
+
+def get_strategy(strategy):
+    """The strategy registered under a name, or strategy itself
+
+    :raises ValueError: if there is no strategy by that name
+    """
+    if isinstance(strategy, PlacementStrategy):
+        return strategy
+    try:
+        return STRATEGIES[strategy]
+    except KeyError:
+        raise ValueError('Unknown placement strategy {}, must be one of '
+                         '{}'.format(strategy, sorted(STRATEGIES)))
+
+
+def valid_strategy(strategy):
+    if strategy is None or strategy in STRATEGIES:
+        return (True, None)
+    return (False, 'placement_strategy must be one of {}'.format(
+        sorted(STRATEGIES)))
@@ -0,0 +1,74 @@
+import threading
+import time
+
+
+class RateLimiter(object):
+    """Token bucket that allows ``rate`` operations per second on average,
+    in bursts of up to ``burst`` operations.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._last_refill = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        self._tokens = min(
+            self.burst,
+            self._tokens + (now - self._last_refill) * self.rate,
+        )
+        self._last_refill = now
+
+    def try_acquire(self):
+        """Take a token if one is available
+
+        :returns bool: whether the operation may go ahead right now
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def time_until_available(self):
+        """Seconds until the next token becomes available"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+
+class RetryBudget(object):
+    """Token bucket that caps retries at a fraction of submissions
+
+    Every submitted task earns ``ratio`` tokens and every retry spends one,
+    so with ``ratio=0.1`` at most one retry is allowed per ten submissions
+    over time. ``max_tokens`` bounds how many retries can be saved up for
+    a burst of failures. One budget can be shared by several executors
+    that submit to the same cluster.
+    """
+
+    def __init__(self, ratio=0.1, max_tokens=10):
+        self.ratio = float(ratio)
+        self.max_tokens = float(max_tokens)
+        self._tokens = self.max_tokens
+        self._lock = threading.Lock()
+
+    def record_submissions(self, count=1):
+        with self._lock:
+            self._tokens = min(
+                self.max_tokens, self._tokens + count * self.ratio)
+
+    def try_spend(self):
+        """Take the token for a retry
+
+        :returns bool: whether the retry is within budget
+        """
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
@@ -1,54 +1,107 @@
 import logging
+import random
 import time
 from threading import Lock
 from threading import Thread
 
+import six
 from pyrsistent import m
-from six.moves.queue import Queue
 
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import EventStream
+from task_processing.event_stream import EventStreamClosed
+from task_processing.event_stream import get_many
 from task_processing.interfaces.task_executor import TaskExecutor
+from task_processing.metrics import create_counter
+from task_processing.metrics import create_timer
+from task_processing.metrics import get_metric
+from task_processing.plugins.mesos.deadline_scheduler import (
+    DeadlineScheduler
+)
+from task_processing.tracing import record_event_queue_time
 
 log = logging.getLogger(__name__)
 
+RETRY_COUNT = 'taskproc.retrying.retry_count'
+RETRY_DEFERRED_COUNT = 'taskproc.retrying.retry_deferred_count'
+RETRY_SUPPRESSED_COUNT = 'taskproc.retrying.retry_suppressed_count'
+EVENT_QUEUE_TIME_TIMER = 'taskproc.retrying.event_queue_time'
+
 
 class RetryingExecutor(TaskExecutor):
     def __init__(self,
                  executor,
                  retry_pred=lambda e: not e.success,
-                 retries=3):
+                 retries=3,
+                 backoff_s=0.0,
+                 backoff_multiplier=2.0,
+                 max_backoff_s=300.0,
+                 backoff_jitter=0.5,
+                 retry_budget=None,
+                 avoid_failed_agents=True):
+        """
+        :param float backoff_s: delay before the first retry; 0 retries
+            right away. Every further attempt waits backoff_multiplier
+            times longer, up to max_backoff_s.
+        :param float backoff_jitter: fraction of each delay that is
+            randomized, so tasks that failed together don't retry together
+        :param retry_budget: optional
+            :class:`task_processing.plugins.mesos.rate_limiter.RetryBudget`;
+            failures over budget are reported instead of retried
+        :param bool avoid_failed_agents: retry tasks away from the agents
+            their earlier attempts failed on
+        """
         self.executor = executor
         self.retries = retries
         self.retry_pred = retry_pred
+        self.backoff_s = backoff_s
+        self.backoff_multiplier = backoff_multiplier
+        self.max_backoff_s = max_backoff_s
+        self.backoff_jitter = backoff_jitter
+        self.retry_budget = retry_budget
+        self.avoid_failed_agents = avoid_failed_agents
 
         self.task_retries = m()
         self.task_retries_lock = Lock()
+        # Tasks killed on request are not retried
+        self.killed_tasks = set()
+        # Launched attempt task_id -> (original task_config, attempt number)
+        self.attempts = {}
+        # Failed events of tasks waiting out their backoff, by task_id
+        self.deferred_retries = {}
+        self.retry_scheduler = DeadlineScheduler(self._run_deferred_retry)
+
+        for counter in [
+            RETRY_COUNT, RETRY_DEFERRED_COUNT, RETRY_SUPPRESSED_COUNT
+        ]:
+            create_counter(counter)
+        create_timer(EVENT_QUEUE_TIME_TIMER)
 
         self.src_queue = executor.get_event_queue()
-        self.dest_queue = Queue()
+        self.dest_queue = EventStream()
         self.stopping = False
 
         self.retry_thread = Thread(target=self.retry_loop)
         self.retry_thread.daemon = True
         self.retry_thread.start()
 
-    def event_with_retries(self, event):
-        return event.transform(
-            ('extensions', 'RetryingExecutor/tries'),
-            "{}/{}".format(
-                self.task_retries[event.task_id],
-                self.retries
-            )
-        )
-
     def retry(self, event):
         current_retry_attempt = self.task_retries[event.task_id]
         # This task has been killed manually
-        if current_retry_attempt == -1:
+        if event.task_id in self.killed_tasks:
             return False
 
         if current_retry_attempt == self.retries:
             return False
 
+        if self.retry_budget is not None and \
+                not self.retry_budget.try_spend():
+            log.warning(
+                'Not retrying task {}: retry budget exhausted'.format(
+                    event.task_id))
+            get_metric(RETRY_SUPPRESSED_COUNT).count(1)
+            return False
+
         log.info(
             'Retrying task {}, {} of {}, fail event: {}'.format(
                 event.task_config.name, current_retry_attempt,
@@ -61,96 +114,211 @@ class RetryingExecutor(TaskExecutor):
                 event.task_id,
                 current_retry_attempt + 1
             )
-        self.run(event.task_config)
-
-        return True
+        get_metric(RETRY_COUNT).count(1)
 
-    def retry_loop(self):
-        while True:
-            while not self.src_queue.empty():
-                e = self.src_queue.get()
-                # This is to remove trailing '-retry*'
-                original_task_id = '-'.join([item for item in
-                                             e.task_id.split('-')[:-1]])
+        if self.avoid_failed_agents:
+            event = self._event_with_placement_hints(event)
 
-                # Check if the update is for current attempt. Discard if
-                # it is not.
-                if not self._is_current_attempt(e, original_task_id):
-                    continue
+        delay = self.backoff_delay(current_retry_attempt)
+        if delay <= 0:
+            self.run(event.task_config)
+            return True
 
-                # Set the task id back to original task_id
-                e = self._restore_task_id(e, original_task_id)
+        with self.task_retries_lock:
+            self.deferred_retries[event.task_id] = event
+        self.retry_scheduler.schedule(event.task_id, time.time() + delay)
+        get_metric(RETRY_DEFERRED_COUNT).count(1)
 
-                if e.kind != 'task':
-                    self.dest_queue.put(e)
-                    continue
+        return True
 
-                e = self.event_with_retries(e)
+    def backoff_delay(self, attempt):
+        """Seconds to wait before retrying after the given failed attempt"""
+        if self.backoff_s <= 0:
+            return 0.0
+        delay = min(
+            self.max_backoff_s,
+            self.backoff_s * self.backoff_multiplier ** (attempt - 1),
+        )
+        return delay * (1 - self.backoff_jitter * random.random())
+
+    def _event_with_placement_hints(self, event):
+        """Exclude the agent the failed attempt ran on from the next one"""
+        agent_id = getattr(getattr(event.raw, 'agent_id', None), 'value', None)
+        if not isinstance(agent_id, six.string_types) or not agent_id or \
+                'excluded_agent_ids' not in event.task_config:
+            return event
+        # Keep the hint in the original config, so the event reporting the
+        # final outcome shows every agent that was avoided
+        return event.set(task_config=event.task_config.set(
+            excluded_agent_ids=event.task_config.excluded_agent_ids.add(
+                agent_id),
+        ))
 
-                if e.terminal:
-                    if self.retry_pred(e):
-                        if self.retry(e):
-                            continue
+    def _run_deferred_retry(self, task_id):
+        with self.task_retries_lock:
+            event = self.deferred_retries.pop(task_id, None)
+        if event is not None:
+            self.run(event.task_config)
 
-                    with self.task_retries_lock:
-                        self.task_retries = \
-                            self.task_retries.remove(e.task_id)
+    def retry_loop(self):
+        while True:
+            # Drain whatever is left before honouring stop()
+            if self.stopping and self.src_queue.empty():
+                break
+
+            try:
+                events = get_many(self.src_queue, EVENT_BATCH_SIZE)
+            except EventStreamClosed:
+                break
+            record_event_queue_time(EVENT_QUEUE_TIME_TIMER, events)
+
+            processed = []
+            for e in events:
+                e = self._process_event(e)
+                if e is not None:
+                    processed.append(e)
+            self.dest_queue.put_many(processed)
+
+        self.dest_queue.close()
+
+    def _process_event(self, e):
+        """Translate an event for an attempt into one for the original task
+
+        :returns: the event to pass on, or None if it is swallowed
+        """
+        if e.kind != 'task':
+            return e
+
+        attempt = self.attempts.get(e.task_id)
+        if attempt is None:
+            # Not launched by this executor, or a late event of an attempt
+            # that already finished
+            return None
+        task_config, attempt_number = attempt
+        if e.terminal:
+            self.attempts.pop(e.task_id, None)
+
+        # Discard updates of earlier attempts
+        if attempt_number != self.task_retries.get(task_config.task_id):
+            return None
+
+        e = e.set(
+            task_id=task_config.task_id,
+            task_config=task_config,
+            extensions=e.extensions.set(
+                'RetryingExecutor/tries',
+                '{}/{}'.format(attempt_number, self.retries),
+            ),
+        )
 
-                self.dest_queue.put(e)
+        if e.terminal:
+            if self.retry_pred(e):
+                if self.retry(e):
+                    return None
 
-            if self.stopping:
-                return
+            with self.task_retries_lock:
+                self.task_retries = \
+                    self.task_retries.remove(e.task_id)
+                self.killed_tasks.discard(e.task_id)
 
-            time.sleep(1)
+        return e
 
     def run(self, task_config):
         if task_config.task_id not in self.task_retries:
             with self.task_retries_lock:
                 self.task_retries = self.task_retries.set(
                     task_config.task_id, 1)
+            if self.retry_budget is not None:
+                self.retry_budget.record_submissions(1)
         self.executor.run(self._task_config_with_retry(task_config))
 
+    def run_many(self, task_configs):
+        task_configs = list(task_configs)
+        with self.task_retries_lock:
+            new_tasks = {
+                task_config.task_id: 1 for task_config in task_configs
+                if task_config.task_id not in self.task_retries
+            }
+            self.task_retries = self.task_retries.update(new_tasks)
+        if self.retry_budget is not None:
+            self.retry_budget.record_submissions(len(new_tasks))
+        self.executor.run_many([
+            self._task_config_with_retry(task_config)
+            for task_config in task_configs
+        ])
+        return [task_config.task_id for task_config in task_configs]
+
     def kill(self, task_id):
-        # retries = -1 so that manually killed tasks can be distinguished
+        self.kill_many([task_id])
+
+    def kill_many(self, task_ids):
+        attempt_ids = []
+        deferred = []
         with self.task_retries_lock:
-            self.tasks_retries = self.task_retries.set(
-                task_id,
-                -1
-            )
-        self.executor.kill(task_id)
+            for task_id in task_ids:
+                if task_id in self.deferred_retries:
+                    # Nothing is running while the task waits to be
+                    # retried: report its last failure as final instead
+                    self.retry_scheduler.cancel(task_id)
+                    deferred.append(self.deferred_retries.pop(task_id))
+                    self.task_retries = self.task_retries.discard(task_id)
+                elif task_id in self.task_retries:
+                    self.killed_tasks.add(task_id)
+                    attempt_ids.append(self._attempt_task_id(task_id))
+                else:
+                    attempt_ids.append(task_id)
+        if deferred:
+            self.dest_queue.put_many(deferred)
+        if attempt_ids:
+            self.executor.kill_many(attempt_ids)
+
+    def kill_matching(self, predicate):
+        killed = []
+
+        # Mark tasks as killed before the kill is sent, so that their
+        # terminal events are never retried.
+        def matches(task_config):
+            attempt = self.attempts.get(task_config.task_id)
+            if attempt is None or not predicate(attempt[0]):
+                return False
+            task_id = attempt[0].task_id
+            with self.task_retries_lock:
+                self.killed_tasks.add(task_id)
+            killed.append(task_id)
+            return True
+
+        self.executor.kill_matching(matches)
+
+        # Tasks waiting out their backoff have no attempt downstream
+        with self.task_retries_lock:
+            deferred = [
+                task_id
+                for task_id, e in self.deferred_retries.items()
+                if predicate(e.task_config)
+            ]
+        self.kill_many(deferred)
+        return killed + deferred
 
     def stop(self):
         self.executor.stop()
         self.stopping = True
+        self.retry_scheduler.stop()
         self.retry_thread.join()
 
     def get_event_queue(self):
         return self.dest_queue
 
+    def _attempt_task_id(self, task_id):
+        return '{id}-retry{attempt}'.format(
+            id=task_id,
+            attempt=self.task_retries[task_id],
+        )
+
     def _task_config_with_retry(self, task_config):
-        return task_config.set(uuid='{id}-retry{attempt}'.format(
+        attempt_number = self.task_retries[task_config.task_id]
+        attempt_config = task_config.set(uuid='{id}-retry{attempt}'.format(
             id=task_config.uuid,
-            attempt=self.task_retries[task_config.task_id]
+            attempt=attempt_number,
         ))
-
-    def _restore_task_id(self, e, original_task_id):
-        task_config = e.task_config.set(uuid='-'.join(
-            [item for item in str(e.task_config.uuid).split('-')[:-1]]
-        ))
-
-        # Set the task id back to original task_id
-        return e.set(
-            task_id=original_task_id,
-            task_config=task_config,
-        )
-
-    def _is_current_attempt(self, e, original_task_id):
-        retry_suffix = '-'.join([item for item in
-                                 e.task_id.split('-')[-1:]])
-
-        # This is to extract retry attempt from retry_suffix
-        # eg: if retry_suffix= 'retry2', then attempt==2
-        attempt = int(retry_suffix[5:])
-        if attempt == self.task_retries[original_task_id]:
-            return True
-        return False
+        self.attempts[attempt_config.task_id] = (task_config, attempt_number)
+        return attempt_config
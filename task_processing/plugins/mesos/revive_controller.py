@@ -0,0 +1,131 @@
+import collections
+import threading
+import time
+
+from task_processing.plugins.mesos.deadline_scheduler import DeadlineScheduler
+
+REVIVE = 'revive'
+
+
+class ReviveController(object):
+    """Decides when to revive and when to suppress offers
+
+    Reviving and suppressing both cost a round trip to the master, and the
+    first offers after a revive take a while to arrive, so flapping between
+    the two on on/off workloads is expensive. Enqueues only ever schedule a
+    revive, which is sent from a background thread and at most once every
+    ``min_revive_interval_s`` seconds. Offers are suppressed once no task
+    has been enqueued for the suppress delay, which is a multiple of the
+    recent gap between enqueues: the burstier the workload, the longer
+    offers are kept flowing after the queue drains. Offers declined for
+    lack of tasks in the meantime come with a refuse filter that only a
+    revive clears, so the next enqueue revives as well.
+
+    ``revive`` and ``suppress`` are called with the controller's lock held,
+    so they never race with each other.
+    """
+
+    def __init__(
+        self,
+        revive,
+        suppress,
+        min_revive_interval_s=1.0,
+        min_suppress_delay_s=10.0,
+        max_suppress_delay_s=300.0,
+        enqueue_rate_window_s=300.0,
+        gap_multiplier=2.0,
+    ):
+        self._revive = revive
+        self._suppress = suppress
+        self.min_revive_interval_s = min_revive_interval_s
+        self.min_suppress_delay_s = min_suppress_delay_s
+        self.max_suppress_delay_s = max_suppress_delay_s
+        self.enqueue_rate_window_s = enqueue_rate_window_s
+        self.gap_multiplier = gap_multiplier
+
+        self.suppressed = False
+        # Offers were declined with a filter since the last revive
+        self.offers_filtered = False
+        self._last_revive = None
+        self._last_enqueue = None
+        # Don't suppress right after starting, before anyone had a chance
+        # to enqueue anything.
+        self._last_activity = time.time()
+        self._enqueue_times = collections.deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self._scheduler = DeadlineScheduler(self._scheduled_revive)
+
+    def tasks_enqueued(self):
+        """Note that tasks were enqueued and revive offers if needed"""
+        with self._lock:
+            now = time.time()
+            self._enqueue_times.append(now)
+            self._last_enqueue = self._last_activity = now
+            self._schedule_revive(now)
+
+    def offers_declined(self, checked_at):
+        """Note that offers were declined because the task queue was empty
+
+        :param float checked_at: when the queue was found empty; tasks
+            enqueued since then have to revive the declined offers
+        """
+        with self._lock:
+            self.offers_filtered = True
+            if self._last_enqueue is not None and \
+                    self._last_enqueue >= checked_at:
+                self._schedule_revive(time.time())
+
+    def _schedule_revive(self, now):
+        if not (self.suppressed or self.offers_filtered) or \
+                REVIVE in self._scheduler:
+            return
+        revive_at = now
+        if self._last_revive is not None:
+            revive_at = max(
+                now, self._last_revive + self.min_revive_interval_s)
+        self._scheduler.schedule(REVIVE, revive_at)
+
+    def _scheduled_revive(self, key):
+        with self._lock:
+            if not (self.suppressed or self.offers_filtered):
+                return
+            now = time.time()
+            self._revive()
+            self.suppressed = self.offers_filtered = False
+            self._last_revive = self._last_activity = now
+
+    def suppress_delay(self):
+        """Seconds without enqueues after which offers are suppressed"""
+        with self._lock:
+            return self._suppress_delay(time.time())
+
+    def _suppress_delay(self, now):
+        while self._enqueue_times and \
+                self._enqueue_times[0] < now - self.enqueue_rate_window_s:
+            self._enqueue_times.popleft()
+        if len(self._enqueue_times) < 2:
+            return self.min_suppress_delay_s
+        mean_gap = (self._enqueue_times[-1] - self._enqueue_times[0]) / \
+            (len(self._enqueue_times) - 1)
+        return min(
+            self.max_suppress_delay_s,
+            max(self.min_suppress_delay_s, self.gap_multiplier * mean_gap),
+        )
+
+    def queue_empty(self):
+        """Suppress offers if the task queue has been idle for long enough
+
+        :returns bool: whether offers were suppressed
+        """
+        with self._lock:
+            if self.suppressed or REVIVE in self._scheduler:
+                return False
+            now = time.time()
+            if now - self._last_activity < self._suppress_delay(now):
+                return False
+            self._suppress()
+            self.suppressed = True
+            return True
+
+    def stop(self):
+        self._scheduler.stop()
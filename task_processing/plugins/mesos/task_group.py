@@ -0,0 +1,73 @@
+import collections
+import time
+
+from pyrsistent import freeze
+from pyrsistent import m
+
+from task_processing.interfaces.event import task_event
+
+Resources = collections.namedtuple('Resources', 'cpus mem disk gpus')
+
+# What the default executor running a LAUNCH_GROUP task group needs on top
+# of its tasks
+GROUP_EXECUTOR_RESOURCES = Resources(cpus=0.1, mem=32.0, disk=10.0, gpus=0)
+
+
+class TaskGroup(object):
+    """Tasks that are placed and launched together, or not at all
+
+    A group stands for all of its tasks in the task queue. Once launched,
+    the first of its tasks to end unsuccessfully gets the rest killed, and
+    the group gets a terminal event of its own when all of them are done.
+    """
+
+    def __init__(self, group_id, task_configs):
+        self.group_id = group_id
+        self.task_configs = task_configs
+        self.task_ids = [task_config.task_id for task_config in task_configs]
+        # Whether it is launched on a single agent with LAUNCH_GROUP
+        self.launch_group = False
+        self.killing = False
+        # task_id -> terminal event
+        self.outcomes = {}
+
+    @property
+    def use_launch_group(self):
+        """Whether the tasks can run under the default executor, which only
+        supports the Mesos containerizer
+        """
+        return all(
+            task_config.containerizer == 'MESOS'
+            for task_config in self.task_configs
+        )
+
+    def task_finished(self, event):
+        """Record the terminal event of a task
+
+        :returns bool: whether all tasks of the group are done
+        """
+        self.outcomes[event.task_id] = event
+        return len(self.outcomes) == len(self.task_ids)
+
+    @property
+    def failed(self):
+        return any(not event.success for event in self.outcomes.values())
+
+    def live_task_ids(self):
+        return [
+            task_id for task_id in self.task_ids
+            if task_id not in self.outcomes
+        ]
+
+    def event(self):
+        """The terminal event of the group"""
+        success = not self.failed
+        return task_event(
+            task_id=self.group_id,
+            terminal=True,
+            success=success,
+            platform_type='finished' if success else 'failed',
+            raw=[self.outcomes[task_id] for task_id in self.task_ids],
+            timestamp=time.time(),
+            extensions=m(task_ids=freeze(self.task_ids)),
+        )
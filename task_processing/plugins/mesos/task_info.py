@@ -0,0 +1,168 @@
+"""TaskInfos built from templates shared by tasks that run the same thing
+
+Most of a TaskInfo only depends on what a task runs: its image, command,
+volumes, environment and so on. That part is built once per distinct
+combination of them, and the TaskInfo of every task shares it, adding only
+its own ids, port and resources, which are shared between tasks of the
+same size. Nothing may modify the shared parts of a TaskInfo after it was
+built.
+"""
+import threading
+
+from addict import Dict
+from pyrsistent import thaw
+
+# Bound on templates kept around
+_MAX_TEMPLATES = 1000
+
+
+def _dict(**kwargs):
+    """A Dict of values that already are Dicts wherever they need to be
+
+    Skips converting them again, which is most of the cost of a Dict.
+    """
+    d = Dict()
+    dict.update(d, kwargs)
+    return d
+
+
+def template_key(task_config):
+    """The fields of a task config its template depends on, all of them
+    hashable
+    """
+    return (
+        task_config.containerizer,
+        task_config.get('image'),
+        task_config.cmd,
+        task_config.volumes,
+        task_config.docker_parameters,
+        task_config.uris,
+        task_config.environment,
+    )
+
+
+class _Template(object):
+    __slots__ = ('command', 'container', 'ports_key')
+
+    def __init__(self, task_config):
+        self.command = Dict(
+            value=task_config.cmd,
+            uris=[
+                Dict(value=uri, extract=False)
+                for uri in task_config.uris
+            ],
+            environment=Dict(variables=[
+                Dict(name=k, value=v) for k, v in
+                task_config.environment.items()
+            ])
+        )
+
+        if task_config.containerizer == 'DOCKER':
+            self.container = Dict(
+                type='DOCKER',
+                volumes=thaw(task_config.volumes),
+                docker=Dict(
+                    image=task_config.image,
+                    network='BRIDGE',
+                    parameters=thaw(task_config.docker_parameters),
+                    force_pull_image=True,
+                ),
+            )
+            # Where the container's port mappings go
+            self.ports_key = 'docker'
+        elif task_config.containerizer == 'MESOS':
+            self.container = Dict(
+                type='MESOS',
+                # for docker, volumes should include parameters
+                volumes=thaw(task_config.volumes),
+                network_infos=Dict(),
+            )
+            # For this to work, image_providers needs to be set to 'docker'
+            # on mesos agents
+            if 'image' in task_config:
+                self.container.mesos = Dict(
+                    image=Dict(
+                        type='DOCKER',
+                        docker=Dict(name=task_config.image),
+                    )
+                )
+            self.ports_key = 'network_infos'
+
+    def container_for(self, port):
+        container = _dict(**self.container)
+        container[self.ports_key] = _dict(
+            port_mappings=[_dict(host_port=port, container_port=8888)],
+            **self.container[self.ports_key]
+        )
+        return container
+
+
+class TaskInfoTemplates(object):
+    """Builds TaskInfos, from a cached template per template_key"""
+
+    def __init__(self, role, max_templates=_MAX_TEMPLATES):
+        self.role = role
+        self.max_templates = max_templates
+        self._templates = {}
+        # (cpus, mem, disk, gpus) -> their resources, shared like templates
+        self._scalar_resources = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._templates)
+
+    def _template(self, task_config):
+        key = template_key(task_config)
+        with self._lock:
+            template = self._templates.get(key)
+        if template is not None:
+            return template
+
+        template = _Template(task_config)
+        with self._lock:
+            if len(self._templates) >= self.max_templates:
+                self._templates.clear()
+            self._templates[key] = template
+        return template
+
+    def _scalar(self, name, value):
+        return Dict(
+            name=name,
+            type='SCALAR',
+            role=self.role,
+            scalar=Dict(value=value),
+        )
+
+    def _resources(self, task_config):
+        key = (task_config.cpus, task_config.mem, task_config.disk,
+               task_config.gpus)
+        resources = self._scalar_resources.get(key)
+        if resources is None:
+            resources = [
+                self._scalar(name, value)
+                for name, value in zip(('cpus', 'mem', 'disk', 'gpus'), key)
+            ]
+            with self._lock:
+                if len(self._scalar_resources) >= self.max_templates:
+                    self._scalar_resources.clear()
+                self._scalar_resources[key] = resources
+        return resources
+
+    def task_info(self, task_config, agent_id, port):
+        template = self._template(task_config)
+        task_id = task_config.task_id
+        return _dict(
+            task_id=_dict(value=task_id),
+            agent_id=_dict(value=agent_id),
+            name='executor-{id}'.format(id=task_id),
+            resources=self._resources(task_config) + [
+                _dict(
+                    name='ports',
+                    type='RANGES',
+                    role=self.role,
+                    ranges=_dict(range=[_dict(begin=port, end=port)]),
+                ),
+            ],
+            command=template.command,
+            container=template.container_for(port),
+        )
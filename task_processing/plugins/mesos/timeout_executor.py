@@ -1,16 +1,22 @@
-import collections
 import logging
 import time
 from threading import Lock
 from threading import Thread
 
-from six.moves.queue import Queue
-
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import EventStream
+from task_processing.event_stream import EventStreamClosed
+from task_processing.event_stream import get_many
 from task_processing.interfaces.task_executor import TaskExecutor
+from task_processing.metrics import create_timer
+from task_processing.plugins.mesos.deadline_scheduler import (
+    DeadlineScheduler
+)
+from task_processing.tracing import record_event_queue_time
 
 log = logging.getLogger(__name__)
 
-TaskEntry = collections.namedtuple('TaskEntry', ['task_id', 'deadline'])
+EVENT_QUEUE_TIME_TIMER = 'taskproc.timeout.event_queue_time'
 
 
 class TimeoutExecutor(TaskExecutor):
@@ -19,12 +25,13 @@ class TimeoutExecutor(TaskExecutor):
 
         self.tasks_lock = Lock()
         # Tasks that are pending termination
-        self.killed_tasks = []
-        # Tasks that are currently running
-        self.running_tasks = []
+        self.killed_tasks = set()
+        # Deadlines of tasks that are currently running
+        self.running_tasks = DeadlineScheduler(self._timed_out)
+        create_timer(EVENT_QUEUE_TIME_TIMER)
 
         self.src_queue = downstream_executor.get_event_queue()
-        self.dest_queue = Queue()
+        self.dest_queue = EventStream()
         self.stopping = False
 
         self.timeout_thread = Thread(target=self.timeout_loop)
@@ -33,78 +40,82 @@ class TimeoutExecutor(TaskExecutor):
 
     def timeout_loop(self):
         while True:
-            # process downstream events
-            while not self.src_queue.empty():
-                e = self.src_queue.get()
-                self.dest_queue.put(e)
-
-                if not (e.kind == 'task' and e.terminal):
-                    continue
-                # Update running and killed tasks
-                with self.tasks_lock:
-                    for idx, entry in enumerate(self.running_tasks):
-                        if e.task_id == entry.task_id:
-                            self.running_tasks.pop(idx)
-                            break
-                    if e.task_id in self.killed_tasks:
-                        self.killed_tasks.remove(e.task_id)
-
-            # Check timeouts
-            current_time = time.time()
-            with self.tasks_lock:
-                delete_idx = None
-                for idx, entry in enumerate(self.running_tasks):
-                    if entry.deadline < current_time:
-                        log.info(
-                            'Killing task {}: timed out'.format(entry.task_id))
-                        self.downstream_executor.kill(entry.task_id)
-                        self.killed_tasks.append(entry.task_id)
-                        delete_idx = idx
-                    # Skip the rest of tasks in the list because they are
-                    # appended to the list later.
-                    else:
-                        break
-                if delete_idx is not None:
-                    self.running_tasks = self.running_tasks[delete_idx + 1:]
-
-            if self.stopping:
-                return
-
-            # Since src_queue has to be polled continuously, sleep(1) is used.
-            # Otherwise, a notify() from run() plus wait(delta between now and
-            # the earliest deadline) is more efficient.
-            time.sleep(1)
+            # Drain whatever is left before honouring stop()
+            if self.stopping and self.src_queue.empty():
+                break
+
+            try:
+                events = get_many(self.src_queue, EVENT_BATCH_SIZE)
+            except EventStreamClosed:
+                break
+            record_event_queue_time(EVENT_QUEUE_TIME_TIMER, events)
+
+            self.dest_queue.put_many(events)
+
+            # Update running and killed tasks
+            for e in events:
+                if e.kind == 'task' and e.terminal:
+                    self.running_tasks.cancel(e.task_id)
+                    with self.tasks_lock:
+                        self.killed_tasks.discard(e.task_id)
+
+        self.dest_queue.close()
+
+    def _timed_out(self, task_id):
+        log.info('Killing task {}: timed out'.format(task_id))
+        with self.tasks_lock:
+            self.killed_tasks.add(task_id)
+        self.downstream_executor.kill(task_id)
 
     def run(self, task_config):
         # Tasks are dynamically added and removed from running_tasks and
         # and killed_tasks. It's preferable for the client or execution
         # framework to check for duplicated tasks.
-        new_entry = TaskEntry(
-            task_id=task_config.task_id,
-            deadline=task_config.timeout + time.time()
+        self.running_tasks.schedule(
+            task_config.task_id,
+            task_config.timeout + time.time(),
         )
-        with self.tasks_lock:
-            for idx, entry in enumerate(self.running_tasks):
-                if new_entry.deadline <= entry.deadline:
-                    self.running_tasks.insert(idx, new_entry)
-                    return
-            self.running_tasks.append(new_entry)
-
         self.downstream_executor.run(task_config)
 
+    def run_many(self, task_configs):
+        task_configs = list(task_configs)
+        now = time.time()
+        self.running_tasks.schedule_many([
+            (task_config.task_id, task_config.timeout + now)
+            for task_config in task_configs
+        ])
+
+        self.downstream_executor.run_many(task_configs)
+        return [task_config.task_id for task_config in task_configs]
+
     def kill(self, task_id):
+        self.kill_many([task_id])
+
+    def kill_many(self, task_ids):
+        tracked = [
+            task_id for task_id in task_ids
+            if self.running_tasks.cancel(task_id)
+        ]
+        if not tracked:
+            return
+        with self.tasks_lock:
+            self.killed_tasks.update(tracked)
+        for task_id in tracked:
+            log.info('Killing task {}: requested'.format(task_id))
+        self.downstream_executor.kill_many(tracked)
+
+    def kill_matching(self, predicate):
+        killed = self.downstream_executor.kill_matching(predicate)
+        for task_id in killed:
+            self.running_tasks.cancel(task_id)
         with self.tasks_lock:
-            for idx, entry in enumerate(self.running_tasks):
-                if task_id == entry.task_id:
-                    self.running_tasks.pop(idx)
-                    self.killed_tasks.append(task_id)
-                    log.info('Killing task {}: requested'.format(task_id))
-                    self.downstream_executor.kill(task_id)
-                    return
+            self.killed_tasks.update(killed)
+        return killed
 
     def stop(self):
         self.downstream_executor.stop()
         self.stopping = True
+        self.running_tasks.stop()
         self.timeout_thread.join()
 
     def get_event_queue(self):
@@ -60,7 +60,19 @@ class DynamoDBPersister(Persister):
                         resp[k] = {
                             'L': vals
                         }
+                elif type(v) is set:
+                    if len(v) > 0:
+                        resp[k] = self._event_to_item(v)
             return {'M': resp}
+        elif type(raw) is set:
+            # e.g. excluded_agent_ids, sorted to be stored the same way
+            # every time
+            return self._event_to_item(sorted(raw))
+        elif type(raw) is list:
+            # e.g. constraints, which are lists of lists
+            return {
+                'L': [self._event_to_item(i) for i in raw]
+            }
         elif type(raw) is str:
             return {
                 'S': raw
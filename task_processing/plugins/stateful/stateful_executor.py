@@ -2,8 +2,10 @@ import logging
 import threading
 import traceback
 
-from six.moves.queue import Queue
-
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import EventStream
+from task_processing.event_stream import EventStreamClosed
+from task_processing.event_stream import get_many
 from task_processing.interfaces.task_executor import TaskExecutor
 
 log = logging.getLogger(__name__)
@@ -15,8 +17,7 @@ class StatefulTaskExecutor(TaskExecutor):
 
     def __init__(self, downstream_executor, persister):
         self.downstream_executor = downstream_executor
-        self.writer_queue = Queue()
-        self.queue_for_processed_events = Queue()
+        self.queue_for_processed_events = EventStream()
         self.persister = persister
         worker_thread = threading.Thread(
             target=self.subscribe_to_updates_for_task
@@ -27,9 +28,18 @@ class StatefulTaskExecutor(TaskExecutor):
     def run(self, task_config):
         self.downstream_executor.run(task_config)
 
+    def run_many(self, task_configs):
+        return self.downstream_executor.run_many(task_configs)
+
     def kill(self, task_id):
         return self.downstream_executor.kill(task_id)
 
+    def kill_many(self, task_ids):
+        return self.downstream_executor.kill_many(task_ids)
+
+    def kill_matching(self, predicate):
+        return self.downstream_executor.kill_matching(predicate)
+
     def status(self, task_id):
         return sorted(
             self.persister.read(task_id),
@@ -43,11 +53,19 @@ class StatefulTaskExecutor(TaskExecutor):
         return self.queue_for_processed_events
 
     def subscribe_to_updates_for_task(self):
+        src_queue = self.downstream_executor.get_event_queue()
         while True:
-            result = self.downstream_executor.get_event_queue().get()
             try:
-                self.persister.write(event=result)
-            except:
-                log.error(traceback.format_exc())
-            self.queue_for_processed_events.put(result)
-            self.downstream_executor.get_event_queue().task_done()
+                results = get_many(src_queue, EVENT_BATCH_SIZE)
+            except EventStreamClosed:
+                break
+            for result in results:
+                try:
+                    self.persister.write(event=result)
+                except Exception:
+                    log.error(traceback.format_exc())
+            self.queue_for_processed_events.put_many(results)
+            for _ in results:
+                src_queue.task_done()
+
+        self.queue_for_processed_events.close()
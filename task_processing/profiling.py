@@ -0,0 +1,102 @@
+import collections
+import cProfile
+import logging
+import threading
+import time
+
+from task_processing.metrics import create_timer
+from task_processing.metrics import get_metric
+
+log = logging.getLogger(__name__)
+
+
+class CycleProfiler(object):
+    """Breaks down the time spent in every run of a recurring cycle
+
+    ``start_cycle()`` starts a lap timer and every ``lap(stage)`` charges
+    the time since the previous lap to ``stage``, so a stage that runs
+    several times per cycle (e.g. once per offer) adds up. ``finish_cycle()``
+    records the per-stage totals in ``<prefix>.<stage>`` histograms and
+    keeps them in a ring buffer of recent cycles.
+
+    ``profile_cycles(n, path)`` can be called from any thread to run the
+    next n cycles under cProfile and dump the stats to path.
+    """
+
+    def __init__(self, prefix, stages, history=100, dimensions={}):
+        self.prefix = prefix
+        self.stages = stages
+        self.cycles = collections.deque(maxlen=history)
+
+        self._stage_times = None
+        self._last_lap = None
+        self._cycle_started = None
+
+        self._lock = threading.Lock()
+        self._profile = None
+        self._profile_cycles = 0
+        self._profile_path = None
+
+        for stage in list(stages) + ['total']:
+            create_timer(self._timer(stage), dimensions)
+
+    def _timer(self, stage):
+        return '{}.{}'.format(self.prefix, stage)
+
+    def start_cycle(self):
+        with self._lock:
+            if self._profile_cycles and self._profile is None:
+                self._profile = cProfile.Profile()
+            if self._profile is not None:
+                self._profile.enable()
+
+        self._stage_times = {}
+        self._cycle_started = self._last_lap = time.time()
+
+    def lap(self, stage):
+        """Charge the time since the previous lap to stage"""
+        if self._stage_times is None:
+            return
+        now = time.time()
+        self._stage_times[stage] = \
+            self._stage_times.get(stage, 0.0) + now - self._last_lap
+        self._last_lap = now
+
+    def finish_cycle(self, **info):
+        """Record the cycle; info is kept with it in the ring buffer"""
+        if self._stage_times is None:
+            return
+        now = time.time()
+        stage_times, self._stage_times = self._stage_times, None
+        total = now - self._cycle_started
+
+        for stage, elapsed in stage_times.items():
+            if stage in self.stages:
+                get_metric(self._timer(stage)).record(elapsed)
+        get_metric(self._timer('total')).record(total)
+        self.cycles.append(dict(
+            info, started=self._cycle_started, total=total,
+            stages=stage_times,
+        ))
+
+        with self._lock:
+            if self._profile is None:
+                return
+            self._profile.disable()
+            self._profile_cycles -= 1
+            if self._profile_cycles > 0:
+                return
+            profile, self._profile = self._profile, None
+            path = self._profile_path
+        profile.dump_stats(path)
+        log.info('Wrote profile of {} cycles to {}'.format(
+            self.prefix, path))
+
+    def profile_cycles(self, n, path):
+        """Profile the next n cycles and write the stats to path
+
+        The dump can be read with ``pstats`` or a viewer such as snakeviz.
+        """
+        with self._lock:
+            self._profile_cycles = n
+            self._profile_path = path
@@ -4,8 +4,9 @@ import traceback
 from collections import namedtuple
 from threading import Thread
 
-from six.moves.queue import Empty
-
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import EventStreamClosed
+from task_processing.event_stream import get_many
 from task_processing.interfaces.runner import Runner
 
 EventHandler = namedtuple('EventHandler', ['predicate', 'cb'])
@@ -48,14 +49,17 @@ class Async(Runner):
                 return
 
             try:
-                event = event_queue.get(True, 10)
+                events = get_many(event_queue, EVENT_BATCH_SIZE)
+            except EventStreamClosed:
+                return
 
+            for event in events:
                 # TODO: have a default callback? raise exception when this
                 # event is ignored?
                 if event.kind == 'control' and \
                    event.message == 'stop':
                     self.stopping = True
-                    continue
+                    break
 
                 for cb in self.callbacks:
                     if cb.predicate(event):
@@ -64,8 +68,6 @@ class Async(Runner):
                         except:
                             log.error(traceback.format_exc())
                             os._exit(1)
-            except Empty:
-                pass
 
     def stop(self):
         self.executor.stop()
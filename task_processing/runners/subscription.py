@@ -1,33 +1,208 @@
+import collections
+import logging
+import threading
 from threading import Thread
 
 from six.moves.queue import Empty
 from six.moves.queue import Full
 
+from task_processing.event_stream import EVENT_BATCH_SIZE
+from task_processing.event_stream import EventStream
+from task_processing.event_stream import EventStreamClosed
+from task_processing.event_stream import get_many
 from task_processing.interfaces.runner import Runner
 
+log = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ['block', 'drop_oldest', 'drop_newest', 'coalesce']
+
+
+def _coalesce_key(event):
+    # Control events are never coalesced with each other
+    if event.kind == 'task':
+        return ('task', event.task_id)
+    return ('control', id(event))
+
+
+class CoalescingQueue(EventStream):
+    """A bounded queue that keeps only the latest event for every task
+
+    An event for a task that already has an event waiting in the queue
+    replaces the waiting one in place, so the queue holds at most one event
+    per task and only grows with the number of distinct tasks.
+    """
+
+    def _init(self, maxsize):
+        self.queue = collections.OrderedDict()
+        self.coalesced = 0
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        self.queue[_coalesce_key(item)] = item
+
+    def _get(self):
+        return self.queue.popitem(last=False)[1]
+
+    def put(self, item, block=True, timeout=None):
+        with self.mutex:
+            key = _coalesce_key(item)
+            if key in self.queue:
+                self.queue[key] = item
+                self.coalesced += 1
+                return
+        EventStream.put(self, item, block, timeout)
+
+
+class Subscriber(object):
+    """A single consumer of a :class:`Subscription`
+
+    Every subscriber owns a bounded buffer and an overflow policy that
+    decides what happens when the buffer is full:
+
+    - ``block``: wait for the consumer; this holds back every subscriber
+    - ``drop_oldest``: evict the oldest buffered event
+    - ``drop_newest``: discard the incoming event
+    - ``coalesce``: keep only the latest event of every task
+
+    Drops are never silent: ``dropped`` and ``dropped_terminal`` count the
+    events this subscriber lost and ``max_lag`` the deepest its buffer got.
+    """
+
+    def __init__(self, queue, overflow='drop_newest'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow must be one of {}, was {}'.format(
+                OVERFLOW_POLICIES, overflow))
+        if overflow == 'coalesce' and not isinstance(queue, CoalescingQueue):
+            raise ValueError('coalesce requires a CoalescingQueue')
+
+        self.queue = queue
+        self.overflow = overflow
+        self.delivered = 0
+        self.dropped = 0
+        self.dropped_terminal = 0
+        self.max_lag = 0
+
+    @property
+    def lag(self):
+        """Number of events waiting to be consumed"""
+        return self.queue.qsize()
+
+    @property
+    def coalesced(self):
+        return getattr(self.queue, 'coalesced', 0)
+
+    def get(self, block=True, timeout=None):
+        return self.queue.get(block, timeout)
+
+    def offer(self, event):
+        if self.overflow == 'block':
+            self.queue.put(event)
+        elif self.overflow == 'drop_oldest':
+            while True:
+                try:
+                    self.queue.put(event, False)
+                    break
+                except Full:
+                    try:
+                        self._record_drop(self.queue.get(False))
+                    except Empty:
+                        pass
+        else:
+            try:
+                self.queue.put(event, False)
+            except Full:
+                self._record_drop(event)
+                return
+
+        self.delivered += 1
+        self.max_lag = max(self.max_lag, self.lag)
+
+    def close(self):
+        """Wake up the consumer once the subscription has stopped"""
+        if isinstance(self.queue, EventStream):
+            self.queue.close()
+
+    def stats(self):
+        return dict(
+            overflow=self.overflow,
+            delivered=self.delivered,
+            dropped=self.dropped,
+            dropped_terminal=self.dropped_terminal,
+            coalesced=self.coalesced,
+            lag=self.lag,
+            max_lag=self.max_lag,
+        )
+
+    def _record_drop(self, event):
+        self.dropped += 1
+        if event.kind == 'task' and event.terminal:
+            self.dropped_terminal += 1
+            log.warning('Subscriber dropped terminal event for {}'.format(
+                event.task_id))
+
 
 class Subscription(Runner):
-    def __init__(self, executor, queue):
+    def __init__(self, executor, queue=None, overflow='drop_newest'):
         self.executor = executor
         self.TASK_CONFIG_INTERFACE = executor.TASK_CONFIG_INTERFACE
+        self.subscribers = []
+        self.subscribers_lock = threading.Lock()
+
+        # The queue passed at construction time is the default subscriber
         self.event_queue = queue
+        if queue is not None:
+            self.subscribe(queue=queue, overflow=overflow)
+
         self.stopping = False
         self.producer_t = Thread(target=self.event_producer)
         self.producer_t.daemon = True
         self.producer_t.start()
 
+    def subscribe(self, queue=None, maxsize=1000, overflow='drop_newest'):
+        """Add a subscriber that receives every event from now on
+
+        :param queue: queue to deliver events into; a new queue bounded by
+            ``maxsize`` is created if omitted
+        :param str overflow: one of ``OVERFLOW_POLICIES``
+        :returns: the :class:`Subscriber`, which can be read from directly
+        """
+        if queue is None:
+            if overflow == 'coalesce':
+                queue = CoalescingQueue(maxsize)
+            else:
+                queue = EventStream(maxsize)
+
+        subscriber = Subscriber(queue, overflow)
+        with self.subscribers_lock:
+            self.subscribers = self.subscribers + [subscriber]
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.subscribers_lock:
+            self.subscribers = [
+                s for s in self.subscribers if s is not subscriber
+            ]
+
     def event_producer(self):
         executor_queue = self.executor.get_event_queue()
         while True:
-            if self.stopping:
-                return
+            if self.stopping and executor_queue.empty():
+                break
             try:
-                event = executor_queue.get(block=True, timeout=1)
-                self.event_queue.put(event, False)
-            except Empty:
-                pass
-            except Full:
-                pass
+                events = get_many(executor_queue, EVENT_BATCH_SIZE)
+            except EventStreamClosed:
+                break
+
+            # subscribers is replaced rather than mutated, so iterating over
+            # a snapshot without the lock is safe
+            for subscriber in self.subscribers:
+                for event in events:
+                    subscriber.offer(event)
+
+        for subscriber in self.subscribers:
+            subscriber.close()
 
     def run(self, task_config):
         return self.executor.run(task_config)
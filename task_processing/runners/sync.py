@@ -3,6 +3,8 @@ import time
 
 from six.moves.queue import Queue
 
+from task_processing.event_stream import EventStreamClosed
+from task_processing.interfaces.event import control_event
 from task_processing.interfaces.runner import Runner
 
 log = logging.getLogger(__name__)
@@ -22,7 +24,11 @@ class Sync(Runner):
         event_queue = self.executor.get_event_queue()
 
         while True:
-            event = event_queue.get()
+            try:
+                event = event_queue.get()
+            except EventStreamClosed:
+                # The executor was stopped underneath us
+                return control_event(message='stop')
 
             if event.kind == 'control' and \
                event.message == 'stop':
@@ -0,0 +1,116 @@
+import collections
+import json
+import random
+import threading
+import time
+
+from task_processing.metrics import create_timer
+from task_processing.metrics import get_metric
+
+# Lifecycle phases in the order a task goes through them, as keys of the
+# task state history: enqueued, matched to an offer, handed to launchTasks,
+# then the Mesos status updates up to a terminal one.
+PHASES = [
+    'TASK_INITED',
+    'OFFER_MATCHED',
+    'TASK_STAGING',
+    'TASK_STARTING',
+    'TASK_RUNNING',
+]
+TERMINAL_PHASE = 'TERMINAL'
+
+PHASE_TIMERS = {
+    'OFFER_MATCHED': 'taskproc.trace.queued_time',
+    'TASK_STAGING': 'taskproc.trace.launch_time',
+    'TASK_STARTING': 'taskproc.trace.staging_time',
+    'TASK_RUNNING': 'taskproc.trace.starting_time',
+    TERMINAL_PHASE: 'taskproc.trace.running_time',
+}
+TOTAL_TIME_TIMER = 'taskproc.trace.total_time'
+
+
+def record_event_queue_time(timer, events):
+    """Record how long ago each event of a batch was created
+
+    Every decorator records this as it takes events from the executor
+    below it, so the difference between two layers is the time events
+    spent queued in between.
+    """
+    now = time.time()
+    metric = get_metric(timer)
+    for e in events:
+        # Control events don't always carry a timestamp
+        timestamp = getattr(e, 'timestamp', None)
+        if isinstance(timestamp, float):
+            metric.record(now - timestamp)
+
+
+class TaskTracer(object):
+    """Turns the phase timestamps of finished tasks into latency metrics
+
+    The time spent in every phase is recorded in a histogram, and a
+    sample of whole traces is kept to be exported in the Chrome
+    trace-event format (chrome://tracing or https://ui.perfetto.dev).
+    """
+
+    def __init__(self, sample_rate=0.0, max_traces=1000, dimensions={}):
+        """
+        :param float sample_rate: fraction of tasks whose trace is kept
+        :param int max_traces: most recent sampled traces kept
+        """
+        self.sample_rate = sample_rate
+        self.traces = collections.deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+        for timer in list(PHASE_TIMERS.values()) + [TOTAL_TIME_TIMER]:
+            create_timer(timer, dimensions)
+
+    def finish(self, task_id, task_state_history, terminal_state):
+        """Record the phases of a task that reached terminal_state"""
+        phases = [
+            (phase, task_state_history[phase])
+            for phase in PHASES if phase in task_state_history
+        ]
+        if terminal_state in task_state_history:
+            phases.append(
+                (TERMINAL_PHASE, task_state_history[terminal_state]))
+        if not phases:
+            return
+
+        for (_, start), (phase, end) in zip(phases, phases[1:]):
+            get_metric(PHASE_TIMERS[phase]).record(end - start)
+        get_metric(TOTAL_TIME_TIMER).record(phases[-1][1] - phases[0][1])
+
+        if self.sample_rate and random.random() < self.sample_rate:
+            with self._lock:
+                self.traces.append((task_id, terminal_state, phases))
+
+    def chrome_trace(self):
+        """Sampled traces as a Chrome trace-event JSON object
+
+        Every task gets its own row with a slice per phase.
+        """
+        with self._lock:
+            traces = list(self.traces)
+
+        trace_events = []
+        for tid, (task_id, terminal_state, phases) in enumerate(traces):
+            trace_events.append(dict(
+                name='thread_name', ph='M', pid=1, tid=tid,
+                args=dict(name=task_id),
+            ))
+            for (phase, start), (_, end) in zip(phases, phases[1:]):
+                trace_events.append(dict(
+                    name=phase, cat='task', ph='X', pid=1, tid=tid,
+                    ts=start * 1e6, dur=(end - start) * 1e6,
+                    args=dict(task_id=task_id),
+                ))
+            trace_events.append(dict(
+                name=terminal_state, cat='task', ph='i', s='t', pid=1,
+                tid=tid, ts=phases[-1][1] * 1e6,
+            ))
+        return dict(traceEvents=trace_events, displayTimeUnit='ms')
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
@@ -11,6 +11,9 @@ class DummyTaskExecutor(TaskExecutor):
     def kill(self, task_id):
         pass
 
+    def kill_matching(self, predicate):
+        return []
+
     def stop(self):
         pass
 
@@ -25,6 +28,9 @@ class DummyTaskExecutor2(TaskExecutor):
     def kill(self, task_id):
         pass
 
+    def kill_matching(self, predicate):
+        return []
+
     def stop(self):
         pass
 
@@ -0,0 +1,36 @@
+import time
+
+from benchmarks.simulator import SimulatedAgent
+from benchmarks.simulator import simulated_executor
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+
+
+def test_every_task_terminates_with_rescinded_offers():
+    executor, simulator = simulated_executor(
+        [SimulatedAgent('agent-{}'.format(i), cpus=4) for i in range(4)],
+        simulator_kwargs=dict(
+            offer_interval_s=0.005,
+            rescind_rate=0.3,
+            seed=0,
+        ),
+        initial_decline_delay=0,
+    )
+    task_configs = [
+        MesosTaskConfig(image='busybox', cmd='/bin/true', timeout=3600)
+        for _ in range(50)
+    ]
+
+    executor.run_many(task_configs)
+    terminal = set()
+    deadline = time.time() + 30
+    try:
+        while len(terminal) < len(task_configs) and time.time() < deadline:
+            terminal.update(
+                e.task_id for e in executor.get_events(timeout=1)
+                if e.kind == 'task' and e.terminal
+            )
+    finally:
+        executor.stop()
+
+    assert terminal == set(tc.task_id for tc in task_configs)
+    assert simulator.stats['rescinded'] > 0
@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+from six.moves.queue import Empty
+from six.moves.queue import Full
+from six.moves.queue import Queue
+
+from task_processing.event_stream import EventStream
+from task_processing.event_stream import EventStreamClosed
+from task_processing.event_stream import get_many
+
+
+def test_get_drains_before_raising_closed():
+    stream = EventStream()
+    stream.put('a')
+    stream.close()
+
+    assert stream.get() == 'a'
+    with pytest.raises(EventStreamClosed):
+        stream.get()
+
+
+def test_get_times_out_on_open_stream():
+    stream = EventStream()
+
+    with pytest.raises(Empty):
+        stream.get(timeout=0.01)
+    with pytest.raises(Empty):
+        stream.get(block=False)
+
+
+def test_close_wakes_up_blocked_consumer():
+    stream = EventStream()
+    result = []
+
+    def consume():
+        result.extend(stream)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    stream.put('a')
+    stream.close()
+    consumer.join(timeout=5)
+
+    assert not consumer.is_alive()
+    assert result == ['a']
+
+
+def test_put_on_full_closed_stream_does_not_block():
+    stream = EventStream(maxsize=1)
+    stream.put('a')
+    stream.close()
+
+    with pytest.raises(Full):
+        stream.put('b')
+
+
+def test_get_many_takes_up_to_max_n():
+    stream = EventStream()
+    stream.put_many(['a', 'b', 'c'])
+
+    assert stream.get_many(2) == ['a', 'b']
+    assert stream.get_many(2) == ['c']
+    assert stream.get_many(2, timeout=0.01) == []
+
+
+def test_get_many_raises_closed_once_drained():
+    stream = EventStream()
+    stream.put('a')
+    stream.close()
+
+    assert stream.get_many(10) == ['a']
+    with pytest.raises(EventStreamClosed):
+        stream.get_many(10)
+
+
+def test_put_many_waits_for_room():
+    stream = EventStream(maxsize=1)
+    result = []
+
+    def consume():
+        result.extend(stream)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    stream.put_many(['a', 'b', 'c'])
+    stream.close()
+    consumer.join(timeout=5)
+
+    assert result == ['a', 'b', 'c']
+
+
+def test_module_get_many_on_plain_queue():
+    queue = Queue()
+    for item in ['a', 'b', 'c']:
+        queue.put(item)
+
+    assert get_many(queue, 2) == ['a', 'b']
+    assert get_many(queue, 2) == ['c']
+    assert get_many(queue, 2, timeout=0.01) == []
@@ -1,9 +1,15 @@
+import json
+
 import pytest
 from pyrsistent import InvariantException
 from pyrsistent import PRecord
 from pyrsistent import PTypeError
+from pyrsistent import thaw
 
 from task_processing.interfaces.event import Event
+from task_processing.interfaces.event import json_deserializer
+from task_processing.interfaces.event import json_serializer
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
 
 
 @pytest.fixture
@@ -41,3 +47,24 @@ def test_event_type_checks(event):
 
     with pytest.raises(PTypeError) as e:
         event.set(task_id=123)
+
+
+def test_event_json_round_trip():
+    task_config = MesosTaskConfig(
+        image='busybox', cmd='/bin/true',
+        excluded_agent_ids={'agent-2', 'agent-1'},
+    )
+    e = Event(kind='task', task_id=task_config.task_id,
+              task_config=task_config)
+
+    serialized = json.dumps(thaw(e), default=json_serializer)
+    parsed = json.loads(serialized, object_hook=json_deserializer)
+
+    assert parsed['task_config']['excluded_agent_ids'] == [
+        'agent-1', 'agent-2']
+    assert MesosTaskConfig.create(parsed['task_config']) == task_config
+
+
+def test_json_serializer_unknown_type():
+    with pytest.raises(TypeError):
+        json.dumps(object(), default=json_serializer)
@@ -8,3 +8,21 @@ def test_abstract_interface():
         class TestExecutor(TaskExecutor):
             pass
         TestExecutor()
+
+
+def test_kill_matching_is_abstract():
+    class TestExecutor(TaskExecutor):
+        def run(self, task_config):
+            pass
+
+        def kill(self, task_id):
+            pass
+
+        def stop(self):
+            pass
+
+        def get_event_queue(self):
+            pass
+
+    with pytest.raises(TypeError):
+        TestExecutor()
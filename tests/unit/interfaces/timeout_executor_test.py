@@ -8,3 +8,20 @@ def test_executor_creation():
     assert t
     t.kill('fake_task_id')
     t.stop()
+
+
+def test_run_passes_task_downstream():
+    downstream = MagicMock()
+    t = TimeoutExecutor(downstream_executor=downstream)
+    task_config = MagicMock(task_id='a', timeout=60.0)
+    t.run(MagicMock(task_id='b', timeout=120.0))
+
+    # A task whose deadline sorts before existing ones still runs
+    t.run(task_config)
+
+    assert downstream.run.call_count == 2
+    assert 'a' in t.running_tasks
+    t.kill('a')
+    assert 'a' not in t.running_tasks
+    assert downstream.kill_many.call_args[0][0] == ['a']
+    t.stop()
@@ -0,0 +1,82 @@
+import mock
+import pytest
+from six.moves.urllib.request import urlopen
+
+from task_processing import metrics
+
+
+@pytest.fixture
+def local_metrics():
+    with mock.patch.object(metrics, 'METRICS_ENABLED', False), \
+            mock.patch.object(metrics, '_registered_metrics', {}):
+        yield
+
+
+def test_get_metric_returns_registered_handle(local_metrics):
+    metrics.create_counter('test.counter', {'role': 'fake'})
+
+    counter = metrics.get_metric('test.counter')
+    counter.count(2)
+    metrics.get_metric('test.counter').count(1)
+
+    assert counter.value == 3
+    assert counter.dimensions == {'role': 'fake'}
+
+
+def test_get_metric_unregistered_is_noop(local_metrics):
+    metrics.get_metric('test.unregistered').count(1)
+
+
+def test_histogram_quantiles_are_close():
+    histogram = metrics.Histogram('test.histogram', {})
+    for i in range(1, 1001):
+        histogram.record(i / 1000.0)
+
+    assert histogram.total == 1000
+    assert histogram.quantile(0.5) == pytest.approx(0.5, rel=0.02)
+    assert histogram.quantile(0.99) == pytest.approx(0.99, rel=0.02)
+    assert histogram.quantile(1.0) == 1.0
+    assert histogram.quantile(0.0) == 0.001
+
+
+def test_histogram_empty():
+    assert metrics.Histogram('test.histogram', {}).quantile(0.5) is None
+
+
+def test_render_prometheus(local_metrics):
+    metrics.create_counter('test.counter', {'role': 'fake'})
+    metrics.create_gauge('test.gauge')
+    metrics.create_timer('test.timer')
+    metrics.get_metric('test.counter').count(3)
+    metrics.get_metric('test.gauge').set(7)
+    metrics.get_metric('test.timer').record(0.25)
+
+    text = metrics.render_prometheus()
+
+    assert 'test_counter{role="fake"} 3\n' in text
+    assert 'test_gauge 7\n' in text
+    assert 'test_timer{quantile="0.5"} 0.25' in text
+    assert 'test_timer_count 1\n' in text
+
+
+def test_http_exporter(local_metrics):
+    metrics.create_counter('test.counter')
+    metrics.get_metric('test.counter').count(1)
+    server = metrics.start_http_exporter(port=0)
+
+    try:
+        response = urlopen('http://127.0.0.1:{}/metrics'.format(
+            server.server_address[1]))
+        assert b'test_counter 1' in response.read()
+    finally:
+        server.shutdown()
+
+
+def test_write_metrics_file(local_metrics, tmpdir):
+    metrics.create_counter('test.counter')
+    path = str(tmpdir.join('metrics.prom'))
+
+    metrics.write_metrics_file(path)
+
+    with open(path) as f:
+        assert 'test_counter 0' in f.read()
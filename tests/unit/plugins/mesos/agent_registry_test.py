@@ -0,0 +1,103 @@
+import pytest
+from addict import Dict
+
+from task_processing.plugins.mesos.agent_registry import AgentRegistry
+from task_processing.plugins.mesos.agent_registry import parse_resources
+
+
+def _offer(agent_id='a1', cpus=4.0, mem=1024.0, role='role', **attributes):
+    return Dict(
+        agent_id=Dict(value=agent_id),
+        hostname='{}.host'.format(agent_id),
+        resources=[
+            Dict(name='cpus', role=role, scalar=Dict(value=cpus)),
+            Dict(name='mem', role=role, scalar=Dict(value=mem)),
+            Dict(name='cpus', role='other', scalar=Dict(value=100.0)),
+            Dict(name='ports', role=role,
+                 ranges=Dict(range=[Dict(begin=31000, end=31010)])),
+        ],
+        attributes=[
+            Dict(name=name, type='TEXT', text=Dict(value=value))
+            for name, value in attributes.items()
+        ],
+    )
+
+
+@pytest.fixture
+def registry():
+    return AgentRegistry('role')
+
+
+def test_parse_resources():
+    offer = _offer()
+
+    resources = parse_resources(offer, 'role')
+
+    assert resources['cpus'] == 4.0
+    assert resources['mem'] == 1024.0
+    assert resources['disk'] == 0.0
+    assert resources['ports'] is offer.resources[3]
+
+
+def test_update_from_offer(registry):
+    agent, resources = registry.update_from_offer(
+        _offer(pool='default'), now=10.0)
+
+    assert 'a1' in registry
+    assert agent.hostname == 'a1.host'
+    assert agent.attributes['pool'] == 'default'
+    assert agent.last_offer_at == 10.0
+    assert resources['cpus'] == 4.0
+    assert registry.known_values('pool') == {'default'}
+
+
+def test_attributes_parsed_from_first_offer(registry):
+    registry.update_from_offer(_offer(pool='default'))
+
+    agent, _ = registry.update_from_offer(_offer(pool='other'))
+
+    assert agent.attributes['pool'] == 'default'
+
+
+def test_capacity_is_largest_offer(registry):
+    registry.update_from_offer(_offer(cpus=4.0, mem=512.0))
+    agent, _ = registry.update_from_offer(_offer(cpus=2.0, mem=1024.0))
+
+    assert agent.capacity['cpus'] == 4.0
+    assert agent.capacity['mem'] == 1024.0
+
+
+def test_tasks_per_agent(registry):
+    agent, _ = registry.update_from_offer(_offer())
+
+    registry.task_placed('t1', 'group', 'a1')
+    registry.task_placed('t2', 'group', 'a1')
+    registry.task_removed('t1')
+    registry.task_removed('unknown')
+
+    assert agent.task_ids == {'t2'}
+    assert registry.value_counts('group', 'hostname') == {'a1.host': 1}
+
+
+def test_task_placed_again_moves_it(registry):
+    a1, _ = registry.update_from_offer(_offer('a1'))
+    a2, _ = registry.update_from_offer(_offer('a2'))
+
+    registry.task_placed('t1', 'group', 'a1')
+    registry.task_placed('t1', 'group', 'a2')
+
+    assert a1.task_ids == set()
+    assert a2.task_ids == {'t1'}
+    assert registry.value_counts('group', 'agent_id') == {'a2': 1}
+
+
+def test_agent_lost_until_next_offer(registry):
+    registry.update_from_offer(_offer())
+
+    registry.agent_lost('a1')
+
+    assert registry.get('a1').lost
+
+    registry.update_from_offer(_offer())
+
+    assert not registry.get('a1').lost
@@ -0,0 +1,57 @@
+import pytest
+
+from task_processing.plugins.mesos.cluster_load import ClusterLoad
+from task_processing.plugins.mesos.cluster_load import estimated_wait
+from task_processing.plugins.mesos.cluster_load import RateWindow
+
+
+def _load(**kwargs):
+    fields = dict(
+        queue_depth=0,
+        offer_rate=0.0,
+        match_rate=0.0,
+        queued_time=0.0,
+        waiting_s=0.0,
+    )
+    fields.update(kwargs)
+    return ClusterLoad(**fields)
+
+
+def test_rate_window():
+    window = RateWindow(window_s=10.0, buckets=10)
+    window.record(100.0, count=5)
+    window.record(100.5)
+    window.record(105.0, count=4)
+
+    assert window.rate(105.0) == 1.0
+    # The first bucket fell out of the window
+    assert window.rate(110.5) == 0.4
+    assert window.rate(200.0) == 0.0
+
+
+def test_estimated_wait_drains_at_match_rate():
+    load = _load(queue_depth=9, offer_rate=100.0, match_rate=2.0)
+
+    assert estimated_wait(load) == 5.0
+    assert estimated_wait(load, queued=10) == 10.0
+
+
+def test_estimated_wait_falls_back_to_offer_rate():
+    assert estimated_wait(_load(queue_depth=3, offer_rate=2.0)) == 2.0
+
+
+def test_estimated_wait_at_least_current_waits():
+    load = _load(queue_depth=1, match_rate=10.0, queued_time=3.0)
+
+    assert estimated_wait(load) == 3.0
+    assert estimated_wait(load._replace(waiting_s=7.0)) == 7.0
+    # Past waits don't matter with nothing queued
+    assert estimated_wait(load._replace(queue_depth=0)) == 0.1
+
+
+@pytest.mark.parametrize('load,wait', [
+    (_load(), 0.0),
+    (_load(queue_depth=1), float('inf')),
+])
+def test_estimated_wait_without_offers(load, wait):
+    assert estimated_wait(load) == wait
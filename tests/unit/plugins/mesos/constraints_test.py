@@ -0,0 +1,133 @@
+import pytest
+from addict import Dict
+from pyrsistent import freeze
+
+from task_processing.plugins.mesos import constraints
+from task_processing.plugins.mesos.agent_registry import AgentRegistry
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+
+
+def _offer(agent_id, **attributes):
+    return Dict(
+        agent_id=Dict(value=agent_id),
+        hostname='{}.host'.format(agent_id),
+        attributes=[
+            Dict(name=name, type='TEXT', text=Dict(value=value))
+            for name, value in attributes.items()
+        ] + [Dict(name='cores', type='SCALAR', scalar=Dict(value=8.0))],
+    )
+
+
+@pytest.fixture
+def registry():
+    return AgentRegistry('role')
+
+
+def _task(*task_constraints):
+    return MesosTaskConfig(
+        name='group', cmd='/bin/true', image='busybox',
+        constraints=list(task_constraints),
+    )
+
+
+def _allows(registry, task, offer):
+    return registry.allows(task, registry.agent_for_offer(offer))
+
+
+def test_parse_attributes():
+    assert constraints.parse_attributes(_offer('a1', pool='default')) == {
+        'agent_id': 'a1',
+        'hostname': 'a1.host',
+        'pool': 'default',
+        'cores': '8.0',
+    }
+
+
+@pytest.mark.parametrize('constraint,allowed', [
+    (['pool', 'EQUALS', 'default'], True),
+    (['pool', 'EQUALS', 'other'], False),
+    (['missing', 'EQUALS', 'default'], False),
+    (['pool', 'IN', ['other', 'default']], True),
+    (['pool', 'IN', ['other']], False),
+    (['hostname', 'LIKE', 'a[0-9]+\\.host'], True),
+    (['hostname', 'LIKE', 'a1'], False),
+    (['cores', 'EQUALS', '8.0'], True),
+])
+def test_attribute_constraints(registry, constraint, allowed):
+    task = _task(constraint)
+
+    assert _allows(
+        registry, task, _offer('a1', pool='default')) == allowed
+
+
+def test_unique(registry):
+    task = _task(['hostname', 'UNIQUE'])
+    registry.task_placed('other-task', 'group', 'a1')
+
+    assert not _allows(registry, task, _offer('a1'))
+    assert _allows(registry, task, _offer('a2'))
+
+    registry.task_removed('other-task')
+
+    assert _allows(registry, task, _offer('a1'))
+
+
+def test_unique_ignores_other_groups(registry):
+    registry.task_placed('other-task', 'other-group', 'a1')
+
+    assert _allows(registry, _task(['hostname', 'UNIQUE']),
+                   _offer('a1'))
+
+
+def test_max_per(registry):
+    task = _task(['agent_id', 'MAX_PER', 2])
+    registry.agent_for_offer(_offer('a1'))
+    registry.task_placed('task-1', 'group', 'a1')
+
+    assert _allows(registry, task, _offer('a1'))
+
+    registry.task_placed('task-2', 'group', 'a1')
+
+    assert not _allows(registry, task, _offer('a1'))
+
+
+def test_group_by(registry):
+    task = _task(['zone', 'GROUP_BY'])
+    registry.agent_for_offer(_offer('a1', zone='z1'))
+    registry.agent_for_offer(_offer('a2', zone='z2'))
+    registry.task_placed('task-1', 'group', 'a1')
+
+    assert not _allows(registry, task, _offer('a1', zone='z1'))
+    assert _allows(registry, task, _offer('a2', zone='z2'))
+
+    registry.task_placed('task-2', 'group', 'a2')
+
+    assert _allows(registry, task, _offer('a1', zone='z1'))
+
+
+def test_group_by_expects_unseen_values(registry):
+    task = _task(['zone', 'GROUP_BY', 2])
+    registry.task_placed('task-1', 'group', 'a1')
+
+    assert not _allows(registry, task, _offer('a1', zone='z1'))
+
+
+def test_compile_constraints_once():
+    task_constraints = freeze([['pool', 'EQUALS', 'default']])
+
+    assert constraints.compile_constraints(task_constraints) is \
+        constraints.compile_constraints(task_constraints)
+
+
+@pytest.mark.parametrize('constraint', [
+    ['pool'],
+    ['pool', 'NEAR', 'x'],
+    ['pool', 'EQUALS'],
+    ['pool', 'LIKE', '('],
+    ['agent_id', 'MAX_PER', 'many'],
+])
+def test_invalid_constraints(constraint):
+    valid, message = constraints.valid_constraints([constraint])
+
+    assert not valid
+    assert message
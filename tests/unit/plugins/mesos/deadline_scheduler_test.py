@@ -0,0 +1,73 @@
+import threading
+import time
+
+import mock
+import pytest
+
+from task_processing.plugins.mesos.deadline_scheduler import (
+    DeadlineScheduler
+)
+
+
+@pytest.fixture
+def mock_Thread():
+    with mock.patch.object(threading, 'Thread') as mock_Thread:
+        yield mock_Thread
+
+
+@pytest.fixture
+def scheduler(mock_Thread):
+    return DeadlineScheduler(callback=mock.Mock())
+
+
+@pytest.fixture
+def mock_time():
+    with mock.patch.object(time, 'time') as mock_time:
+        mock_time.return_value = 100.0
+        yield mock_time
+
+
+def test_pop_due_in_deadline_order(scheduler, mock_time):
+    scheduler.schedule_many([('b', 99.0), ('c', 150.0), ('a', 98.0)])
+
+    due, wait = scheduler._pop_due()
+
+    assert due == ['a', 'b']
+    assert wait == 50.0
+    assert 'c' in scheduler
+    assert len(scheduler) == 1
+
+
+def test_cancel_skips_stale_entries(scheduler, mock_time):
+    scheduler.schedule('a', 90.0)
+    scheduler.schedule('b', 95.0)
+
+    assert scheduler.cancel('a')
+    assert not scheduler.cancel('a')
+    assert scheduler._pop_due() == (['b'], None)
+
+
+def test_reschedule_replaces_deadline(scheduler, mock_time):
+    scheduler.schedule('a', 90.0)
+    scheduler.schedule('a', 120.0)
+
+    assert scheduler._pop_due() == ([], 20.0)
+
+
+def test_compacts_heap_after_many_cancels(scheduler, mock_time):
+    scheduler.schedule_many([(i, 200.0) for i in range(3000)])
+    for i in range(2999):
+        scheduler.cancel(i)
+
+    assert len(scheduler._heap) < 3000
+
+
+def test_fires_callback_at_deadline():
+    fired = threading.Event()
+    scheduler = DeadlineScheduler(callback=lambda key: fired.set())
+    scheduler.schedule('a', time.time() + 60)
+    scheduler.schedule('b', time.time() + 0.05)
+
+    assert fired.wait(timeout=5)
+    assert 'a' in scheduler
+    scheduler.stop()
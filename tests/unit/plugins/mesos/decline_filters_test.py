@@ -0,0 +1,67 @@
+import pytest
+
+from task_processing.plugins.mesos.decline_filters import DeclineFilters
+
+
+@pytest.fixture
+def decline_filters():
+    return DeclineFilters(
+        default_s=10,
+        bad_pool_s=300,
+        min_insufficient_s=1,
+        max_insufficient_s=60,
+        queue_depth_scale=100,
+    )
+
+
+def test_no_tasks_and_bad_pool(decline_filters):
+    assert decline_filters.no_tasks() == 10
+    assert decline_filters.bad_pool() == 300
+
+
+def test_no_tasks_backs_off_until_tasks_queued(decline_filters):
+    refusals = []
+    for _ in range(7):
+        refusals.append(decline_filters.no_tasks())
+        decline_filters.queue_empty()
+
+    assert refusals == [10, 20, 40, 80, 160, 300, 300]
+
+    decline_filters.tasks_queued()
+
+    assert decline_filters.no_tasks() == 10
+
+
+def test_blacklisted_until_expiry(decline_filters):
+    assert decline_filters.blacklisted(expires_at=150.0, now=100.0) == 50.0
+    assert decline_filters.blacklisted(expires_at=100.5, now=100.0) == 1
+    assert decline_filters.blacklisted(expires_at=None, now=100.0) == 10
+
+
+def test_insufficient_shorter_for_deeper_queues(decline_filters):
+    assert decline_filters.insufficient('agent-1', queue_depth=0) == 60
+    assert decline_filters.insufficient('agent-2', queue_depth=100) == 30
+    assert decline_filters.insufficient('agent-3', queue_depth=2900) == 2
+
+
+def test_insufficient_backs_off_per_agent(decline_filters):
+    refusals = [
+        decline_filters.insufficient('agent-1', queue_depth=1900)
+        for _ in range(5)
+    ]
+
+    assert refusals == [3, 6, 12, 24, 48]
+    assert decline_filters.insufficient('agent-2', queue_depth=1900) == 3
+
+
+def test_launch_resets_backoff(decline_filters):
+    decline_filters.insufficient('agent-1', queue_depth=1900)
+    decline_filters.insufficient('agent-1', queue_depth=1900)
+
+    decline_filters.launched('agent-1')
+
+    assert decline_filters.insufficient('agent-1', queue_depth=1900) == 3
+
+
+def test_filters(decline_filters):
+    assert decline_filters.filters(5).refuse_seconds == 5
@@ -1,6 +1,7 @@
 import socket
 import threading
 import time
+from threading import Thread
 
 import mock
 import pytest
@@ -91,6 +92,7 @@ def fake_driver():
         'suppressOffers',
         'reviveOffers',
         'launchTasks',
+        'acceptOffers',
         'killTask',
         'acknowledgeStatusUpdate'
     ])
@@ -214,6 +216,77 @@ def test_kill_task(ef, fake_driver):
     )
 
 
+def _running_task_metadata(task):
+    return ef_mdl.TaskMetadata(
+        agent_id='fake_agent_id',
+        task_config=task,
+        task_state='TASK_RUNNING',
+        task_state_history=m(TASK_RUNNING=0.0),
+    )
+
+
+def test_kill_queued_task(
+    ef,
+    fake_task,
+    fake_driver,
+    mock_get_metric
+):
+    ef.driver = fake_driver
+    ef.enqueue_task(fake_task)
+
+    ef.kill_task(fake_task.task_id)
+
+    assert ef.task_queue.empty()
+    assert fake_task.task_id not in ef.task_metadata
+    assert fake_driver.killTask.call_count == 0
+    event = ef.event_queue.get(block=False)
+    assert event.task_id == fake_task.task_id
+    assert event.terminal
+    assert event.platform_type == 'killed'
+    mock_get_metric.assert_any_call(ef_mdl.TASK_KILLED_COUNT)
+
+
+def test_kill_task_taken_out_of_queue_by_offer(ef, fake_task, fake_driver):
+    ef.driver = fake_driver
+    ef.enqueue_task(fake_task)
+    # An offer is being processed and holds the task
+    ef.task_queue.get()
+
+    ef.kill_task(fake_task.task_id)
+
+    assert fake_task.task_id in ef._killed_in_flight
+    assert fake_driver.killTask.call_count == 0
+
+
+def test_kill_tasks_rate_limits_mesos_kills(ef, fake_task, fake_driver):
+    ef.driver = fake_driver
+    ef._kill_limiter = ef_mdl.RateLimiter(rate=1, burst=1)
+    tasks = [fake_task.set(name='task{}'.format(i)) for i in range(3)]
+    for task in tasks:
+        ef.task_metadata = ef.task_metadata.set(
+            task.task_id, _running_task_metadata(task))
+
+    ef.kill_tasks([task.task_id for task in tasks])
+
+    assert fake_driver.killTask.call_count == 1
+    assert len(ef._pending_kills) == 2
+
+
+def test_kill_matching(ef, fake_task, fake_driver):
+    ef.driver = fake_driver
+    other_task = fake_task.set(name='other_name')
+    for task in [fake_task, other_task]:
+        ef.task_metadata = ef.task_metadata.set(
+            task.task_id, _running_task_metadata(task))
+
+    killed = ef.kill_matching(lambda tc: tc.name == 'other_name')
+
+    assert killed == [other_task.task_id]
+    assert fake_driver.killTask.call_args == mock.call(
+        Dict(value=other_task.task_id)
+    )
+
+
 def test_blacklist_slave(
     ef,
     mock_get_metric,
@@ -226,6 +299,7 @@ def test_blacklist_slave(
     ef.blacklist_slave(agent_id, timeout=2.0)
 
     assert agent_id in ef.blacklisted_slaves
+    assert ef.blacklist_expirations[agent_id] == 4.0
     assert mock_get_metric.call_count == 1
     assert mock_get_metric.call_args == mock.call(
         ef_mdl.BLACKLISTED_AGENTS_COUNT
@@ -245,9 +319,11 @@ def test_unblacklist_slave(
     agent_id = 'fake_agent_id'
 
     ef.blacklisted_slaves = ef.blacklisted_slaves.append(agent_id)
+    ef.blacklist_expirations[agent_id] = 10.0
     ef.unblacklist_slave(agent_id, timeout=0.0)
 
     assert agent_id not in ef.blacklisted_slaves
+    assert agent_id not in ef.blacklist_expirations
 
 
 def test_enqueue_task(
@@ -256,21 +332,64 @@ def test_enqueue_task(
     fake_driver,
     mock_get_metric
 ):
-    ef.are_offers_suppressed = True
+    ef.revive_controller.suppressed = True
     ef.driver = fake_driver
 
     ef.enqueue_task(fake_task)
 
     assert ef.task_metadata[fake_task.task_id].task_state == 'TASK_INITED'
     assert not ef.task_queue.empty()
-    assert ef.driver.reviveOffers.call_count == 1
-    assert not ef.are_offers_suppressed
+    # Offers are revived from the revive controller's thread
+    assert ef.driver.reviveOffers.call_count == 0
+    assert 'revive' in ef.revive_controller._scheduler
     assert mock_get_metric.call_count == 1
     assert mock_get_metric.call_args == mock.call(ef_mdl.TASK_ENQUEUED_COUNT)
     assert mock_get_metric.return_value.count.call_count == 1
     assert mock_get_metric.return_value.count.call_args == mock.call(1)
 
 
+def test_enqueue_tasks(
+    ef,
+    fake_task,
+    fake_driver,
+    mock_get_metric
+):
+    ef.revive_controller.suppressed = True
+    ef.driver = fake_driver
+    tasks = [fake_task, fake_task.set(name='other_name')]
+
+    ef.enqueue_tasks(tasks)
+    ef.revive_controller._scheduled_revive('revive')
+
+    for task in tasks:
+        assert ef.task_metadata[task.task_id].task_state == 'TASK_INITED'
+    assert ef.task_queue.qsize() == 2
+    assert ef.driver.reviveOffers.call_count == 1
+    assert not ef.are_offers_suppressed
+    mock_get_metric.assert_any_call(ef_mdl.OFFERS_REVIVED_COUNT)
+    assert mock_get_metric.return_value.count.call_count == 2
+    mock_get_metric.return_value.count.assert_any_call(2)
+
+
+def test_enqueue_tasks_waits_for_room_in_queue(
+    ef,
+    fake_task,
+    fake_driver,
+    mock_get_metric
+):
+    ef.driver = fake_driver
+    ef.task_queue = mock.Mock(wraps=ef_mdl.Queue(1))
+    tasks = [fake_task, fake_task.set(name='other_name')]
+    ef._wait_for_room_in_queue = mock.Mock(
+        side_effect=lambda: ef.task_queue.get())
+
+    ef.enqueue_tasks(tasks)
+
+    assert ef.task_queue.put_nowait.call_count == 3
+    assert ef._wait_for_room_in_queue.call_count == 1
+    assert ef.task_queue.get_nowait() == tasks[1]
+
+
 def test_get_available_ports(ef, fake_offer):
     ports_resource = [r for r in fake_offer.resources if r.name is 'ports'][0]
 
@@ -307,6 +426,9 @@ def test_get_tasks_to_launch_sufficient_offer(
     )
     assert mock_get_metric.return_value.record.call_count == 1
     assert mock_get_metric.return_value.record.call_args == mock.call(1.0)
+    task_state_history = ef.task_metadata[fake_task.task_id].\
+        task_state_history
+    assert task_state_history['OFFER_MATCHED'] == 2.0
 
 
 @pytest.mark.parametrize(
@@ -336,7 +458,7 @@ def test_get_tasks_to_launch_insufficient_offer(
         gpus=task_gpus,
     )
 
-    ef.task_queue.put(task)
+    _queue_tasks(ef, [task])
     tasks_to_launch = ef.get_tasks_to_launch(fake_offer)
 
     assert len(tasks_to_launch) == 0
@@ -476,7 +598,7 @@ def test_initialize_metrics(ef):
 
     ef._initialize_metrics()
 
-    assert ef_mdl.create_counter.call_count == 13
+    assert ef_mdl.create_counter.call_count == 16
     ef_mdl_counters = [
         ef_mdl.TASK_LAUNCHED_COUNT,
         ef_mdl.TASK_FINISHED_COUNT,
@@ -491,20 +613,29 @@ def test_initialize_metrics(ef):
         ef_mdl.TASK_INSUFFICIENT_OFFER_COUNT,
         ef_mdl.TASK_STUCK_COUNT,
         ef_mdl.BLACKLISTED_AGENTS_COUNT,
+        ef_mdl.OFFERS_REVIVED_COUNT,
+        ef_mdl.OFFERS_SUPPRESSED_COUNT,
+        ef_mdl.OFFER_RESCINDED_COUNT,
     ]
     for cnt in ef_mdl_counters:
         ef_mdl.create_counter.assert_any_call(cnt, default_dimensions)
-    assert ef_mdl.create_timer.call_count == 2
+    assert ef_mdl.create_timer.call_count == 4
     ef_mdl_timers = [
         ef_mdl.TASK_QUEUED_TIME_TIMER,
-        ef_mdl.OFFER_DELAY_TIMER
+        ef_mdl.OFFER_DELAY_TIMER,
+        ef_mdl.EVENT_LATENCY_TIMER,
+        ef_mdl.OFFER_LIFETIME_TIMER,
     ]
     for tmr in ef_mdl_timers:
         ef_mdl.create_timer.assert_any_call(tmr, default_dimensions)
 
 
-def test_slave_lost(ef, fake_driver):
-    ef.slaveLost(fake_driver, 'fake_slave_id')
+def test_slave_lost(ef, fake_driver, fake_offer):
+    ef.agent_registry.update_from_offer(fake_offer)
+
+    ef.slaveLost(fake_driver, Dict(value='fake_agent_id'))
+
+    assert ef.agent_registry.get('fake_agent_id').lost
 
 
 def test_registered(ef, fake_driver):
@@ -535,20 +666,20 @@ def test_resource_offers_launch(
     ef.driver = fake_driver
     ef._last_offer_time = 1.0
     mock_time.return_value = 2.0
-    ef.suppress_after = 0.0
     ef.offer_matches_pool = mock.Mock(return_value=True)
     task_id = fake_task.task_id
     docker_task = Dict(task_id=Dict(value=task_id))
     task_metadata = ef_mdl.TaskMetadata(
         task_config=fake_task,
-        task_state='fake_state',
-        task_state_history=m(fake_state=time.time())
+        task_state='TASK_INITED',
+        task_state_history=m(TASK_INITED=time.time())
     )
-    ef.get_tasks_to_launch = mock.Mock(return_value=[docker_task])
+    ef.get_tasks_to_launch_for_offers = mock.Mock(
+        return_value=[([fake_offer], [docker_task])])
 
     ef.task_queue.put(fake_task)
     ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
-    ef.resourceOffers(ef.driver, [fake_offer])
+    ef._match_offers(ef.driver, [fake_offer])
 
     assert fake_driver.suppressOffers.call_count == 0
     assert not ef.are_offers_suppressed
@@ -561,6 +692,9 @@ def test_resource_offers_launch(
     assert mock_get_metric.return_value.record.call_args == mock.call(1.0)
     assert mock_get_metric.return_value.count.call_count == 1
     assert mock_get_metric.return_value.count.call_args == mock.call(1)
+    cycle = ef.offer_profiler.cycles[-1]
+    assert cycle['offers'] == 1
+    assert {'driver', 'pool', 'blacklist'} <= set(cycle['stages'])
 
 
 def test_resource_offers_launch_tasks_failed(
@@ -575,19 +709,19 @@ def test_resource_offers_launch_tasks_failed(
     ef.driver.launchTasks = mock.Mock(side_effect=socket.timeout)
     ef._last_offer_time = None
     mock_time.return_value = 2.0
-    ef.suppress_after = 0.0
     ef.offer_matches_pool = mock.Mock(return_value=True)
     task_id = fake_task.task_id
     docker_task = Dict(task_id=Dict(value=task_id))
     task_metadata = ef_mdl.TaskMetadata(
         task_config=fake_task,
-        task_state='fake_state',
-        task_state_history=m(fake_state=time.time())
+        task_state='TASK_INITED',
+        task_state_history=m(TASK_INITED=time.time())
     )
-    ef.get_tasks_to_launch = mock.Mock(return_value=[docker_task])
+    ef.get_tasks_to_launch_for_offers = mock.Mock(
+        return_value=[([fake_offer], [docker_task])])
     ef.task_queue.put(fake_task)
     ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
-    ef.resourceOffers(ef.driver, [fake_offer])
+    ef._match_offers(ef.driver, [fake_offer])
 
     assert fake_driver.suppressOffers.call_count == 0
     assert not ef.are_offers_suppressed
@@ -597,6 +731,103 @@ def test_resource_offers_launch_tasks_failed(
     assert ef.task_metadata[task_id].task_state == 'UNKNOWN'
 
 
+@pytest.mark.parametrize('state,remaining_state', [
+    ('TASK_RUNNING', 'TASK_RUNNING'),
+    ('TASK_FINISHED', None),
+])
+def test_resource_offers_status_before_launch_returns(
+    ef,
+    fake_task,
+    fake_offer,
+    fake_driver,
+    mock_get_metric,
+    state,
+    remaining_state,
+):
+    ef.driver = fake_driver
+    ef.offer_matches_pool = mock.Mock(return_value=True)
+    task_id = fake_task.task_id
+    ef.get_tasks_to_launch_for_offers = mock.Mock(
+        return_value=[([fake_offer], [Dict(task_id=Dict(value=task_id))])])
+    _queue_tasks(ef, [fake_task])
+
+    def launch_tasks(*args, **kwargs):
+        # The driver thread delivers the update before launchTasks returns
+        ef.statusUpdate(
+            fake_driver, Dict(task_id=Dict(value=task_id), state=state))
+    fake_driver.launchTasks.side_effect = launch_tasks
+
+    ef._match_offers(ef.driver, [fake_offer])
+
+    md = ef.task_metadata.get(task_id)
+    assert (md and md.task_state) == remaining_state
+    assert fake_driver.declineOffer.call_count == 0
+    mock_get_metric.assert_any_call(ef_mdl.TASK_LAUNCHED_COUNT)
+
+
+@pytest.mark.parametrize('launch_error,kills', [
+    (None, 1),
+    (socket.timeout, 0),
+])
+def test_resource_offers_task_killed_in_flight(
+    ef,
+    fake_task,
+    fake_offer,
+    fake_driver,
+    mock_get_metric,
+    launch_error,
+    kills,
+):
+    ef.driver = fake_driver
+    fake_driver.launchTasks.side_effect = launch_error
+    ef.offer_matches_pool = mock.Mock(return_value=True)
+    task_id = fake_task.task_id
+    ef.get_tasks_to_launch_for_offers = mock.Mock(
+        return_value=[([fake_offer], [Dict(task_id=Dict(value=task_id))])])
+    ef.task_queue.put(fake_task)
+    ef.agent_registry.task_placed(task_id, fake_task.name, 'fake_agent_id')
+    # Killed after it was matched, its metadata is gone
+    ef._killed_in_flight.add(task_id)
+
+    ef._match_offers(ef.driver, [fake_offer])
+
+    assert fake_driver.killTask.call_count == kills
+    assert not ef._killed_in_flight
+    assert task_id not in ef.agent_registry.placements
+
+
+def test_get_tasks_to_launch_excluded_agent(
+    ef,
+    fake_offer,
+    fake_task,
+    mock_get_metric
+):
+    ef.create_new_docker_task = mock.Mock()
+    _queue_tasks(ef, [fake_task.set(excluded_agent_ids=['fake_agent_id'])])
+    other_offer = _other_offer(fake_offer, cpus=10)
+
+    per_agent = ef.get_tasks_to_launch_for_offers([fake_offer, other_offer])
+
+    assert [len(tasks) for _, tasks in per_agent] == [0, 1]
+    assert ef.task_queue.empty()
+
+
+def test_get_tasks_to_launch_excluded_from_every_fitting_agent(
+    ef,
+    fake_offer,
+    fake_task,
+    mock_get_metric
+):
+    ef.create_new_docker_task = mock.Mock()
+    _queue_tasks(ef, [fake_task.set(excluded_agent_ids=['fake_agent_id'])])
+
+    tasks = ef.get_tasks_to_launch(fake_offer)
+
+    # The exclusion is only a hint
+    assert len(tasks) == 1
+    assert ef.task_queue.empty()
+
+
 def test_get_tasks_to_launch_no_ports(
     ef,
     fake_offer,
@@ -606,7 +837,7 @@ def test_get_tasks_to_launch_no_ports(
 ):
     ef.create_new_docker_task = mock.Mock()
     ef.get_available_ports = mock.Mock(return_value=[])
-    ef.task_queue.put(fake_task)
+    _queue_tasks(ef, [fake_task])
 
     tasks = ef.get_tasks_to_launch(fake_offer)
 
@@ -615,6 +846,182 @@ def test_get_tasks_to_launch_no_ports(
     assert ef.create_new_docker_task.call_count == 0
 
 
+def test_get_tasks_to_launch_constraints(
+    ef,
+    fake_offer,
+    fake_task,
+    mock_get_metric
+):
+    ef.create_new_docker_task = mock.Mock()
+    tasks = [
+        fake_task.set(cpus=1.0, constraints=[['hostname', 'UNIQUE']])
+        for _ in range(2)
+    ] + [fake_task.set(cpus=1.0, constraints=[['pool', 'EQUALS', 'other']])]
+    tasks[1] = tasks[1].set(uuid='second')
+    tasks[2] = tasks[2].set(uuid='third')
+    for task in tasks:
+        ef.task_queue.put(task)
+        ef.task_metadata = ef.task_metadata.set(
+            task.task_id,
+            ef_mdl.TaskMetadata(
+                task_config=task,
+                task_state='TASK_INITED',
+                task_state_history=m(TASK_INITED=time.time()),
+            ),
+        )
+
+    launched = ef.get_tasks_to_launch(fake_offer)
+
+    assert len(launched) == 1
+    assert ef.task_queue.qsize() == 2
+    assert ef.agent_registry.placements == {
+        tasks[0].task_id: (fake_task.name, 'fake_agent_id'),
+    }
+
+
+def _queue_tasks(ef, tasks):
+    for task in tasks:
+        ef.task_queue.put(task)
+        ef.task_metadata = ef.task_metadata.set(
+            task.task_id,
+            ef_mdl.TaskMetadata(
+                task_config=task,
+                task_state='TASK_INITED',
+                task_state_history=m(TASK_INITED=time.time()),
+            ),
+        )
+
+
+@pytest.mark.parametrize('strategy,task_strategy,launched', [
+    ('first_fit', None, [2, 0]),
+    ('spread', None, [1, 1]),
+    ('first_fit', 'spread', [1, 1]),
+    ('spread', 'first_fit', [2, 0]),
+])
+def test_get_tasks_to_launch_for_offers_placement_strategy(
+    mock_Thread,
+    fake_offer,
+    fake_task,
+    mock_get_metric,
+    strategy,
+    task_strategy,
+    launched,
+):
+    ef = ef_mdl.ExecutionFramework(
+        'fake_name', 'fake_role', placement_strategy=strategy)
+    ef.create_new_docker_task = mock.Mock()
+    other_offer = Dict(fake_offer)
+    other_offer.id = Dict(value='other_offer_id')
+    other_offer.agent_id = Dict(value='other_agent_id')
+    tasks = [
+        fake_task.set(
+            cpus=1.0, mem=64.0, disk=10.0, gpus=0, uuid=str(i),
+            placement_strategy=task_strategy,
+        )
+        for i in range(2)
+    ]
+    _queue_tasks(ef, tasks)
+
+    per_agent = ef.get_tasks_to_launch_for_offers([fake_offer, other_offer])
+
+    assert [len(tasks) for _, tasks in per_agent] == launched
+    assert ef.task_queue.empty()
+
+
+def test_get_tasks_to_launch_for_offers_none_fit(
+    ef,
+    fake_offer,
+    fake_task,
+    mock_get_metric,
+):
+    ef.create_new_docker_task = mock.Mock()
+    _queue_tasks(ef, [fake_task.set(cpus=100.0)])
+
+    assert ef.get_tasks_to_launch_for_offers([fake_offer]) == [
+        ([fake_offer], [])]
+    assert ef.task_queue.qsize() == 1
+    assert ef.create_new_docker_task.call_count == 0
+
+
+def test_get_tasks_to_launch_for_offers_pools_agent_offers(
+    ef,
+    fake_offer,
+    fake_task,
+    mock_get_metric,
+):
+    fake_offer.resources[0].scalar.value = 5
+    same_agent_offer = _other_offer(fake_offer, cpus=5)
+    same_agent_offer.agent_id = fake_offer.agent_id
+    _queue_tasks(ef, [fake_task.set(cpus=8.0)])
+
+    per_agent = ef.get_tasks_to_launch_for_offers(
+        [fake_offer, same_agent_offer])
+
+    assert len(per_agent) == 1
+    offers, tasks = per_agent[0]
+    assert offers == [fake_offer, same_agent_offer]
+    assert [t.task_id.value for t in tasks] == [fake_task.task_id]
+    assert ef.task_queue.empty()
+    assert ef.agent_registry.get('fake_agent_id').capacity['cpus'] == 10
+
+
+def test_match_offers_launches_on_pooled_offers(
+    ef,
+    fake_offer,
+    fake_task,
+    fake_driver,
+    mock_get_metric,
+):
+    ef.driver = fake_driver
+    ef.offer_matches_pool = mock.Mock(return_value=True)
+    fake_offer.resources[0].scalar.value = 5
+    same_agent_offer = _other_offer(fake_offer, cpus=5)
+    same_agent_offer.agent_id = fake_offer.agent_id
+    _queue_tasks(ef, [fake_task.set(cpus=8.0)])
+
+    ef._match_offers(fake_driver, [fake_offer, same_agent_offer])
+
+    offer_ids, tasks = fake_driver.launchTasks.call_args[0]
+    assert offer_ids == [fake_offer.id, same_agent_offer.id]
+    assert len(tasks) == 1
+    assert fake_driver.declineOffer.call_count == 0
+    assert ef.task_metadata[fake_task.task_id].task_state == 'TASK_STAGING'
+
+
+def test_match_offers_declines_pooled_offers_together(
+    ef,
+    fake_offer,
+    fake_task,
+    fake_driver,
+    mock_get_metric,
+):
+    ef.driver = fake_driver
+    ef.offer_matches_pool = mock.Mock(return_value=True)
+    ef.decline_filters.insufficient = mock.Mock(return_value=42)
+    same_agent_offer = _other_offer(fake_offer, cpus=5)
+    same_agent_offer.agent_id = fake_offer.agent_id
+    _queue_tasks(ef, [fake_task.set(cpus=100.0)])
+
+    ef._match_offers(fake_driver, [fake_offer, same_agent_offer])
+
+    assert ef.decline_filters.insufficient.call_count == 1
+    assert fake_driver.declineOffer.call_args == mock.call(
+        [fake_offer.id, same_agent_offer.id],
+        Dict(refuse_seconds=42)
+    )
+    assert fake_driver.launchTasks.call_count == 0
+
+
+def test_enqueue_forgets_placement(ef, fake_task, mock_get_metric):
+    ef.driver = mock.Mock()
+    ef.agent_registry.task_placed(
+        fake_task.task_id, fake_task.name, 'fake_agent_id')
+
+    ef.enqueue_task(fake_task)
+
+    assert not ef.agent_registry.placements
+
+
 def test_get_tasks_to_launch_ports_available(
     ef,
     fake_offer,
@@ -642,15 +1049,101 @@ def test_get_tasks_to_launch_ports_available(
     assert ef.create_new_docker_task.call_count == 1
 
 
-def test_resource_offers_no_tasks_to_launch(
+def test_resource_offers_hands_offers_to_offer_thread(
+    ef,
+    fake_offer,
+    fake_driver
+):
+    ef._match_offers = mock.Mock()
+
+    ef.resourceOffers(fake_driver, [fake_offer])
+
+    assert ef.driver == fake_driver
+    assert fake_offer.id.value in ef._pending_offers
+    assert ef._match_offers.call_count == 0
+    assert ef._offer_queue.get_nowait() == (fake_driver, [fake_offer])
+
+
+def test_offer_loop_matches_queued_offers_together(
+    ef,
+    fake_offer,
+    fake_driver
+):
+    ef._match_offers = mock.Mock()
+    other_offer = Dict(fake_offer)
+    other_offer.id = Dict(value='other_offer_id')
+    ef.resourceOffers(fake_driver, [fake_offer])
+    ef.resourceOffers(fake_driver, [other_offer])
+    ef._offer_queue.close()
+
+    ef._offer_loop()
+
+    assert ef._match_offers.call_args_list == [
+        mock.call(fake_driver, [fake_offer, other_offer]),
+    ]
+
+
+def test_match_offers_skips_rescinded_offers(
     ef,
     fake_offer,
     fake_driver,
     mock_get_metric
 ):
-    ef.suppress_after = 0.0
+    ef._process_offers = mock.Mock()
+    other_offer = Dict(fake_offer)
+    other_offer.id = Dict(value='other_offer_id')
+    ef.resourceOffers(fake_driver, [fake_offer, other_offer])
+
+    ef.offerRescinded(fake_driver, fake_offer.id)
+    ef._match_offers(fake_driver, [fake_offer, other_offer])
+
+    assert ef._process_offers.call_args == mock.call(
+        fake_driver, [other_offer])
+    assert not ef._pending_offers
+    assert not ef._rescinded_offers
+    mock_get_metric.assert_any_call(ef_mdl.OFFER_RESCINDED_COUNT)
+    assert mock_get_metric.call_args == mock.call(
+        ef_mdl.OFFER_LIFETIME_TIMER)
+    assert mock_get_metric.return_value.record.call_count == 1
 
+
+def test_offer_rescinded_while_matching(
+    ef,
+    fake_offer,
+    fake_driver,
+    mock_get_metric
+):
     ef.resourceOffers(fake_driver, [fake_offer])
+    ef._process_offers = mock.Mock(
+        side_effect=lambda *args: ef.offerRescinded(
+            fake_driver, fake_offer.id))
+
+    ef._match_offers(fake_driver, [fake_offer])
+
+    assert not ef._pending_offers
+    assert not ef._rescinded_offers
+
+
+def test_offer_rescinded_after_matching(
+    ef,
+    fake_offer,
+    fake_driver,
+    mock_get_metric
+):
+    ef.offerRescinded(fake_driver, fake_offer.id)
+
+    assert not ef._rescinded_offers
+
+
+def test_resource_offers_no_tasks_to_launch(
+    ef,
+    fake_offer,
+    fake_driver,
+    mock_get_metric
+):
+    ef.revive_controller.min_suppress_delay_s = 0
+
+    ef._match_offers(fake_driver, [fake_offer])
 
     assert fake_driver.declineOffer.call_args == mock.call(
         [fake_offer.id],
@@ -659,8 +1152,50 @@ def test_resource_offers_no_tasks_to_launch(
     assert fake_driver.suppressOffers.call_count == 1
     assert ef.are_offers_suppressed
     assert fake_driver.launchTasks.call_count == 0
-    assert mock_get_metric.call_count == 0
-    assert mock_get_metric.return_value.count.call_count == 0
+    assert mock_get_metric.call_args == mock.call(
+        ef_mdl.OFFERS_SUPPRESSED_COUNT)
+    assert mock_get_metric.return_value.count.call_count == 1
+
+
+def test_resource_offers_no_tasks_within_suppress_delay(
+    ef,
+    fake_offer,
+    fake_driver,
+    mock_get_metric
+):
+    ef._match_offers(fake_driver, [fake_offer])
+
+    assert fake_driver.declineOffer.call_args == mock.call(
+        [fake_offer.id],
+        ef.offer_decline_filter
+    )
+    assert fake_driver.suppressOffers.call_count == 0
+    assert not ef.are_offers_suppressed
+
+
+def test_resource_offers_no_tasks_backs_off(
+    ef,
+    fake_task,
+    fake_offer,
+    fake_driver,
+    mock_get_metric
+):
+    for _ in range(3):
+        ef._match_offers(fake_driver, [fake_offer])
+    ef.task_queue.put(fake_task)
+    ef._match_offers(fake_driver, [fake_offer])
+    while not ef.task_queue.empty():
+        ef.task_queue.get_nowait()
+    ef._match_offers(fake_driver, [fake_offer])
+
+    refusals = [
+        call[0][1].refuse_seconds
+        for call in fake_driver.declineOffer.call_args_list
+    ]
+    assert refusals[:3] == [
+        ef.offer_backoff, ef.offer_backoff * 2, ef.offer_backoff * 4,
+    ]
+    assert refusals[-1] == ef.offer_backoff
 
 
 def test_resource_offers_blacklisted_offer(
@@ -674,7 +1209,7 @@ def test_resource_offers_blacklisted_offer(
         fake_offer.agent_id.value,
     )
     ef.task_queue.put(fake_task)
-    ef.resourceOffers(fake_driver, [fake_offer])
+    ef._match_offers(fake_driver, [fake_offer])
 
     assert fake_driver.declineOffer.call_count == 1
     assert fake_driver.declineOffer.call_args == mock.call(
@@ -686,6 +1221,47 @@ def test_resource_offers_blacklisted_offer(
     assert mock_get_metric.return_value.count.call_count == 0
 
 
+def test_resource_offers_blacklisted_until_expiry(
+    ef,
+    fake_task,
+    fake_offer,
+    fake_driver,
+    mock_get_metric,
+    mock_time
+):
+    mock_time.return_value = 100.0
+    ef.blacklist_slave(fake_offer.agent_id.value, timeout=600)
+    ef.task_queue.put(fake_task)
+
+    mock_time.return_value = 200.0
+    ef._match_offers(fake_driver, [fake_offer])
+
+    assert fake_driver.declineOffer.call_args == mock.call(
+        [fake_offer.id],
+        Dict(refuse_seconds=500.0)
+    )
+
+
+def test_resource_offers_declines_grouped_by_refuse_seconds(
+    ef,
+    fake_task,
+    fake_offer,
+    fake_driver,
+    mock_get_metric
+):
+    other_offer = Dict(fake_offer)
+    other_offer.id = Dict(value='other_offer_id')
+    ef.offer_matches_pool = mock.Mock(return_value=False)
+
+    ef.task_queue.put(fake_task)
+    ef._match_offers(fake_driver, [fake_offer, other_offer])
+
+    assert fake_driver.declineOffer.call_args_list == [mock.call(
+        [fake_offer.id, other_offer.id],
+        Dict(refuse_seconds=300)
+    )]
+
+
 def test_resource_offers_not_for_pool(
     ef,
     fake_task,
@@ -696,14 +1272,14 @@ def test_resource_offers_not_for_pool(
     ef.offer_matches_pool = mock.Mock(return_value=False)
 
     ef.task_queue.put(fake_task)
-    ef.resourceOffers(fake_driver, [fake_offer])
+    ef._match_offers(fake_driver, [fake_offer])
 
     assert ef.offer_matches_pool.call_count == 1
     assert ef.offer_matches_pool.call_args == mock.call(fake_offer)
     assert fake_driver.declineOffer.call_count == 1
     assert fake_driver.declineOffer.call_args == mock.call(
         [fake_offer.id],
-        ef.offer_decline_filter
+        Dict(refuse_seconds=300)
     )
     assert fake_driver.launchTasks.call_count == 0
     assert mock_get_metric.call_count == 0
@@ -717,15 +1293,19 @@ def test_resource_offers_unmet_reqs(
     fake_driver,
     mock_get_metric
 ):
-    ef.get_tasks_to_launch = mock.Mock(return_value=[])
+    ef.get_tasks_to_launch_for_offers = mock.Mock(
+        return_value=[([fake_offer], [])])
+    ef.decline_filters.insufficient = mock.Mock(return_value=42)
 
     ef.task_queue.put(fake_task)
-    ef.resourceOffers(fake_driver, [fake_offer])
+    ef._match_offers(fake_driver, [fake_offer])
 
+    assert ef.decline_filters.insufficient.call_args == mock.call(
+        fake_offer.agent_id.value, 1)
     assert fake_driver.declineOffer.call_count == 1
     assert fake_driver.declineOffer.call_args == mock.call(
         [fake_offer.id],
-        ef.offer_decline_filter
+        Dict(refuse_seconds=42)
     )
     assert fake_driver.launchTasks.call_count == 0
     assert mock_get_metric.call_count == 0
@@ -774,11 +1354,18 @@ def test_status_update_finished(
     # finished task does same thing as other states
     update, task_id, task_metadata = status_update_test_prep('TASK_FINISHED')
     ef.translator = mock.Mock()
+    ef.tracer = mock.Mock()
 
     ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
+    ef.agent_registry.task_placed(task_id, 'fake_name', 'fake_agent_id')
     ef.statusUpdate(fake_driver, update)
 
     assert task_id not in ef.task_metadata
+    assert task_id not in ef.agent_registry.placements
+    finish_args = ef.tracer.finish.call_args[0]
+    assert finish_args[0] == task_id
+    assert set(finish_args[1]) == {'TASK_INITED', 'TASK_FINISHED'}
+    assert finish_args[2] == 'TASK_FINISHED'
     assert mock_get_metric.call_count == 1
     assert mock_get_metric.call_args == mock.call(ef_mdl.TASK_FINISHED_COUNT)
     assert mock_get_metric.return_value.count.call_count == 1
@@ -787,6 +1374,22 @@ def test_status_update_finished(
     assert fake_driver.acknowledgeStatusUpdate.call_args == mock.call(update)
 
 
+def test_status_update_places_unknown_task(
+    ef,
+    fake_driver,
+    mock_get_metric
+):
+    update, task_id, task_metadata = status_update_test_prep('TASK_RUNNING')
+    update.agent_id = Dict(value='fake_agent_id')
+    ef.translator = mock.Mock()
+    ef.task_metadata = ef.task_metadata.set(task_id, task_metadata)
+
+    ef.statusUpdate(fake_driver, update)
+
+    assert ef.agent_registry.placements[task_id] == (
+        'fake_name', 'fake_agent_id')
+
+
 def test_ignore_status_update(
     ef,
     fake_driver,
@@ -824,3 +1427,309 @@ def test_task_lost_due_to_invalid_offers(
     assert ef.event_queue.qsize() == 0
     assert ef.task_queue.qsize() == 1
     assert fake_driver.acknowledgeStatusUpdate.call_count == 1
+
+
+def _group_tasks(n=2, **kwargs):
+    kwargs.setdefault('containerizer', 'MESOS')
+    return [
+        me_mdl.MesosTaskConfig(
+            name='gang', uuid=str(i), cmd='/bin/true', cpus=4.0, mem=256.0,
+            disk=100.0, **kwargs
+        )
+        for i in range(n)
+    ]
+
+
+def _other_offer(fake_offer, cpus):
+    offer = Dict(fake_offer)
+    offer.id = Dict(value='other_offer_id')
+    offer.agent_id = Dict(value='other_agent_id')
+    offer.resources = [Dict(r) for r in fake_offer.resources]
+    offer.resources[0].scalar.value = cpus
+    return offer
+
+
+def test_enqueue_group(ef, mock_get_metric):
+    ef.driver = mock.Mock()
+    tasks = _group_tasks()
+
+    group_id = ef.enqueue_group(tasks, 'group.1')
+
+    assert group_id == 'group.1'
+    assert ef.task_queue.qsize() == 1
+    assert ef.task_queue.queue[0].task_ids == ['gang.0', 'gang.1']
+    assert all(
+        ef.task_metadata[task.task_id].group_id == 'group.1' for task in tasks
+    )
+    assert mock_get_metric.return_value.count.call_args == mock.call(2)
+
+
+def test_get_tasks_to_launch_group_colocated(ef, fake_offer, mock_get_metric):
+    ef.driver = mock.Mock()
+    ef.enqueue_group(_group_tasks(), 'group.1')
+
+    tasks = ef.get_tasks_to_launch(fake_offer)
+
+    assert [task.task_id.value for task in tasks] == ['gang.0', 'gang.1']
+    assert ef.task_groups['group.1'].launch_group
+    assert ef.task_queue.empty()
+
+
+def test_get_tasks_to_launch_group_all_or_nothing(
+    ef,
+    fake_offer,
+    fake_task,
+    mock_get_metric,
+):
+    ef.driver = mock.Mock()
+    ef.enqueue_group(_group_tasks(3), 'group.1')
+    ef.enqueue_task(fake_task.set(cpus=1.0, gpus=0))
+
+    tasks = ef.get_tasks_to_launch(fake_offer)
+
+    assert [task.task_id.value for task in tasks] == [
+        fake_task.task_id]
+    assert ef.task_queue.queue[0].group_id == 'group.1'
+    assert not any(
+        task_id.startswith('gang') for task_id in ef.agent_registry.placements
+    )
+
+
+def test_get_tasks_to_launch_group_across_offers(
+    ef,
+    fake_offer,
+    mock_get_metric,
+):
+    ef.driver = mock.Mock()
+    ef.enqueue_group(_group_tasks(), 'group.1')
+    fake_offer.resources[0].scalar.value = 5
+    other_offer = _other_offer(fake_offer, cpus=5)
+
+    per_agent = ef.get_tasks_to_launch_for_offers([fake_offer, other_offer])
+
+    assert [len(tasks) for _, tasks in per_agent] == [1, 1]
+    assert not ef.task_groups['group.1'].launch_group
+
+
+def test_match_offers_launches_group(
+    ef,
+    fake_offer,
+    fake_driver,
+    mock_get_metric,
+):
+    ef.driver = fake_driver
+    ef.framework_id = 'fake_framework_id'
+    ef.enqueue_group(_group_tasks(), 'group.1')
+
+    ef._match_offers(fake_driver, [fake_offer])
+
+    assert fake_driver.launchTasks.call_count == 0
+    offer_ids, operations = fake_driver.acceptOffers.call_args[0]
+    assert offer_ids == [fake_offer.id]
+    assert [op.type for op in operations] == ['LAUNCH_GROUP']
+    launch_group = operations[0].launch_group
+    assert launch_group.executor.type == 'DEFAULT'
+    assert launch_group.executor.framework_id.value == 'fake_framework_id'
+    assert [t.task_id.value for t in launch_group.task_group.tasks] == [
+        'gang.0', 'gang.1']
+    assert ef.task_metadata['gang.0'].task_state == 'TASK_STAGING'
+
+
+def test_match_offers_group_launch_failed(
+    ef,
+    fake_offer,
+    fake_driver,
+    mock_get_metric,
+):
+    ef.driver = fake_driver
+    fake_driver.acceptOffers.side_effect = socket.timeout
+    ef.enqueue_group(_group_tasks(), 'group.1')
+
+    ef._match_offers(fake_driver, [fake_offer])
+
+    events = ef.event_queue.get_many(10, timeout=0)
+    assert [(e.task_id, e.platform_type) for e in events] == [
+        ('gang.0', 'lost'), ('gang.1', 'lost'), ('group.1', 'failed')]
+    assert not ef.task_metadata
+    assert not ef.task_groups
+
+
+def _launched_group(ef, tasks):
+    ef.driver = mock.Mock()
+    ef.enqueue_group(tasks, 'group.1')
+    ef.task_queue.get()
+    ef.task_metadata = ef.task_metadata.update({
+        task.task_id: _running_task_metadata(task).set(group_id='group.1')
+        for task in tasks
+    })
+
+
+def test_status_update_group_finished(ef, fake_driver, mock_get_metric):
+    tasks = _group_tasks()
+    _launched_group(ef, tasks)
+
+    for task in tasks:
+        ef.statusUpdate(fake_driver, Dict(
+            task_id=Dict(value=task.task_id), state='TASK_FINISHED'))
+
+    events = ef.event_queue.get_many(10, timeout=0)
+    assert [e.task_id for e in events] == ['gang.0', 'gang.1', 'group.1']
+    assert events[-1].terminal
+    assert events[-1].success
+    assert not ef.task_groups
+    assert ef.driver.killTask.call_count == 0
+
+
+def test_status_update_group_task_failed_kills_rest(
+    ef,
+    fake_driver,
+    mock_get_metric,
+):
+    tasks = _group_tasks(3)
+    _launched_group(ef, tasks)
+
+    ef.statusUpdate(fake_driver, Dict(
+        task_id=Dict(value='gang.1'), state='TASK_FAILED'))
+
+    killed = sorted(
+        call[0][0].value for call in ef.driver.killTask.call_args_list)
+    assert killed == ['gang.0', 'gang.2']
+    for task_id in killed:
+        ef.statusUpdate(fake_driver, Dict(
+            task_id=Dict(value=task_id), state='TASK_KILLED'))
+    events = ef.event_queue.get_many(10, timeout=0)
+    assert [e.task_id for e in events] == [
+        'gang.1', 'gang.0', 'gang.2', 'group.1']
+    assert not events[-1].success
+
+
+def test_status_update_group_invalid_offers_not_reenqueued(
+    ef,
+    fake_driver,
+    mock_get_metric,
+):
+    tasks = _group_tasks()
+    _launched_group(ef, tasks)
+
+    ef.statusUpdate(fake_driver, Dict(
+        task_id=Dict(value='gang.0'),
+        state='TASK_LOST',
+        reason='REASON_INVALID_OFFERS',
+    ))
+
+    assert ef.task_queue.empty()
+    assert 'gang.0' not in ef.task_metadata
+    assert ef.driver.killTask.call_args == mock.call(Dict(value='gang.1'))
+
+
+def test_kill_queued_group_task_kills_group(ef, fake_driver, mock_get_metric):
+    ef.driver = fake_driver
+    ef.enqueue_group(_group_tasks(), 'group.1')
+
+    ef.kill_task('gang.0')
+
+    assert ef.task_queue.empty()
+    assert not ef.task_metadata
+    assert fake_driver.killTask.call_count == 0
+    events = ef.event_queue.get_many(10, timeout=0)
+    assert sorted((e.task_id, e.platform_type) for e in events[:2]) == [
+        ('gang.0', 'killed'), ('gang.1', 'killed')]
+    assert events[2].task_id == 'group.1'
+    assert not events[2].success
+
+
+def test_withdraw_queued_tasks(ef, fake_task, mock_get_metric):
+    ef.driver = mock.Mock()
+    tasks = [fake_task.set(uuid=str(i)) for i in range(3)]
+    ef.enqueue_tasks(tasks[:2])
+    ef.enqueue_group(_group_tasks(), 'group.1')
+    ef.enqueue_task(tasks[2])
+
+    withdrawn = ef.withdraw_queued_tasks(2)
+
+    assert withdrawn == [tasks[1], tasks[2]]
+    assert [
+        getattr(task, 'group_id', None) or task.task_id
+        for task in ef.task_queue.queue
+    ] == [tasks[0].task_id, 'group.1']
+    assert tasks[1].task_id not in ef.task_metadata
+    assert tasks[0].task_id in ef.task_metadata
+    assert ef.event_queue.empty()
+
+
+def test_load(ef, fake_task, mock_get_metric, mock_time):
+    ef.driver = mock.Mock()
+    mock_time.return_value = 100.0
+    _queue_tasks(ef, [fake_task.set(uuid=str(i)) for i in range(2)])
+    ef.resourceOffers(ef.driver, [mock.Mock(), mock.Mock()])
+    mock_time.return_value = 103.0
+    ef._record_match(ef.task_queue.get())
+
+    mock_time.return_value = 105.0
+    load = ef.load()
+
+    assert load.queue_depth == 1
+    assert load.offer_rate == 2 / 60.0
+    assert load.match_rate == 1 / 60.0
+    assert load.queued_time == pytest.approx(0.3)
+    # Since the last match
+    assert load.waiting_s == 2.0
+
+
+def test_kill_tasks_while_enqueue_waits_for_room(
+    mock_Thread,
+    fake_task,
+    mock_get_metric,
+):
+    ef = ef_mdl.ExecutionFramework(
+        'fake_name', 'fake_role', max_task_queue_size=2)
+    ef.driver = mock.Mock()
+    # Room for all of the killed events
+    ef.event_queue = ef_mdl.EventStream()
+    tasks = [fake_task.set(uuid=str(i)) for i in range(5)]
+    # Not mock_Thread
+    enqueue_thread = Thread(target=ef.enqueue_tasks, args=(tasks,))
+    enqueue_thread.start()
+    while ef.task_queue.qsize() < 2 or len(ef.task_metadata) < 5:
+        time.sleep(0.001)
+
+    ef.kill_tasks([task.task_id for task in tasks])
+    enqueue_thread.join(1)
+
+    assert not enqueue_thread.is_alive()
+    assert ef.task_queue.empty()
+    assert not ef.task_metadata
+    assert not ef._killed_in_flight
+    events = ef.event_queue.get_many(10, timeout=0)
+    assert len(events) == 5
+    assert all(e.platform_type == 'killed' for e in events)
+
+
+def test_get_tasks_to_launch_skips_tasks_without_metadata(
+    ef,
+    fake_offer,
+    fake_task,
+    mock_get_metric,
+):
+    ef.task_queue.put(fake_task)
+    ef._killed_in_flight.add(fake_task.task_id)
+
+    assert ef.get_tasks_to_launch(fake_offer) == []
+    assert ef.task_queue.empty()
+    assert not ef._killed_in_flight
+
+
+def test_put_back_in_queue_never_blocks(fake_task, mock_Thread):
+    ef = ef_mdl.ExecutionFramework(
+        'fake_name', 'fake_role', max_task_queue_size=2)
+    tasks = [fake_task.set(uuid=str(i)) for i in range(4)]
+    _queue_tasks(ef, tasks[:2])
+    unmatched = [ef.task_queue.get(), ef.task_queue.get()]
+    # Enqueuers took the room while the tasks were being matched
+    _queue_tasks(ef, tasks[2:])
+
+    ef._put_back_in_queue(unmatched)
+
+    # Back at the head, over maxsize
+    assert [ef.task_queue.get_nowait().uuid for _ in range(4)] == [
+        '0', '1', '2', '3']
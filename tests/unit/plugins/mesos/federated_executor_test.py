@@ -0,0 +1,195 @@
+import threading
+
+import mock
+import pytest
+
+from task_processing.event_stream import EventStream
+from task_processing.interfaces.event import control_event
+from task_processing.interfaces.event import task_event
+from task_processing.plugins.mesos.cluster_load import ClusterLoad
+from task_processing.plugins.mesos.federated_executor import (
+    FederatedExecutor
+)
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+
+
+@pytest.fixture
+def mock_Thread():
+    with mock.patch.object(threading, 'Thread') as mock_Thread:
+        yield mock_Thread
+
+
+def _load(**kwargs):
+    fields = dict(
+        queue_depth=0,
+        offer_rate=10.0,
+        match_rate=1.0,
+        queued_time=0.0,
+        waiting_s=0.0,
+    )
+    fields.update(kwargs)
+    return ClusterLoad(**fields)
+
+
+def _executor(**load):
+    return mock.Mock(
+        get_event_queue=mock.Mock(return_value=EventStream()),
+        load=mock.Mock(return_value=_load(**load)),
+    )
+
+
+@pytest.fixture
+def federated(mock_Thread):
+    return FederatedExecutor(
+        {'east': _executor(), 'west': _executor()}, stall_timeout_s=60.0)
+
+
+def _task_configs(n):
+    return [
+        MesosTaskConfig(
+            name='fake_name', uuid=str(i), image='fake', cmd='/bin/true')
+        for i in range(n)
+    ]
+
+
+def _run_many_calls(executor):
+    return [
+        [task_config.uuid for task_config in call[0][0]]
+        for call in executor.run_many.call_args_list
+    ]
+
+
+def test_run_many_spreads_tasks(federated):
+    east, west = federated.executors['east'], federated.executors['west']
+    east.load.return_value = _load(queue_depth=3)
+    task_configs = _task_configs(5)
+
+    task_ids = federated.run_many(task_configs)
+
+    assert task_ids == [task_config.task_id for task_config in task_configs]
+    # Every task went where fewer tasks were ahead of it
+    assert _run_many_calls(east) == [['3']]
+    assert _run_many_calls(west) == [['0', '1', '2', '4']]
+    assert federated.task_clusters[task_configs[3].task_id] == 'east'
+
+
+def test_run_prefers_faster_cluster(federated):
+    east, west = federated.executors['east'], federated.executors['west']
+    east.load.return_value = _load(queue_depth=20, match_rate=100.0)
+    west.load.return_value = _load(queue_depth=2, match_rate=0.1)
+
+    federated.run(_task_configs(1)[0])
+
+    assert east.run_many.call_count == 1
+    assert west.run_many.call_count == 0
+
+
+def test_run_avoids_stalled_cluster(federated):
+    east, west = federated.executors['east'], federated.executors['west']
+    east.load.return_value = _load(queue_depth=1, waiting_s=61.0)
+    west.load.return_value = _load(queue_depth=50)
+
+    federated.run_many(_task_configs(2))
+
+    assert east.run_many.call_count == 0
+    assert _run_many_calls(west) == [['0', '1']]
+
+
+def test_run_group_on_one_cluster(federated):
+    west = federated.executors['west']
+    west.run_group.return_value = 'group.1'
+    federated.executors['east'].load.return_value = _load(queue_depth=1)
+    task_configs = _task_configs(2)
+
+    assert federated.run_group(task_configs) == 'group.1'
+    assert west.run_group.call_args == mock.call(task_configs)
+    assert set(federated.task_clusters.values()) == {'west'}
+    assert 'group.1' in federated.task_clusters
+
+
+def test_kill_many_routes_kills(federated):
+    east, west = federated.executors['east'], federated.executors['west']
+    federated.task_clusters.update({'a': 'east', 'b': 'west', 'c': 'east'})
+
+    federated.kill_many(['a', 'b', 'c', 'unknown'])
+
+    assert east.kill_many.call_args == mock.call(['a', 'c'])
+    assert west.kill_many.call_args == mock.call(['b'])
+
+
+def test_kill_matching(federated):
+    east, west = federated.executors['east'], federated.executors['west']
+    east.kill_matching.return_value = ['a']
+    west.kill_matching.return_value = ['b']
+    predicate = mock.Mock()
+
+    assert federated.kill_matching(predicate) == ['a', 'b']
+    assert west.kill_matching.call_args == mock.call(predicate)
+
+
+def test_rebalance_moves_queued_tasks(federated):
+    east, west = federated.executors['east'], federated.executors['west']
+    east.load.return_value = _load(queue_depth=5, waiting_s=61.0)
+    task_configs = _task_configs(2)
+    east.withdraw_queued_tasks.return_value = task_configs
+
+    with mock.patch(
+        'task_processing.plugins.mesos.federated_executor.get_metric'
+    ) as mock_get_metric:
+        assert federated.rebalance() == 2
+
+    assert east.withdraw_queued_tasks.call_args == mock.call(100)
+    assert _run_many_calls(west) == [['0', '1']]
+    assert federated.task_clusters[task_configs[0].task_id] == 'west'
+    assert mock_get_metric.return_value.count.call_args == mock.call(2)
+
+
+@pytest.mark.parametrize('east_waiting_s,west_waiting_s', [
+    (10.0, 10.0),
+    (61.0, 61.0),
+])
+def test_rebalance_needs_stalled_and_healthy_cluster(
+    federated,
+    east_waiting_s,
+    west_waiting_s,
+):
+    east, west = federated.executors['east'], federated.executors['west']
+    east.load.return_value = _load(queue_depth=5, waiting_s=east_waiting_s)
+    west.load.return_value = _load(queue_depth=5, waiting_s=west_waiting_s)
+
+    assert federated.rebalance() == 0
+    assert east.withdraw_queued_tasks.call_count == 0
+    assert west.withdraw_queued_tasks.call_count == 0
+
+
+def test_merge_loop(federated):
+    east, west = federated.executors['east'], federated.executors['west']
+    federated.task_clusters.update({'a': 'east', 'b': 'east'})
+    east_queue = east.get_event_queue()
+    east_queue.put_many([
+        task_event(task_id='a', terminal=False, timestamp=1.0),
+        task_event(task_id='b', terminal=True, timestamp=1.0),
+        control_event(message='stop'),
+    ])
+    east_queue.close()
+    west.get_event_queue().close()
+
+    federated.merge_loop('east', east_queue)
+    assert not federated.dest_queue.closed
+    federated.merge_loop('west', west.get_event_queue())
+
+    events = list(federated.get_event_queue())
+    assert [e.extensions['FederatedExecutor/cluster'] for e in events] == [
+        'east', 'east', 'east']
+    assert [e.kind for e in events] == ['task', 'task', 'control']
+    assert federated.task_clusters == {'a': 'east'}
+
+
+def test_stop(federated, mock_Thread):
+    federated.stop()
+
+    assert federated.stopping
+    for executor in federated.executors.values():
+        assert executor.stop.call_count == 1
+    # One merge thread per cluster
+    assert mock_Thread.return_value.join.call_count == 2
@@ -0,0 +1,179 @@
+import threading
+import time
+
+import mock
+import pytest
+
+from task_processing.event_stream import EventStream
+from task_processing.interfaces.event import task_event
+from task_processing.plugins.mesos.hedging_executor import HedgingExecutor
+from task_processing.plugins.mesos.hedging_executor import RuntimeHistory
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+
+
+@pytest.fixture
+def mock_Thread():
+    with mock.patch.object(threading, 'Thread') as mock_Thread:
+        yield mock_Thread
+
+
+@pytest.fixture
+def mock_time():
+    with mock.patch.object(time, 'time') as mock_time:
+        mock_time.return_value = 100.0
+        yield mock_time
+
+
+@pytest.fixture
+def hedging_executor(mock_Thread, mock_time):
+    downstream = mock.Mock(
+        get_event_queue=mock.Mock(return_value=EventStream()))
+    executor = HedgingExecutor(
+        downstream, quantile=0.5, min_samples=2, max_hedges_in_flight=1)
+    for runtime in [10.0, 20.0]:
+        executor.history.record('fake_name', runtime)
+    return executor
+
+
+def _task_config():
+    return MesosTaskConfig(name='fake_name', image='fake', cmd='/bin/true')
+
+
+def _event(task_config, terminal=False, success=None, platform_type='fake'):
+    return task_event(
+        task_id=task_config.task_id,
+        task_config=task_config,
+        timestamp=1.0,
+        terminal=terminal,
+        success=success,
+        platform_type=platform_type,
+    )
+
+
+def _run_and_start(executor, task_configs):
+    executor.run_many(task_configs)
+    for task_config in task_configs:
+        executor._process_event(_event(task_config, platform_type='running'))
+
+
+def _hedge_config(executor):
+    return executor.downstream_executor.run.call_args[0][0]
+
+
+def test_runtime_history_quantile():
+    history = RuntimeHistory(size=3)
+    for runtime in [5.0, 1.0, 2.0, 3.0]:
+        history.record('name', runtime)
+
+    # The oldest runtime was evicted
+    assert history.samples('name') == 3
+    assert history.quantile('name', 0.5) == 2.0
+    assert history.quantile('name', 1.0) == 3.0
+
+
+def test_running_schedules_hedge_at_quantile(hedging_executor, mock_time):
+    task_config = _task_config()
+    hedging_executor.run(task_config)
+    assert task_config.task_id not in hedging_executor.hedge_deadlines
+
+    mock_time.return_value = 150.0
+    e = hedging_executor._process_event(
+        _event(task_config, platform_type='running'))
+
+    assert e.task_id == task_config.task_id
+    assert task_config.task_id in hedging_executor.hedge_deadlines
+    assert hedging_executor.hedge_deadlines._heap[0][0] == 170.0
+
+
+def test_no_hedge_without_history(hedging_executor):
+    task_config = _task_config().set(name='new_name')
+
+    _run_and_start(hedging_executor, [task_config])
+
+    assert task_config.task_id not in hedging_executor.hedge_deadlines
+
+
+def test_queued_task_is_not_hedged(hedging_executor):
+    task_config = _task_config()
+    hedging_executor.run(task_config)
+    hedging_executor._process_event(_event(task_config))
+
+    hedging_executor._hedge(task_config.task_id)
+
+    assert hedging_executor.downstream_executor.run.call_count == 1
+    assert hedging_executor.hedges_in_flight == 0
+
+
+def test_runtime_is_recorded_from_start(hedging_executor, mock_time):
+    task_config = _task_config()
+    hedging_executor.run(task_config)
+    mock_time.return_value = 150.0
+    hedging_executor._process_event(
+        _event(task_config, platform_type='running'))
+
+    mock_time.return_value = 155.0
+    hedging_executor._process_event(
+        _event(task_config, terminal=True, success=True))
+
+    assert hedging_executor.history.samples('fake_name') == 3
+    assert hedging_executor.history.quantile('fake_name', 0.0) == 5.0
+
+
+def test_hedge_wins(hedging_executor):
+    task_config = _task_config()
+    _run_and_start(hedging_executor, [task_config])
+    hedging_executor._hedge(task_config.task_id)
+    hedge_config = _hedge_config(hedging_executor)
+
+    e = hedging_executor._process_event(
+        _event(hedge_config, terminal=True, success=True))
+
+    assert e.task_id == task_config.task_id
+    assert e.extensions['HedgingExecutor/winner'] == 'hedge'
+    assert hedging_executor.downstream_executor.kill_many.call_args == \
+        mock.call([task_config.task_id])
+    assert hedging_executor.hedges_in_flight == 0
+    # The loser's terminal event is swallowed
+    assert hedging_executor._process_event(
+        _event(task_config, terminal=True, success=False)) is None
+    assert hedging_executor.attempts == {}
+
+
+def test_failed_copy_waits_for_the_other(hedging_executor):
+    task_config = _task_config()
+    _run_and_start(hedging_executor, [task_config])
+    hedging_executor._hedge(task_config.task_id)
+    hedge_config = _hedge_config(hedging_executor)
+
+    assert hedging_executor._process_event(
+        _event(task_config, terminal=True, success=False)) is None
+    e = hedging_executor._process_event(
+        _event(hedge_config, terminal=True, success=False))
+
+    assert e.task_id == task_config.task_id
+    assert not e.success
+
+
+def test_hedges_in_flight_are_capped(hedging_executor):
+    task_configs = [_task_config(), _task_config()]
+    _run_and_start(hedging_executor, task_configs)
+
+    hedging_executor._hedge(task_configs[0].task_id)
+    hedging_executor._hedge(task_configs[1].task_id)
+
+    assert hedging_executor.downstream_executor.run.call_count == 1
+    assert hedging_executor.hedges_in_flight == 1
+
+
+def test_kill_kills_every_copy(hedging_executor):
+    task_config = _task_config()
+    _run_and_start(hedging_executor, [task_config])
+    hedging_executor._hedge(task_config.task_id)
+    hedge_config = _hedge_config(hedging_executor)
+
+    hedging_executor.kill(task_config.task_id)
+
+    kill_many = hedging_executor.downstream_executor.kill_many
+    assert set(kill_many.call_args[0][0]) == {
+        task_config.task_id, hedge_config.task_id
+    }
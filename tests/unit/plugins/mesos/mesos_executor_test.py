@@ -39,7 +39,13 @@ def test_creates_execution_framework_and_driver(mock_Thread, mesos_executor):
         initial_decline_delay=1.0,
         translator=mesos_status_to_event,
         pool=None,
-        role="role"
+        role="role",
+        placement_strategy='first_fit',
+        offer_backoff=10,
+        bad_pool_offer_backoff=300,
+        max_insufficient_offer_backoff=60,
+        max_kills_per_second=100,
+        trace_sample_rate=0.0,
     )
 
     msd = me_module.MesosSchedulerDriver.return_value
@@ -60,12 +66,63 @@ def test_creates_execution_framework_and_driver(mock_Thread, mesos_executor):
     )
 
 
+def test_passes_tuning_to_execution_framework(mocker, mock_Thread):
+    mocker.patch.object(me_module, 'ExecutionFramework')
+    mocker.patch.object(me_module, 'MesosSchedulerDriver')
+
+    me_module.MesosExecutor(
+        'role',
+        offer_backoff=5,
+        bad_pool_offer_backoff=600,
+        max_insufficient_offer_backoff=30,
+        max_kills_per_second=10,
+        trace_sample_rate=0.5,
+    )
+
+    kwargs = me_module.ExecutionFramework.call_args[1]
+    assert kwargs['offer_backoff'] == 5
+    assert kwargs['bad_pool_offer_backoff'] == 600
+    assert kwargs['max_insufficient_offer_backoff'] == 30
+    assert kwargs['max_kills_per_second'] == 10
+    assert kwargs['trace_sample_rate'] == 0.5
+
+
 def test_run_passes_task_to_execution_framework(mesos_executor):
     mesos_executor.run("task")
     assert mesos_executor.execution_framework.enqueue_task.call_args ==\
         mock.call("task")
 
 
+def test_run_many_enqueues_tasks_in_bulk(mesos_executor):
+    tasks = [mock.Mock(task_id='a'), mock.Mock(task_id='b')]
+
+    assert mesos_executor.run_many(iter(tasks)) == ['a', 'b']
+    assert mesos_executor.execution_framework.enqueue_tasks.call_args ==\
+        mock.call(tasks)
+
+
+def test_run_group(mesos_executor):
+    tasks = [mock.Mock(task_id='a'), mock.Mock(task_id='b')]
+    ef = mesos_executor.execution_framework
+
+    assert mesos_executor.run_group(tasks) == ef.enqueue_group.return_value
+    assert ef.enqueue_group.call_args == mock.call(tasks)
+
+
+def test_load(mesos_executor):
+    ef = mesos_executor.execution_framework
+
+    assert mesos_executor.load() == ef.load.return_value
+
+
+def test_withdraw_queued_tasks(mesos_executor):
+    ef = mesos_executor.execution_framework
+
+    assert mesos_executor.withdraw_queued_tasks(5) == \
+        ef.withdraw_queued_tasks.return_value
+    assert ef.withdraw_queued_tasks.call_args == mock.call(5)
+
+
 def test_stop_shuts_down_properly(mesos_executor):
     mesos_executor.stop()
     assert mesos_executor.execution_framework.stop.call_count == 1
@@ -1,3 +1,7 @@
+import pytest
+from pyrsistent import freeze
+from pyrsistent import InvariantException
+
 from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
 
 
@@ -16,3 +20,37 @@ def test_mesos_task_config_factories():
 
     assert type(m.gpus) is int
     assert m.gpus == 6
+
+
+def test_mesos_task_config_constraints():
+    config = MesosTaskConfig(
+        cmd='/bin/true', image='fake_image',
+        constraints=[['pool', 'IN', ['a', 'b']], ['hostname', 'UNIQUE']],
+    )
+
+    assert hash(config.constraints)
+    assert config.constraints[0][2] == freeze(['a', 'b'])
+
+    with pytest.raises(InvariantException):
+        config.set(constraints=[['pool', 'NEAR', 'a']])
+
+
+def test_mesos_task_config_shares_frozen_fields():
+    def config():
+        return MesosTaskConfig(
+            cmd='/bin/true', image='fake_image',
+            volumes=[
+                {'mode': 'RO', 'container_path': '/a', 'host_path': '/b'},
+            ],
+            docker_parameters=[{'key': 'memory-swap', 'value': '64m'}],
+            environment={'KEY': 'value'},
+        )
+    first, second = config(), config()
+
+    assert hash(first.volumes) and hash(first.docker_parameters)
+    assert first.volumes[0]['host_path'] == '/b'
+    assert first.volumes is second.volumes
+    assert first.docker_parameters is second.docker_parameters
+    assert first.environment is second.environment
+    assert first.set(environment={'KEY': 'other'}).environment == \
+        freeze({'KEY': 'other'})
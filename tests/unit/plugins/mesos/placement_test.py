@@ -0,0 +1,143 @@
+import mock
+import pytest
+from pyrsistent import InvariantException
+
+from task_processing.plugins.mesos.agent_registry import Agent
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.placement import BinPack
+from task_processing.plugins.mesos.placement import FirstFit
+from task_processing.plugins.mesos.placement import fitting_slots
+from task_processing.plugins.mesos.placement import get_strategy
+from task_processing.plugins.mesos.placement import OfferSlot
+from task_processing.plugins.mesos.placement import PlacementStrategy
+from task_processing.plugins.mesos.placement import Spread
+from task_processing.plugins.mesos.placement import STRATEGIES
+from task_processing.plugins.mesos.placement import TwoChoices
+
+
+def _slot(agent_id, cpus, mem, tasks=0, capacity=(8.0, 8192.0)):
+    agent = Agent(agent_id, agent_id, {})
+    agent.capacity.update(cpus=capacity[0], mem=capacity[1])
+    agent.task_ids.update('task{}'.format(i) for i in range(tasks))
+    return OfferSlot(
+        offer=mock.Mock(),
+        agent=agent,
+        resources=dict(cpus=cpus, mem=mem, disk=100.0, gpus=0.0),
+        ports=[31000],
+    )
+
+
+@pytest.fixture
+def task():
+    return MesosTaskConfig(cmd='/bin/true', image='fake_image', cpus=1.0)
+
+
+def test_fitting_slots(task):
+    slots = [
+        _slot('a1', cpus=0.5, mem=1024.0),
+        _slot('a2', cpus=1.0, mem=1024.0),
+        _slot('a3', cpus=4.0, mem=16.0),
+        _slot('a4', cpus=4.0, mem=1024.0),
+    ]
+    slots[3].ports = []
+
+    assert fitting_slots(task, slots) == [slots[1]]
+
+
+def test_slot_take(task):
+    slot = _slot('a1', cpus=1.0, mem=1024.0)
+
+    slot.take(task)
+
+    assert slot.cpus == 0.0
+    assert slot.mem == 992.0
+    assert slot.exhausted()
+    assert fitting_slots(task, [slot]) == []
+
+
+def test_slot_utilization():
+    assert _slot('a1', cpus=8.0, mem=8192.0).utilization() == 0.0
+    assert _slot('a1', cpus=2.0, mem=4096.0).utilization() == 0.625
+    # Nothing known about the agent yet
+    assert _slot('a1', cpus=2.0, mem=4096.0, capacity=(0, 0)) \
+        .utilization() == 0.0
+
+
+def test_first_fit(task):
+    slots = [_slot('a1', 1.0, 1024.0), _slot('a2', 8.0, 8192.0)]
+
+    assert FirstFit().choose(task, slots) is slots[0]
+
+
+def test_spread_prefers_fewest_tasks(task):
+    slots = [
+        _slot('a1', 8.0, 8192.0, tasks=2),
+        _slot('a2', 2.0, 2048.0, tasks=1),
+        _slot('a3', 4.0, 4096.0, tasks=1),
+    ]
+
+    assert Spread().choose(task, slots) is slots[2]
+
+
+def test_bin_pack_prefers_most_used(task):
+    slots = [
+        _slot('a1', 8.0, 8192.0),
+        _slot('a2', 2.0, 2048.0),
+        _slot('a3', 4.0, 4096.0, tasks=5),
+    ]
+
+    assert BinPack().choose(task, slots) is slots[1]
+
+
+def test_two_choices_picks_less_loaded_of_sample(task):
+    slots = [
+        _slot('a1', 8.0, 8192.0),
+        _slot('a2', 2.0, 2048.0, tasks=3),
+        _slot('a3', 4.0, 4096.0, tasks=1),
+    ]
+    rng = mock.Mock()
+    rng.sample.return_value = [slots[1], slots[2]]
+
+    assert TwoChoices(rng).choose(task, slots) is slots[2]
+    assert rng.sample.call_args == mock.call(slots, 2)
+
+
+def test_two_choices_single_slot(task):
+    slots = [_slot('a1', 8.0, 8192.0)]
+
+    assert TwoChoices().choose(task, slots) is slots[0]
+
+
+def test_get_strategy():
+    strategy = Spread()
+
+    assert get_strategy('bin_pack') is STRATEGIES['bin_pack']
+    assert get_strategy(strategy) is strategy
+    with pytest.raises(ValueError):
+        get_strategy('worst_fit')
+
+
+def test_placement_strategy_is_abstract():
+    with pytest.raises(TypeError):
+        PlacementStrategy()
+
+
+def test_task_config_placement_strategy(task):
+    assert task.placement_strategy is None
+    assert task.set(placement_strategy='spread').placement_strategy == \
+        'spread'
+    with pytest.raises(InvariantException):
+        task.set(placement_strategy='worst_fit')
+
+
+def test_slot_add_pools_offers(task):
+    slot = _slot('a1', cpus=0.5, mem=512.0)
+    offer = mock.Mock()
+
+    slot.add(offer, dict(cpus=0.5, mem=512.0, disk=100.0, gpus=0.0), [31001])
+
+    assert slot.offers == [slot.offer, offer]
+    assert slot.resources() == dict(
+        cpus=1.0, mem=1024.0, disk=200.0, gpus=0.0)
+    assert slot.ports == [31000, 31001]
+    assert fitting_slots(task, [slot]) == [slot]
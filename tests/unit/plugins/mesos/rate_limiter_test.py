@@ -0,0 +1,55 @@
+import time
+
+import mock
+import pytest
+
+from task_processing.plugins.mesos.rate_limiter import RateLimiter
+from task_processing.plugins.mesos.rate_limiter import RetryBudget
+
+
+@pytest.fixture
+def mock_time():
+    with mock.patch.object(time, 'time') as mock_time:
+        mock_time.return_value = 100.0
+        yield mock_time
+
+
+def test_burst_then_limited(mock_time):
+    limiter = RateLimiter(rate=2, burst=2)
+
+    assert limiter.try_acquire()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.time_until_available() == 0.5
+
+
+def test_tokens_refill_over_time(mock_time):
+    limiter = RateLimiter(rate=2, burst=2)
+    limiter.try_acquire()
+    limiter.try_acquire()
+
+    mock_time.return_value = 100.5
+
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+
+def test_retry_budget_earns_tokens_from_submissions():
+    budget = RetryBudget(ratio=0.1, max_tokens=1)
+
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+    budget.record_submissions(9)
+    assert not budget.try_spend()
+    budget.record_submissions(1)
+    assert budget.try_spend()
+
+
+def test_retry_budget_is_capped():
+    budget = RetryBudget(ratio=1, max_tokens=2)
+    budget.record_submissions(100)
+
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
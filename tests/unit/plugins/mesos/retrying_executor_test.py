@@ -1,11 +1,15 @@
 import threading
+import time
 
 import mock
 import pytest
+from addict import Dict
 from six.moves.queue import Queue
 
+from task_processing.event_stream import EventStream
 from task_processing.interfaces.event import Event
 from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.rate_limiter import RetryBudget
 from task_processing.plugins.mesos.retrying_executor import RetryingExecutor
 # from task_processing.plugins.mesos.translator import mesos_status_to_event
 
@@ -16,10 +20,15 @@ def mock_Thread():
         yield mock_Thread
 
 
+def _get_mock_executor():
+    # Keep the retry thread blocked instead of spinning on a Mock queue
+    return mock.Mock(get_event_queue=mock.Mock(return_value=EventStream()))
+
+
 @pytest.fixture
 def mock_retrying_executor(mock_Thread):
     return RetryingExecutor(
-        executor=mock.Mock(),
+        executor=_get_mock_executor(),
     )
 
 
@@ -78,96 +87,55 @@ def test_task_config_with_retry(mock_retrying_executor):
     assert '-retry2' in ret_value.task_id
 
 
-def test_restore_task_id(mock_retrying_executor):
-    mock_event = _get_mock_event()
-    original_task_id = mock_event.task_id
-    mock_retrying_executor.task_retries = mock_retrying_executor.\
-        task_retries.set(mock_event.task_id, 1)
-    task_config = mock_event.task_config
-    modified_task_config = task_config.set(
-        'uuid',
-        str(mock_event.task_config.uuid) + '-retry1'
+def _attempt_event(executor, task_config, is_terminal=False):
+    attempt_config = executor._task_config_with_retry(task_config)
+    return _get_mock_event(is_terminal=is_terminal).set(
+        task_id=attempt_config.task_id,
+        task_config=attempt_config,
     )
-    mock_event = mock_event.set(
-        'task_config',
-        modified_task_config
-    )
-
-    ret_value = mock_retrying_executor._restore_task_id(
-        mock_event,
-        original_task_id
-    )
-
-    assert mock_event.task_id == ret_value.task_id
 
 
-def test_is_not_current_attempt(mock_retrying_executor):
-    mock_event = _get_mock_event()
-    original_task_id = mock_event.task_id
+def test_process_event_restores_original_task(mock_retrying_executor):
+    task_config = MesosTaskConfig(
+        name='name-with-dashes', image='mock_image', cmd='mock_cmd')
     mock_retrying_executor.task_retries = mock_retrying_executor.\
-        task_retries.set(mock_event.task_id, 2)
-    task_config = mock_event.task_config
-    modified_task_id = str(mock_event.task_config.uuid) + '-retry1'
-    modified_task_config = task_config.set(
-        'uuid',
-        modified_task_id
-    )
-    modified_mock_event = mock_event.set(
-        'task_config',
-        modified_task_config
-    )
-    modified_mock_event = mock_event.set(
-        'task_id',
-        modified_task_id
-    )
+        task_retries.set(task_config.task_id, 2)
+    attempt_event = _attempt_event(mock_retrying_executor, task_config)
 
-    ret_value = mock_retrying_executor._is_current_attempt(
-        modified_mock_event,
-        original_task_id
-    )
+    ret_value = mock_retrying_executor._process_event(attempt_event)
 
-    assert ret_value is False
+    assert ret_value.task_id == task_config.task_id
+    assert ret_value.task_config == task_config
+    assert ret_value.extensions['RetryingExecutor/tries'] == '2/3'
 
 
-def test_is_current_attempt(mock_retrying_executor):
-    mock_event = _get_mock_event()
-    original_task_id = mock_event.task_id
+def test_process_event_discards_earlier_attempt(mock_retrying_executor):
+    task_config = _get_mock_task_config()
     mock_retrying_executor.task_retries = mock_retrying_executor.\
-        task_retries.set(mock_event.task_id, 2)
-    task_config = mock_event.task_config
-    modified_task_id = str(mock_event.task_config.uuid) + '-retry2'
-    modified_task_config = task_config.set(
-        'uuid',
-        modified_task_id
-    )
-    modified_mock_event = mock_event.set(
-        'task_config',
-        modified_task_config
-    )
-    modified_mock_event = mock_event.set(
-        'task_id',
-        modified_task_id
-    )
+        task_retries.set(task_config.task_id, 1)
+    attempt_event = _attempt_event(
+        mock_retrying_executor, task_config, is_terminal=True)
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(task_config.task_id, 2)
+
+    assert mock_retrying_executor._process_event(attempt_event) is None
+    assert attempt_event.task_id not in mock_retrying_executor.attempts
 
-    ret_value = mock_retrying_executor._is_current_attempt(
-        modified_mock_event,
-        original_task_id
-    )
 
-    assert ret_value is True
+def test_process_event_discards_unknown_task(mock_retrying_executor):
+    assert mock_retrying_executor._process_event(_get_mock_event()) is None
 
 
 def test_retry_loop_retries_task(mock_retrying_executor):
-    mock_event = _get_mock_event()
+    task_config = _get_mock_task_config()
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(task_config.task_id, 1)
     mock_retrying_executor.stopping = True
-    mock_retrying_executor._is_current_attempt = mock.Mock(return_value=True)
-    mock_retrying_executor.event_with_retries = mock.Mock()
     mock_retrying_executor.retry = mock.Mock(return_value=True)
     mock_retrying_executor.retry_pred = mock.Mock(return_value=True)
     mock_retrying_executor.src_queue = Queue()
-    mock_retrying_executor.src_queue.put(mock_event)
-    mock_retrying_executor.task_retries = mock_retrying_executor.\
-        task_retries.set(mock_event.task_id, 1)
+    mock_retrying_executor.src_queue.put(_attempt_event(
+        mock_retrying_executor, task_config, is_terminal=True))
 
     mock_retrying_executor.retry_loop()
 
@@ -175,22 +143,116 @@ def test_retry_loop_retries_task(mock_retrying_executor):
 
 
 def test_retry_loop_does_not_retry_task(mock_retrying_executor):
-    mock_event = _get_mock_event(is_terminal=True)
+    task_config = _get_mock_task_config()
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(task_config.task_id, 1)
     mock_retrying_executor.stopping = True
-    mock_retrying_executor._is_current_attempt = mock.Mock(return_value=True)
     mock_retrying_executor.retry = mock.Mock(return_value=False)
     mock_retrying_executor.retry_pred = mock.Mock(return_value=False)
-    mock_retrying_executor.task_retries = mock_retrying_executor.\
-        task_retries.set(mock_event.task_id, 1)
-    modified_task_id = mock_event.task_id + '-retry1'
-    modified_mock_event = mock_event.set(
-        'task_id',
-        modified_task_id
-    )
     mock_retrying_executor.src_queue = Queue()
-    mock_retrying_executor.src_queue.put(modified_mock_event)
+    mock_retrying_executor.src_queue.put(_attempt_event(
+        mock_retrying_executor, task_config, is_terminal=True))
 
     mock_retrying_executor.retry_loop()
 
     assert mock_retrying_executor.dest_queue.qsize() == 1
     assert len(mock_retrying_executor.task_retries) == 0
+    assert len(mock_retrying_executor.attempts) == 0
+
+
+def test_run_many(mock_retrying_executor):
+    task_configs = [_get_mock_task_config(), _get_mock_task_config()]
+
+    task_ids = mock_retrying_executor.run_many(task_configs)
+
+    assert task_ids == [tc.task_id for tc in task_configs]
+    for task_id in task_ids:
+        assert mock_retrying_executor.task_retries[task_id] == 1
+    run_many = mock_retrying_executor.executor.run_many
+    assert run_many.call_count == 1
+    assert [tc.task_id for tc in run_many.call_args[0][0]] == [
+        task_id + '-retry1' for task_id in task_ids
+    ]
+
+
+def test_kill_targets_current_attempt(mock_retrying_executor):
+    mock_event = _get_mock_event(is_terminal=True)
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(mock_event.task_id, 2)
+
+    mock_retrying_executor.kill(mock_event.task_id)
+
+    assert mock_retrying_executor.executor.kill_many.call_args == mock.call(
+        [mock_event.task_id + '-retry2']
+    )
+    assert not mock_retrying_executor.retry(mock_event)
+
+
+def test_retry_deferred_by_backoff(mock_Thread):
+    executor = RetryingExecutor(
+        executor=_get_mock_executor(), backoff_s=10, backoff_jitter=0)
+    mock_event = _get_mock_event(is_terminal=True)
+    executor.task_retries = executor.task_retries.set(mock_event.task_id, 2)
+    executor.run = mock.Mock()
+
+    with mock.patch.object(time, 'time', return_value=100.0):
+        assert executor.retry(mock_event)
+
+    assert executor.run.call_count == 0
+    assert executor.retry_scheduler._heap[0][0] == 120.0
+
+    executor._run_deferred_retry(mock_event.task_id)
+
+    assert executor.run.call_args == mock.call(mock_event.task_config)
+    assert mock_event.task_id not in executor.deferred_retries
+
+
+def test_backoff_delay_is_capped(mock_retrying_executor):
+    mock_retrying_executor.backoff_s = 1
+    mock_retrying_executor.max_backoff_s = 5
+    mock_retrying_executor.backoff_jitter = 0
+
+    assert [mock_retrying_executor.backoff_delay(a) for a in range(1, 5)] \
+        == [1, 2, 4, 5]
+
+
+def test_kill_during_backoff_reports_last_failure(mock_Thread):
+    executor = RetryingExecutor(executor=_get_mock_executor(), backoff_s=10)
+    mock_event = _get_mock_event(is_terminal=True)
+    executor.task_retries = executor.task_retries.set(mock_event.task_id, 1)
+    executor.run = mock.Mock()
+    executor.retry(mock_event)
+
+    executor.kill(mock_event.task_id)
+
+    assert executor.dest_queue.get_nowait() == mock_event
+    assert executor.executor.kill_many.call_count == 0
+    assert mock_event.task_id not in executor.retry_scheduler
+    assert mock_event.task_id not in executor.task_retries
+
+
+def test_retry_suppressed_over_budget(mock_Thread):
+    budget = RetryBudget(ratio=0.5, max_tokens=1)
+    executor = RetryingExecutor(
+        executor=_get_mock_executor(), retry_budget=budget)
+    events = [_get_mock_event(is_terminal=True) for _ in range(2)]
+    executor.run_many([e.task_config for e in events])
+    executor.run = mock.Mock()
+
+    assert executor.retry(events[0])
+    assert not executor.retry(events[1])
+    assert executor.run.call_count == 1
+
+
+def test_retry_avoids_failed_agent(mock_retrying_executor):
+    mock_event = _get_mock_event(is_terminal=True).set(
+        raw=Dict(agent_id=Dict(value='bad_agent')))
+    mock_retrying_executor.task_retries = mock_retrying_executor.\
+        task_retries.set(mock_event.task_id, 1)
+    mock_retrying_executor.run = mock.Mock()
+
+    mock_retrying_executor.retry(mock_event)
+
+    retried_config = mock_retrying_executor.run.call_args[0][0]
+    assert retried_config.excluded_agent_ids == {'bad_agent'}
+    assert retried_config.task_id == mock_event.task_id
@@ -0,0 +1,164 @@
+import threading
+import time
+
+import mock
+import pytest
+
+from task_processing.plugins.mesos.revive_controller import REVIVE
+from task_processing.plugins.mesos.revive_controller import ReviveController
+
+
+@pytest.fixture
+def mock_Thread():
+    with mock.patch.object(threading, 'Thread') as mock_Thread:
+        yield mock_Thread
+
+
+@pytest.fixture
+def mock_time():
+    with mock.patch.object(time, 'time') as mock_time:
+        mock_time.return_value = 100.0
+        yield mock_time
+
+
+@pytest.fixture
+def controller(mock_Thread, mock_time):
+    return ReviveController(
+        revive=mock.Mock(),
+        suppress=mock.Mock(),
+        min_revive_interval_s=5.0,
+        min_suppress_delay_s=10.0,
+        max_suppress_delay_s=60.0,
+    )
+
+
+def _scheduled_revive_at(controller):
+    scheduler = controller._scheduler
+    return next(
+        deadline for deadline, sequence, key in scheduler._heap
+        if key == REVIVE and scheduler._entries.get(key) == sequence
+    )
+
+
+def test_not_suppressed_before_suppress_delay(controller, mock_time):
+    mock_time.return_value = 105.0
+
+    assert not controller.queue_empty()
+    assert controller._suppress.call_count == 0
+
+
+def test_suppressed_after_suppress_delay(controller, mock_time):
+    mock_time.return_value = 110.0
+
+    assert controller.queue_empty()
+    assert controller.suppressed
+    assert controller._suppress.call_count == 1
+    assert not controller.queue_empty()
+    assert controller._suppress.call_count == 1
+
+
+def test_enqueue_not_suppressed_does_not_revive(controller):
+    controller.tasks_enqueued()
+
+    assert REVIVE not in controller._scheduler
+
+
+def test_enqueue_revives_from_scheduler(controller, mock_time):
+    mock_time.return_value = 110.0
+    controller.queue_empty()
+
+    controller.tasks_enqueued()
+    controller.tasks_enqueued()
+
+    assert _scheduled_revive_at(controller) == 110.0
+    assert len(controller._scheduler) == 1
+    assert controller._revive.call_count == 0
+
+    controller._scheduled_revive(REVIVE)
+
+    assert controller._revive.call_count == 1
+    assert not controller.suppressed
+
+
+def test_no_suppress_while_revive_pending(controller, mock_time):
+    controller.suppressed = True
+    controller.tasks_enqueued()
+    controller.suppressed = False
+    mock_time.return_value = 200.0
+
+    assert not controller.queue_empty()
+
+
+def test_revives_are_spaced_out(controller, mock_time):
+    controller.suppressed = True
+    controller.tasks_enqueued()
+    controller._scheduler.cancel(REVIVE)
+    controller._scheduled_revive(REVIVE)
+
+    controller.suppressed = True
+    mock_time.return_value = 101.0
+    controller.tasks_enqueued()
+
+    assert _scheduled_revive_at(controller) == 105.0
+
+
+def test_suppress_delay_follows_enqueue_gaps(controller, mock_time):
+    assert controller.suppress_delay() == 10.0
+
+    for now in [100.0, 120.0, 140.0]:
+        mock_time.return_value = now
+        controller.tasks_enqueued()
+
+    # Enqueues every 20s: keep offers for two gaps
+    assert controller.suppress_delay() == 40.0
+
+    mock_time.return_value = 170.0
+    assert not controller.queue_empty()
+    mock_time.return_value = 180.0
+    assert controller.queue_empty()
+
+
+def test_suppress_delay_is_capped(controller, mock_time):
+    for now in [100.0, 200.0]:
+        mock_time.return_value = now
+        controller.tasks_enqueued()
+
+    assert controller.suppress_delay() == 60.0
+
+
+def test_old_enqueues_are_forgotten(controller, mock_time):
+    for now in [100.0, 120.0]:
+        mock_time.return_value = now
+        controller.tasks_enqueued()
+
+    mock_time.return_value = 1000.0
+
+    assert controller.suppress_delay() == 10.0
+
+
+def test_enqueue_revives_declined_offers(controller, mock_time):
+    controller.offers_declined(checked_at=100.0)
+
+    mock_time.return_value = 101.0
+    controller.tasks_enqueued()
+    controller._scheduled_revive(REVIVE)
+
+    assert controller._revive.call_count == 1
+    assert not controller.offers_filtered
+
+
+def test_enqueue_during_decline_revives(controller, mock_time):
+    controller.tasks_enqueued()
+
+    controller.offers_declined(checked_at=99.0)
+
+    assert _scheduled_revive_at(controller) == 100.0
+
+
+def test_enqueue_before_decline_does_not_revive(controller, mock_time):
+    controller.tasks_enqueued()
+
+    mock_time.return_value = 101.0
+    controller.offers_declined(checked_at=101.0)
+
+    assert REVIVE not in controller._scheduler
@@ -0,0 +1,56 @@
+import pytest
+
+from task_processing.interfaces.event import task_event
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.task_group import TaskGroup
+
+
+@pytest.fixture
+def group():
+    return TaskGroup('group.1', [
+        MesosTaskConfig(
+            name='gang', uuid=str(i), cmd='/bin/true', containerizer='MESOS')
+        for i in range(2)
+    ])
+
+
+def _finished(task_id, success=True):
+    return task_event(
+        task_id=task_id,
+        terminal=True,
+        success=success,
+        platform_type='finished' if success else 'failed',
+    )
+
+
+def test_use_launch_group(group):
+    assert group.use_launch_group
+
+    group.task_configs[1] = group.task_configs[1].set(
+        containerizer='DOCKER', image='fake_image')
+
+    assert not group.use_launch_group
+
+
+def test_group_succeeds(group):
+    assert not group.task_finished(_finished('gang.0'))
+    assert group.live_task_ids() == ['gang.1']
+    assert group.task_finished(_finished('gang.1'))
+
+    event = group.event()
+    assert event.task_id == 'group.1'
+    assert event.terminal
+    assert event.success
+    assert event.platform_type == 'finished'
+    assert [e.task_id for e in event.raw] == ['gang.0', 'gang.1']
+    assert list(event.extensions['task_ids']) == ['gang.0', 'gang.1']
+
+
+def test_group_fails_with_any_task(group):
+    group.task_finished(_finished('gang.1', success=False))
+
+    assert group.failed
+    group.task_finished(_finished('gang.0'))
+    event = group.event()
+    assert not event.success
+    assert event.platform_type == 'failed'
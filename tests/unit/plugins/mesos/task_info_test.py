@@ -0,0 +1,109 @@
+import pytest
+from addict import Dict
+
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
+from task_processing.plugins.mesos.task_info import TaskInfoTemplates
+
+
+@pytest.fixture
+def templates():
+    return TaskInfoTemplates('fake_role')
+
+
+def _task_config(**kwargs):
+    kwargs.setdefault('image', 'fake_image')
+    return MesosTaskConfig(
+        cmd='echo "fake"',
+        volumes=[
+            {'mode': 'RO', 'container_path': '/a', 'host_path': '/b'},
+        ],
+        environment={'KEY': 'value'},
+        uris=['http://fake/uri'],
+        **kwargs
+    )
+
+
+def test_task_info(templates):
+    task_config = _task_config(cpus=2.0)
+
+    task_info = templates.task_info(task_config, 'fake_agent_id', 31200)
+
+    assert task_info.task_id.value == task_config.task_id
+    assert task_info.agent_id.value == 'fake_agent_id'
+    assert task_info.name == 'executor-{}'.format(task_config.task_id)
+    assert task_info.resources[0] == Dict(
+        name='cpus', type='SCALAR', role='fake_role', scalar=Dict(value=2.0))
+    assert task_info.resources[4].ranges.range == [
+        Dict(begin=31200, end=31200)]
+    assert task_info.command == Dict(
+        value='echo "fake"',
+        uris=[Dict(value='http://fake/uri', extract=False)],
+        environment=Dict(variables=[Dict(name='KEY', value='value')]),
+    )
+    assert task_info.container == Dict(
+        type='DOCKER',
+        volumes=[Dict(mode='RO', container_path='/a', host_path='/b')],
+        docker=Dict(
+            image='fake_image',
+            network='BRIDGE',
+            port_mappings=[Dict(host_port=31200, container_port=8888)],
+            parameters=[],
+            force_pull_image=True,
+        ),
+    )
+
+
+def test_task_info_mesos_containerizer(templates):
+    task_config = _task_config(containerizer='MESOS')
+
+    container = templates.task_info(task_config, 'fake_agent_id', 31200) \
+        .container
+
+    assert container.network_infos == Dict(
+        port_mappings=[Dict(host_port=31200, container_port=8888)])
+    assert container.mesos.image.docker.name == 'fake_image'
+
+
+def test_task_infos_share_template(templates):
+    first = templates.task_info(_task_config(cpus=1.0), 'agent1', 31200)
+    second = templates.task_info(_task_config(cpus=2.0), 'agent2', 31201)
+
+    assert len(templates) == 1
+    assert first.command is second.command
+    assert first.container.volumes is second.container.volumes
+    assert first.container.docker.port_mappings[0].host_port == 31200
+    assert second.container.docker.port_mappings[0].host_port == 31201
+    assert first.resources[0].scalar.value == 1.0
+    assert second.resources[0].scalar.value == 2.0
+
+
+def test_template_per_config_shape(templates):
+    templates.task_info(_task_config(), 'agent1', 31200)
+    task_info = templates.task_info(
+        _task_config(image='other_image'), 'agent1', 31201)
+
+    assert len(templates) == 2
+    assert task_info.container.docker.image == 'other_image'
+
+
+def test_templates_are_bounded():
+    templates = TaskInfoTemplates('fake_role', max_templates=2)
+
+    for i in range(3):
+        templates.task_info(
+            _task_config(image='image{}'.format(i)), 'agent1', 31200)
+
+    assert len(templates) == 1
+
+
+def test_template_for_volumes_given_as_dicts(templates):
+    task_config = _task_config().set(volumes=[
+        Dict(mode='RO', container_path='/a', host_path='/b'),
+    ])
+
+    first = templates.task_info(task_config, 'agent1', 31200)
+    second = templates.task_info(task_config, 'agent1', 31201)
+
+    assert len(templates) == 1
+    assert first.command is second.command
+    assert first.container.volumes[0].host_path == '/b'
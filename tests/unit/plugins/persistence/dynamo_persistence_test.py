@@ -4,6 +4,8 @@ from hypothesis import settings
 from hypothesis import strategies as st
 
 from task_processing.interfaces.event import Event
+from task_processing.interfaces.event import task_event
+from task_processing.plugins.mesos.mesos_executor import MesosTaskConfig
 from task_processing.plugins.persistence.dynamodb_persistence \
     import DynamoDBPersister
 
@@ -93,3 +95,46 @@ def test_event_to_item_list(x, persister):
             assert k not in res['task_config']['M']
             assert all([{'S': val} in ['task_config']['M'][k]['L']
                         for val in v])
+
+
+def test_event_to_item_nested_lists(persister):
+    task_config = MesosTaskConfig(
+        uuid='fake_uuid',
+        image='fake_image',
+        cmd='/bin/true',
+        constraints=[['hostname', 'UNIQUE'], ['pool', 'EQUALS', 'default']],
+    )
+    e = task_event(
+        task_id=task_config.task_id,
+        task_config=task_config,
+        timestamp=1.0,
+        terminal=False,
+    )
+
+    res = persister._event_to_item(e)['M']
+
+    assert res['task_config']['M']['constraints'] == {'L': [
+        {'L': [{'S': 'hostname'}, {'S': 'UNIQUE'}]},
+        {'L': [{'S': 'pool'}, {'S': 'EQUALS'}, {'S': 'default'}]},
+    ]}
+
+
+def test_event_to_item_sets(persister):
+    task_config = MesosTaskConfig(
+        uuid='fake_uuid',
+        image='fake_image',
+        cmd='/bin/true',
+        excluded_agent_ids=['agent-2', 'agent-1'],
+    )
+    e = task_event(
+        task_id=task_config.task_id,
+        task_config=task_config,
+        timestamp=1.0,
+        terminal=False,
+    )
+
+    res = persister._event_to_item(e)['M']
+
+    assert res['task_config']['M']['excluded_agent_ids'] == {'L': [
+        {'S': 'agent-1'}, {'S': 'agent-2'},
+    ]}
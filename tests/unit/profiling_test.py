@@ -0,0 +1,66 @@
+import pstats
+import time
+
+import mock
+import pytest
+
+from task_processing import profiling
+
+
+@pytest.fixture
+def mock_time():
+    with mock.patch.object(time, 'time') as mock_time:
+        yield mock_time
+
+
+@pytest.fixture
+def mock_get_metric():
+    with mock.patch.object(profiling, 'get_metric') as mock_get_metric:
+        yield mock_get_metric
+
+
+def test_laps_add_up_per_stage(mock_time, mock_get_metric):
+    profiler = profiling.CycleProfiler('prefix', ['a', 'b'])
+    mock_time.side_effect = [0.0, 1.0, 3.0, 6.0, 10.0]
+
+    profiler.start_cycle()
+    profiler.lap('a')
+    profiler.lap('b')
+    profiler.lap('a')
+    profiler.finish_cycle(offers=2)
+
+    cycle = profiler.cycles[-1]
+    assert cycle['stages'] == {'a': 4.0, 'b': 2.0}
+    assert cycle['total'] == 10.0
+    assert cycle['offers'] == 2
+    assert mock.call('prefix.a') in mock_get_metric.call_args_list
+    assert mock.call('prefix.total') in mock_get_metric.call_args_list
+
+
+def test_lap_outside_cycle_is_ignored(mock_get_metric):
+    profiler = profiling.CycleProfiler('prefix', ['a'])
+
+    profiler.lap('a')
+    profiler.finish_cycle()
+
+    assert len(profiler.cycles) == 0
+    assert mock_get_metric.call_count == 0
+
+
+def test_profile_cycles_dumps_after_n_cycles(mock_get_metric, tmpdir):
+    profiler = profiling.CycleProfiler('prefix', ['a'])
+    path = str(tmpdir.join('cycles.prof'))
+    profiler.profile_cycles(2, path)
+
+    profiler.start_cycle()
+    profiler.finish_cycle()
+    assert not tmpdir.join('cycles.prof').exists()
+
+    profiler.start_cycle()
+    sorted([3, 2, 1])
+    profiler.finish_cycle()
+
+    assert pstats.Stats(path).total_calls > 0
+    # Profiling stops after n cycles
+    profiler.start_cycle()
+    assert profiler._profile is None
@@ -0,0 +1,108 @@
+import mock
+import pytest
+from six.moves.queue import Queue
+
+from task_processing.event_stream import EventStream
+from task_processing.interfaces.event import control_event
+from task_processing.interfaces.event import task_event
+from task_processing.runners import subscription as sub_mdl
+from task_processing.runners.subscription import CoalescingQueue
+from task_processing.runners.subscription import Subscriber
+from task_processing.runners.subscription import Subscription
+
+
+@pytest.fixture
+def mock_Thread():
+    with mock.patch.object(sub_mdl, 'Thread') as mock_Thread:
+        yield mock_Thread
+
+
+@pytest.fixture
+def subscription(mock_Thread):
+    return Subscription(mock.Mock())
+
+
+def _event(task_id, terminal=False):
+    return task_event(task_id=task_id, terminal=terminal)
+
+
+def test_default_queue_is_a_subscriber(mock_Thread):
+    queue = Queue(10)
+    s = Subscription(mock.Mock(), queue)
+
+    assert len(s.subscribers) == 1
+    assert s.subscribers[0].queue is queue
+    assert s.subscribers[0].overflow == 'drop_newest'
+
+
+def test_invalid_overflow_policy():
+    with pytest.raises(ValueError):
+        Subscriber(Queue(), overflow='explode')
+
+
+def test_drop_newest_counts_drops():
+    sub = Subscriber(Queue(1), overflow='drop_newest')
+    sub.offer(_event('a'))
+    sub.offer(_event('b', terminal=True))
+
+    assert sub.get(False).task_id == 'a'
+    assert sub.delivered == 1
+    assert sub.dropped == 1
+    assert sub.dropped_terminal == 1
+
+
+def test_drop_oldest_keeps_newest():
+    sub = Subscriber(Queue(2), overflow='drop_oldest')
+    for task_id in ['a', 'b', 'c']:
+        sub.offer(_event(task_id))
+
+    assert [sub.get(False).task_id for _ in range(2)] == ['b', 'c']
+    assert sub.dropped == 1
+    assert sub.max_lag == 2
+
+
+def test_coalesce_keeps_latest_event_per_task():
+    sub = Subscriber(CoalescingQueue(2), overflow='coalesce')
+    sub.offer(_event('a'))
+    sub.offer(_event('b'))
+    sub.offer(_event('a', terminal=True))
+
+    first = sub.get(False)
+    assert first.task_id == 'a'
+    assert first.terminal
+    assert sub.get(False).task_id == 'b'
+    assert sub.coalesced == 1
+    assert sub.dropped == 0
+
+
+def test_coalesce_does_not_merge_control_events():
+    queue = CoalescingQueue(10)
+    queue.put(control_event(message='a'))
+    queue.put(control_event(message='b'))
+
+    assert queue.qsize() == 2
+
+
+def test_fan_out_to_all_subscribers(subscription):
+    fast = subscription.subscribe(maxsize=10)
+    slow = subscription.subscribe(maxsize=1, overflow='drop_newest')
+    executor_queue = EventStream()
+    for task_id in ['a', 'b']:
+        executor_queue.put(_event(task_id))
+    executor_queue.close()
+    subscription.executor.get_event_queue.return_value = executor_queue
+
+    subscription.event_producer()
+
+    assert fast.stats()['delivered'] == 2
+    assert slow.stats()['delivered'] == 1
+    assert slow.stats()['dropped'] == 1
+    # subscribers are closed once the executor's stream is
+    assert [e.task_id for e in fast.queue] == ['a', 'b']
+
+
+def test_unsubscribe(subscription):
+    sub = subscription.subscribe()
+    subscription.unsubscribe(sub)
+
+    assert subscription.subscribers == []
@@ -0,0 +1,80 @@
+import json
+
+import mock
+import pytest
+from pyrsistent import m
+
+from task_processing import tracing
+from task_processing.interfaces.event import control_event
+from task_processing.interfaces.event import task_event
+
+
+@pytest.fixture
+def mock_get_metric():
+    with mock.patch.object(tracing, 'get_metric') as mock_get_metric:
+        yield mock_get_metric
+
+
+def _history():
+    return m(
+        TASK_INITED=1.0,
+        OFFER_MATCHED=3.0,
+        TASK_STAGING=3.5,
+        TASK_RUNNING=10.0,
+        TASK_FINISHED=40.0,
+    )
+
+
+def test_finish_records_phase_times(mock_get_metric):
+    tracer = tracing.TaskTracer()
+
+    tracer.finish('task', _history(), 'TASK_FINISHED')
+
+    recorded = {
+        metric_call[0][0]: record_call[0][0]
+        for metric_call, record_call in zip(
+            mock_get_metric.call_args_list,
+            mock_get_metric.return_value.record.call_args_list,
+        )
+    }
+    assert recorded == {
+        'taskproc.trace.queued_time': 2.0,
+        'taskproc.trace.launch_time': 0.5,
+        # STARTING is skipped
+        'taskproc.trace.starting_time': 6.5,
+        'taskproc.trace.running_time': 30.0,
+        'taskproc.trace.total_time': 39.0,
+    }
+    assert len(tracer.traces) == 0
+
+
+def test_sampled_traces_export_to_chrome_format(mock_get_metric, tmpdir):
+    tracer = tracing.TaskTracer(sample_rate=1.0)
+    tracer.finish('task', _history(), 'TASK_FINISHED')
+    path = str(tmpdir.join('trace.json'))
+
+    tracer.export_chrome_trace(path)
+
+    with open(path) as f:
+        trace_events = json.load(f)['traceEvents']
+    slices = [e for e in trace_events if e['ph'] == 'X']
+    assert [e['name'] for e in slices] == [
+        'TASK_INITED', 'OFFER_MATCHED', 'TASK_STAGING', 'TASK_RUNNING',
+    ]
+    assert slices[0]['ts'] == 1.0e6
+    assert slices[0]['dur'] == 2.0e6
+    assert trace_events[-1]['name'] == 'TASK_FINISHED'
+
+
+def test_record_event_queue_time(mock_get_metric):
+    events = [
+        task_event(task_id='a', timestamp=1.0),
+        control_event(message='no timestamp'),
+    ]
+
+    with mock.patch.object(tracing.time, 'time', return_value=3.0):
+        tracing.record_event_queue_time('timer', events)
+
+    assert mock_get_metric.return_value.record.call_args_list == [
+        mock.call(2.0)
+    ]